@@ -0,0 +1,81 @@
+""" mppsolar / asyncrunner.py """
+import asyncio
+import logging
+from collections import OrderedDict
+
+log = logging.getLogger("asyncrunner")
+
+
+def get_port_key(device):
+    """
+    The physical port of device (see BaseIO.port_key)
+    """
+    if device._port is None:
+        return id(device)
+    return device._port.port_key
+
+
+def group_by_port(commands) -> list:
+    """
+    Group the (device, command, ...) tuples by the physical port of their device, keeping their order
+    """
+    groups = OrderedDict()
+    for item in commands:
+        groups.setdefault(get_port_key(item[0]), []).append(item)
+    return list(groups.values())
+
+
+class AsyncRunner:
+    """
+    Run cycles of the (device, command, tag, outputs, filter, excl_filter, dev) commands on an asyncio event loop
+    - the commands for each port run in turn, different ports run concurrently so a cycle takes as long as the slowest port
+    - the event loop lives as long as the runner, so port connections are kept between cycles
+    - result_handler(item, results) is called (on the event loop) with the results of each command as they arrive
+    - an exception polling a port is logged (and returned by async_run_cycle), the other ports carry on
+    """
+
+    def __init__(self, commands, result_handler) -> None:
+        self.groups = group_by_port(commands)
+        self._result_handler = result_handler
+        self._loop = asyncio.new_event_loop()
+        log.info(f"{len(commands)} commands on {len(self.groups)} ports")
+
+    async def _poll_port(self, items) -> None:
+        for item in items:
+            device, command = item[0], item[1]
+            results = await device.async_run_command(command, filter=item[4], excl_filter=item[5])
+            try:
+                self._result_handler(item, results)
+            except Exception as e:
+                log.error(f"Error handling results of {command} from {device}: {e}", exc_info=True)
+
+    async def async_run_cycle(self, commands=None) -> dict:
+        """
+        Run every command (or just commands) once, returning the exceptions of the ports that failed by port
+        """
+        groups = self.groups if commands is None else group_by_port(commands)
+        results = await asyncio.gather(*(self._poll_port(items) for items in groups), return_exceptions=True)
+        errors = {}
+        for items, result in zip(groups, results):
+            if isinstance(result, Exception):
+                key = get_port_key(items[0][0])
+                log.error(f"Error polling port {key}: {result}", exc_info=result)
+                errors[key] = result
+        return errors
+
+    def run_cycle(self, commands=None) -> dict:
+        """
+        Run every command (or just commands, eg the ones that are due) once
+        """
+        return self._loop.run_until_complete(self.async_run_cycle(commands))
+
+    async def _disconnect(self) -> None:
+        ports = {id(item[0]._port): item[0]._port for items in self.groups for item in items if item[0]._port is not None}
+        await asyncio.gather(*(port.async_disconnect() for port in ports.values()), return_exceptions=True)
+
+    def close(self) -> None:
+        """
+        Disconnect the ports and close the event loop
+        """
+        self._loop.run_until_complete(self._disconnect())
+        self._loop.close()
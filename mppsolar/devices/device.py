@@ -1,5 +1,7 @@
 # import importlib
+import asyncio
 import logging
+import time
 from abc import ABC
 
 from mppsolar.version import __version__  # noqa: F401
@@ -31,6 +33,10 @@ class AbstractDevice(ABC):
         self._name = get_kwargs(kwargs, "name")
         self._port = get_port(**kwargs)
         self._protocol = get_protocol(get_kwargs(kwargs, "protocol"))
+        # Use a (shared) cache of decoded results if supplied
+        decode_cache = get_kwargs(kwargs, "decode_cache")
+        if decode_cache is not None and self._protocol is not None:
+            self._protocol.decode_cache = decode_cache
         log.debug(f"__init__ name {self._name}, port {self._port}, protocol {self._protocol}")
 
     def __str__(self):
@@ -39,80 +45,144 @@ class AbstractDevice(ABC):
         """
         return f"{self._classname} device - name: {self._name}, port: {self._port}, protocol: {self._protocol}"
 
-    def run_command(self, command) -> dict:
+    def _check_ready(self, command) -> dict:
         """
-        Generic method for running a 'raw' command with improved error handling
+        Pre-flight checks, returns an ERROR if the device cant run commands
         """
-        log.info(f"Running command {command}")
-
-        # Pre-flight checks
         if self._protocol is None:
             error_msg = "Attempted to run command with no protocol defined"
             log.error(error_msg)
             return {"ERROR": [error_msg, ""]}
-            
+
         if self._port is None:
             error_msg = f"No communications port defined - unable to run command {command}"
             log.error(error_msg)
             return {"ERROR": [error_msg, ""]}
+        return None
+
+    def _special_command(self, command):
+        """
+        Get the helper method for a special command (eg get_status), None if command isnt one
+        """
+        return {
+            "list_commands": self._protocol.list_commands,
+            "get_status": self.get_status,
+            "get_settings": self.get_settings,
+            "get_device_id": self._get_device_id,
+            "get_version": self.get_version,
+        }.get(command)
+
+    def _get_full_command(self, command):
+        """
+        Get the full command for command, raises ValueError if there isnt one
+        """
+        full_command = self._protocol.get_full_command(command)
+        log.info(f"Full command {full_command} for command {command}")
+        if full_command is None:
+            raise ValueError(f"Full command not found for {command} in protocol {self._protocol._protocol_id}")
+        return full_command
+
+    def _decode_response(self, command, full_command, raw_response, filter=None, excl_filter=None) -> dict:
+        """
+        Check and decode the raw response to command
+        """
+        # Check if we got an error response
+        if isinstance(raw_response, dict) and "ERROR" in raw_response:
+            return raw_response
+
+        log.debug(f"Send and Receive Response {raw_response}")
+
+        # Handle specific response patterns
+        if raw_response == full_command:
+            error_msg = f"Inverter returned the command string for {command} - the inverter didn't recognise this command"
+            log.warning(error_msg)
+            return {"ERROR": [error_msg, ""]}
+
+        # Decode response
+        try:
+            decoded_response = self._protocol.decode(raw_response, command, filter=filter, excl_filter=excl_filter)
+            log.info(f"Decoded response {decoded_response}")
+            return decoded_response
+
+        except Exception as e:
+            error_msg = f"Failed to decode response for command {command}: {e}"
+            log.error(error_msg)
+            return {"ERROR": [error_msg, ""]}
+
+    def run_command(self, command, filter=None, excl_filter=None) -> dict:
+        """
+        Generic method for running a 'raw' command with improved error handling
+        - filter and excl_filter (as used by the outputs) are passed to the protocol so unwanted fields are not decoded
+        """
+        log.info(f"Running command {command}")
+
+        # Pre-flight checks
+        error = self._check_ready(command)
+        if error is not None:
+            return error
 
         # Handle special commands
-        if command == "list_commands":
-            return self._protocol.list_commands()
-        if command == "get_status":
-            return self.get_status()
-        if command == "get_settings":
-            return self.get_settings()
-        if command == "get_device_id":
-            return self._get_device_id()
-        if command == "get_version":
-            return self.get_version()
+        helper = self._special_command(command)
+        if helper is not None:
+            return helper()
 
         # Use default command if none specified
         if not command:
             command = self._protocol.DEFAULT_COMMAND
 
         try:
-            # Get the full command
-            full_command = self._protocol.get_full_command(command)
-            log.info(f"Full command {full_command} for command {command}")
-            
-            if full_command is None:
-                error_msg = f"Full command not found for {command} in protocol {self._protocol._protocol_id}"
-                log.error(error_msg)
-                return {"ERROR": [error_msg, ""]}
-
+            full_command = self._get_full_command(command)
             # Send command and receive data with error handling
             raw_response = self._send_command_with_retry(command, full_command)
-            
-            # Check if we got an error response
-            if isinstance(raw_response, dict) and "ERROR" in raw_response:
-                return raw_response
-                
-            log.debug(f"Send and Receive Response {raw_response}")
+            return self._decode_response(command, full_command, raw_response, filter, excl_filter)
+
+        except ValueError as e:
+            log.error(str(e))
+            return {"ERROR": [str(e), ""]}
+        except Exception as e:
+            error_msg = f"Unexpected error running command {command}: {e}"
+            log.error(error_msg, exc_info=True)
+            return {"ERROR": [error_msg, ""]}
+
+    async def async_run_command(self, command, filter=None, excl_filter=None) -> dict:
+        """
+        Async version of run_command, for running commands on devices on different ports concurrently
+        """
+        log.info(f"Running command {command} (async)")
 
-            # Handle specific response patterns
-            if raw_response == full_command:
-                error_msg = f"Inverter returned the command string for {command} - the inverter didn't recognise this command"
-                log.warning(error_msg)
-                return {"ERROR": [error_msg, ""]}
+        error = self._check_ready(command)
+        if error is not None:
+            return error
 
-            # Decode response
-            try:
-                decoded_response = self._protocol.decode(raw_response, command)
-                log.info(f"Decoded response {decoded_response}")
-                return decoded_response
-                
-            except Exception as e:
-                error_msg = f"Failed to decode response for command {command}: {e}"
-                log.error(error_msg)
-                return {"ERROR": [error_msg, ""]}
+        # the special commands run several commands, so use the sync versions in a worker thread
+        if self._special_command(command) is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.run_command, command, filter, excl_filter)
 
+        if not command:
+            command = self._protocol.DEFAULT_COMMAND
+
+        try:
+            full_command = self._get_full_command(command)
+            raw_response = await self._async_send_command_with_retry(command, full_command)
+            return self._decode_response(command, full_command, raw_response, filter, excl_filter)
+
+        except ValueError as e:
+            log.error(str(e))
+            return {"ERROR": [str(e), ""]}
         except Exception as e:
             error_msg = f"Unexpected error running command {command}: {e}"
             log.error(error_msg, exc_info=True)
             return {"ERROR": [error_msg, ""]}
 
+    def _send_kwargs(self, command, full_command) -> dict:
+        return {
+            "command": command,
+            "full_command": full_command,
+            "protocol": self._protocol,
+            "command_defn": self._protocol.get_command_defn(command),
+        }
+
     def _send_command_with_retry(self, command: str, full_command: bytes, max_retries: int = 3) -> dict:
         """
         Send command with retry logic and comprehensive error handling
@@ -123,12 +193,7 @@ class AbstractDevice(ABC):
             try:
                 log.debug(f"Command attempt {attempt + 1}/{max_retries} for {command}")
                 
-                raw_response = self._port.send_and_receive(
-                    command=command,
-                    full_command=full_command,
-                    protocol=self._protocol,
-                    command_defn=self._protocol.get_command_defn(command),
-                )
+                raw_response = self._port.send_and_receive(**self._send_kwargs(command, full_command))
                 
                 # If we get a valid response, return it
                 if raw_response is not None:
@@ -141,7 +206,6 @@ class AbstractDevice(ABC):
                 # If this is the last attempt, don't sleep
                 if attempt < max_retries - 1:
                     # Progressive backoff: wait longer between retries
-                    import time
                     wait_time = 1.0 * (attempt + 1)
                     log.debug(f"Waiting {wait_time}s before retry...")
                     time.sleep(wait_time)
@@ -151,6 +215,29 @@ class AbstractDevice(ABC):
         log.error(error_msg)
         return {"ERROR": [error_msg, ""]}
 
+    async def _async_send_command_with_retry(self, command: str, full_command: bytes, max_retries: int = 3) -> dict:
+        """
+        Async version of _send_command_with_retry
+        """
+        last_error = None
+        for attempt in range(max_retries):
+            try:
+                log.debug(f"Command attempt {attempt + 1}/{max_retries} for {command}")
+                raw_response = await self._port.async_send_and_receive(**self._send_kwargs(command, full_command))
+                if raw_response is not None:
+                    return raw_response
+            except Exception as e:
+                last_error = e
+                log.warning(f"Command attempt {attempt + 1} failed: {e}")
+                if attempt < max_retries - 1:
+                    wait_time = 1.0 * (attempt + 1)
+                    log.debug(f"Waiting {wait_time}s before retry...")
+                    await asyncio.sleep(wait_time)
+
+        error_msg = f"Command {command} failed after {max_retries} attempts. Last error: {last_error}"
+        log.error(error_msg)
+        return {"ERROR": [error_msg, ""]}
+
     def get_status(self) -> dict:
         """
         Run all the commands that are defined as status from the protocol definition
@@ -0,0 +1,169 @@
+""" mppsolar / dispatcher.py """
+import logging
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger("dispatcher")
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class SinkStats:
+    """
+    Delivery statistics for an output sink
+    """
+
+    __slots__ = ("name", "queued", "delivered", "errors", "dropped", "max_depth", "last_lag", "max_lag", "total_lag")
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.queued = 0
+        self.delivered = 0
+        self.errors = 0
+        # results thrown away as the queue was full (or the sink closed)
+        self.dropped = 0
+        self.max_depth = 0
+        # seconds from a result being queued to it having been output
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.queued} queued, {self.delivered} delivered, {self.errors} errors, {self.dropped} dropped, "
+            f"max depth {self.max_depth}, lag last {self.last_lag:.3f}s, mean {self.mean_lag:.3f}s, max {self.max_lag:.3f}s"
+        )
+
+    @property
+    def mean_lag(self) -> float:
+        return self.total_lag / self.delivered if self.delivered else 0.0
+
+    def add_delivery(self, lag, error) -> None:
+        self.delivered += 1
+        if error:
+            self.errors += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.total_lag += lag
+
+
+class OutputSink:
+    """
+    Run an output processor on its own worker thread, fed from a bounded queue
+    - output(**kwargs) queues the call and returns straight away, so a slow output (eg a database or http push that
+      times out) doesnt hold up polling the devices or the other outputs
+    - when the queue is full the overflow policy decides what happens:
+      drop_oldest throws away the oldest queued result, drop_newest throws away the new one
+      and block waits for the sink to catch up
+    """
+
+    def __init__(self, op, name=None, maxsize=100, overflow=DROP_OLDEST) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy '{overflow}', should be one of {', '.join(OVERFLOW_POLICIES)}")
+        if maxsize < 1:
+            raise ValueError(f"Invalid queue size {maxsize}, should be at least 1")
+        self.op = op
+        self.name = type(op).__name__ if name is None else name
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.stats = SinkStats(self.name)
+        self._queue = deque()
+        self._condition = threading.Condition()
+        # the number of queued results not yet output (including the one in progress)
+        self._pending = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def __str__(self):
+        return f"{self.stats}, depth {self.depth}"
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def output(self, **kwargs) -> None:
+        """
+        Queue an output call
+        """
+        with self._condition:
+            if self._closed:
+                self.stats.dropped += 1
+                return
+            while len(self._queue) >= self.maxsize:
+                if self.overflow == DROP_NEWEST:
+                    self.stats.dropped += 1
+                    log.debug(f"{self.name} queue full, dropping newest result")
+                    return
+                if self.overflow == DROP_OLDEST:
+                    self._queue.popleft()
+                    self._pending -= 1
+                    self.stats.dropped += 1
+                    log.debug(f"{self.name} queue full, dropping oldest result")
+                    break
+                self._condition.wait()
+                if self._closed:
+                    self.stats.dropped += 1
+                    return
+            self._queue.append((time.monotonic(), kwargs))
+            self._pending += 1
+            self.stats.queued += 1
+            self.stats.max_depth = max(self.stats.max_depth, len(self._queue))
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                queued_at, kwargs = self._queue.popleft()
+                # wake up a blocked output()
+                self._condition.notify_all()
+            error = False
+            try:
+                self.op.output(**kwargs)
+            except Exception as e:
+                error = True
+                log.error(f"Error in output processor {self.name}: {e}", exc_info=True)
+            with self._condition:
+                self.stats.add_delivery(time.monotonic() - queued_at, error)
+                self._pending -= 1
+                self._condition.notify_all()
+
+    def join(self, timeout=None) -> bool:
+        """
+        Wait (for at most timeout seconds) for the queued results to be output, return whether they all were
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=5) -> None:
+        """
+        Output what is queued (waiting at most timeout seconds), stop the worker and close the output processor
+        """
+        self.join(timeout)
+        with self._condition:
+            self._closed = True
+            if self._queue:
+                log.warning(f"{self.name} closed with {len(self._queue)} results still queued")
+                self.stats.dropped += len(self._queue)
+                self._pending -= len(self._queue)
+                self._queue.clear()
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.warning(f"{self.name} is still busy, not closing it")
+            return
+        self.op.close()
@@ -4,6 +4,8 @@ import sys
 import logging
 import importlib
 
+from .protocols.protocol_checksums import CRC16_XMODEM_TABLE
+
 log = logging.getLogger("helpers")
 
 
@@ -112,7 +114,8 @@ class CRC_XModem:
     def __init__(self, poly=0x1021, initial=0x0000):
         self.poly = poly
         self.initial = initial
-        self.table = self.generate_crc_table()
+        # share the table built at import for the standard XModem polynomial
+        self.table = CRC16_XMODEM_TABLE if poly == 0x1021 else self.generate_crc_table()
 
     def generate_crc_table(self):
         table = [0] * 256
@@ -17,6 +17,7 @@ class PortType(Enum):
     VSERIAL = auto()
     DALYSERIAL = auto()
     REMOTESOCKET = auto()
+    REPLAY = auto()
 
 
 log = logging.getLogger("io")
@@ -27,8 +28,12 @@ def get_port_type(port):
         return PortType.UNKNOWN
 
     port = port.lower()
+    # replay of a capture log (checked first as the log path could contain anything)
+    if port.startswith("replay"):
+        log.debug("port matches replay")
+        return PortType.REPLAY
     # check for test type port
-    if "test" in port:
+    elif "test" in port:
         log.debug("port matches test")
         return PortType.TEST
     # mqtt
@@ -80,6 +85,8 @@ def get_port(*args, **kwargs):
     port = get_kwargs(kwargs, "port")
     baud = get_kwargs(kwargs, "baud", 2400)
     porttype = get_kwargs(kwargs, "porttype", None)
+    keep_open = get_kwargs(kwargs, "keep_open", False)
+    capture = get_kwargs(kwargs, "capture")
 
     if porttype:
         log.info(f"Port overide - using port '{porttype}'")
@@ -109,13 +116,13 @@ def get_port(*args, **kwargs):
         log.info("Using jkbleio for communications")
         from mppsolar.inout.jkbleio import JkBleIO
 
-        _port = JkBleIO(device_path=port)
+        _port = JkBleIO(device_path=port, keep_open=keep_open)
 
     elif port_type == PortType.SERIAL:
         log.info("Using serialio for communications")
         from mppsolar.inout.serialio import SerialIO
 
-        _port = SerialIO(device_path=port, serial_baud=baud)
+        _port = SerialIO(device_path=port, serial_baud=baud, keep_open=keep_open)
 
     elif port_type == PortType.JKSERIAL:
         log.info("Using jkserialio for communications")
@@ -133,7 +140,7 @@ def get_port(*args, **kwargs):
         log.info("Using vserialio for communications")
         from mppsolar.inout.vserialio import VSerialIO
 
-        _port = VSerialIO(device_path=port, serial_baud=baud, records=30)
+        _port = VSerialIO(device_path=port, serial_baud=baud, keep_open=keep_open)
 
     elif port_type == PortType.REMOTESOCKET:
         log.info("Using remotesocketio for communications")
@@ -166,11 +173,31 @@ def get_port(*args, **kwargs):
         _port = MqttIO(
             client_id=name,
             mqtt_broker=mqtt_broker,
+            mqtt_timeout=get_kwargs(kwargs, "mqtt_timeout"),
             # mqtt_port=mqtt_port,
             # mqtt_user=mqtt_user,
             # mqtt_pass=mqtt_pass,
         )
 
+    elif port_type == PortType.REPLAY:
+        # port is replay:<capture log>[#<captured port>] or replay-realtime:...
+        log.info("Using replayio for communications")
+        from mppsolar.inout.replayio import ReplayIO
+
+        if port.lower().startswith("replay"):
+            mode, _, path = port.partition(":")
+        else:
+            # porttype override, so port is just the capture log
+            mode, path = porttype, port
+        path, _, port_filter = path.partition("#")
+        _port = ReplayIO(device_path=path, port_filter=port_filter or None, realtime=mode.lower() == "replay-realtime")
+
     else:
         _port = None
+
+    if capture and _port is not None:
+        log.info(f"Capturing commands and responses to {capture}")
+        from mppsolar.inout.captureio import CaptureIO
+
+        _port = CaptureIO(port=_port, port_name=port, capture=capture)
     return _port
@@ -1,15 +1,184 @@
 from abc import ABC, abstractmethod
+import asyncio
+import contextlib
+import functools
 import logging
+import select
+import time
+import weakref
 
 # from time import sleep
 log = logging.getLogger("BaseIO")
 
 
+def cr_terminated(buffer) -> bool:
+    """
+    Default frame_complete - the frame is complete once a \r has been received
+    """
+    return b"\r" in buffer
+
+
+# asyncio locks by key (eg device path), per event loop as asyncio objects belong to the loop they are used on
+_async_locks = weakref.WeakKeyDictionary()
+
+
+def get_async_lock(key) -> asyncio.Lock:
+    """
+    Get the asyncio lock for key on the running event loop
+    """
+    locks = _async_locks.setdefault(asyncio.get_running_loop(), {})
+    lock = locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        locks[key] = lock
+    return lock
+
+
+@contextlib.asynccontextmanager
+async def hold_thread_lock(lock):
+    """
+    Hold the threading lock lock from the event loop, so async commands take turns with commands from other threads
+    - waits for the lock in the executor so the event loop isnt blocked
+    """
+    if not lock.acquire(blocking=False):
+        acquired = asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # give the lock back once the executor gets it
+            acquired.add_done_callback(lambda _: lock.release())
+            raise
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+async def _wait_fd(fd, timeout, add, remove) -> bool:
+    ready = asyncio.get_running_loop().create_future()
+    add(fd, lambda: ready.done() or ready.set_result(True))
+    try:
+        return await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        remove(fd)
+
+
+async def wait_readable(fd, timeout) -> bool:
+    """
+    Wait (on the running event loop) for fd to be readable, False if it isnt within timeout seconds
+    """
+    loop = asyncio.get_running_loop()
+    return await _wait_fd(fd, timeout, loop.add_reader, loop.remove_reader)
+
+
+async def wait_writable(fd, timeout) -> bool:
+    """
+    Wait (on the running event loop) for fd to be writable, False if it isnt within timeout seconds
+    """
+    loop = asyncio.get_running_loop()
+    return await _wait_fd(fd, timeout, loop.add_writer, loop.remove_writer)
+
+
 class BaseIO(ABC):
     @abstractmethod
     def send_and_receive(self, *args, **kwargs) -> dict:
         raise NotImplementedError
 
+    async def async_send_and_receive(self, *args, **kwargs) -> dict:
+        """
+        Async version of send_and_receive
+        - ports without an async implementation run send_and_receive in a worker thread
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.send_and_receive, *args, **kwargs))
+
+    @property
+    def port_key(self):
+        """
+        Identifies the physical port, commands to ports with the same port_key must not overlap
+        - serial style ports are identified by their device path, others by the port instance
+        """
+        return getattr(self, "_serial_port", None) or id(self)
+
+    def read_frame(self, port, frame_complete=None, timeout=1.0, idle_timeout=None) -> bytes:
+        """
+        Read a response frame from port, returning as soon as frame_complete(buffer) is true
+        - waits on the port's file descriptor (select) so there are no fixed sleeps
+        - gives up after timeout seconds, or (if idle_timeout is set) once no data has arrived
+          for idle_timeout seconds after the start of a response
+        - ports without a file descriptor (eg pyserial loop://) fall back to blocking reads with the port timeout
+        """
+        if frame_complete is None:
+            frame_complete = cr_terminated
+        try:
+            fd = port.fileno()
+        except (AttributeError, OSError, ValueError):
+            fd = None
+        buffer = bytearray()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log.debug(f"read_frame timed out after {timeout}s with {len(buffer)} bytes")
+                break
+            if fd is not None:
+                wait = remaining
+                if buffer and idle_timeout is not None:
+                    wait = min(remaining, idle_timeout)
+                ready, _, _ = select.select([fd], [], [], wait)
+                if not ready:
+                    if buffer and idle_timeout is not None:
+                        log.debug(f"read_frame no data for {idle_timeout}s, assuming response complete")
+                        break
+                    continue
+            chunk = port.read(port.in_waiting or 1)
+            if not chunk:
+                if fd is None:
+                    # blocking read timed out
+                    break
+                continue
+            buffer.extend(chunk)
+            if frame_complete(buffer):
+                break
+        return bytes(buffer)
+
+    async def async_read_frame(self, port, frame_complete=None, timeout=1.0, idle_timeout=None) -> bytes:
+        """
+        read_frame for the event loop, waiting for the port's file descriptor with loop.add_reader
+        - ports without a file descriptor are read with read_frame in a worker thread
+        """
+        if frame_complete is None:
+            frame_complete = cr_terminated
+        try:
+            fd = port.fileno()
+        except (AttributeError, OSError, ValueError):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.read_frame, port, frame_complete, timeout, idle_timeout)
+        buffer = bytearray()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log.debug(f"async_read_frame timed out after {timeout}s with {len(buffer)} bytes")
+                break
+            wait = remaining
+            if buffer and idle_timeout is not None:
+                wait = min(remaining, idle_timeout)
+            if not await wait_readable(fd, wait):
+                if buffer and idle_timeout is not None:
+                    log.debug(f"async_read_frame no data for {idle_timeout}s, assuming response complete")
+                    break
+                continue
+            chunk = port.read(port.in_waiting or 1)
+            if not chunk:
+                continue
+            buffer.extend(chunk)
+            if frame_complete(buffer):
+                break
+        return bytes(buffer)
+
     def connect(self) -> None:
         log.debug("connect not implemented")
         return
@@ -18,6 +187,9 @@ class BaseIO(ABC):
         log.debug("disconnect not implemented")
         return
 
+    async def async_disconnect(self) -> None:
+        self.disconnect()
+
     def process_command(self, command, protocol):
         # Band-aid solution, need to reduce what is sent
         log.debug(f"Command {command}")
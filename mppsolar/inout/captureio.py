@@ -0,0 +1,168 @@
+""" mppsolar / inout / captureio.py """
+import json
+import logging
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from .baseio import BaseIO
+from ..helpers import get_kwargs
+
+log = logging.getLogger("CaptureIO")
+
+# Capture log format
+# - file header MAGIC
+# - then one RECORD per command: timestamp, latency (seconds), flags and the lengths of the 4 fields that follow it,
+#   port, command, full_command and response (utf-8 / bytes)
+MAGIC = b"MPPCAP\x01\n"
+RECORD = struct.Struct("<dfBHHII")
+# flags
+FULL_COMMAND_STR = 0x01  # full_command was a str (eg VEDTEXT)
+RESPONSE_DICT = 0x02  # response was a dict (eg an ERROR), stored as json
+RESPONSE_NONE = 0x04  # no response
+
+CaptureRecord = namedtuple("CaptureRecord", "timestamp port command full_command response latency")
+
+# Capture logs by path, shared by every port capturing to the same file
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class CaptureWriter:
+    """
+    Append capture records to a log file
+    """
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+
+    def write(self, port, command, full_command, response, latency, timestamp=None) -> None:
+        flags = 0
+        if isinstance(full_command, str):
+            flags |= FULL_COMMAND_STR
+            full_command = full_command.encode("utf-8")
+        if response is None:
+            flags |= RESPONSE_NONE
+            response = b""
+        elif isinstance(response, dict):
+            flags |= RESPONSE_DICT
+            response = json.dumps(response, default=str).encode("utf-8")
+        port = (port or "").encode("utf-8")
+        command = (command or "").encode("utf-8")
+        full_command = bytes(full_command or b"")
+        response = bytes(response)
+        header = RECORD.pack(
+            time.time() if timestamp is None else timestamp,
+            latency,
+            flags,
+            len(port),
+            len(command),
+            len(full_command),
+            len(response),
+        )
+        with self._lock:
+            self._file.write(b"".join((header, port, command, full_command, response)))
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def get_writer(path) -> CaptureWriter:
+    """
+    Get the (shared) writer for the capture log at path
+    """
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = CaptureWriter(path)
+            _writers[path] = writer
+        return writer
+
+
+def read_capture(path):
+    """
+    Iterate the CaptureRecords in the capture log at path
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture log")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                # end of log (or a partly written last record)
+                return
+            timestamp, latency, flags, port_len, command_len, full_command_len, response_len = RECORD.unpack(header)
+            data = f.read(port_len + command_len + full_command_len + response_len)
+            if len(data) < port_len + command_len + full_command_len + response_len:
+                return
+            view = memoryview(data)
+            port = str(view[:port_len], "utf-8")
+            offset = port_len
+            command = str(view[offset:offset + command_len], "utf-8")
+            offset += command_len
+            full_command = bytes(view[offset:offset + full_command_len])
+            if flags & FULL_COMMAND_STR:
+                full_command = full_command.decode("utf-8")
+            offset += full_command_len
+            response = bytes(view[offset:])
+            if flags & RESPONSE_NONE:
+                response = None
+            elif flags & RESPONSE_DICT:
+                response = json.loads(response)
+            yield CaptureRecord(timestamp, port, command, full_command, response, latency)
+
+
+class CaptureIO(BaseIO):
+    """
+    Wraps a port, recording every command and its response to a capture log (to replay with ReplayIO)
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._port = get_kwargs(kwargs, "port")
+        self._port_name = get_kwargs(kwargs, "port_name")
+        self._writer = get_writer(get_kwargs(kwargs, "capture"))
+
+    def __str__(self):
+        return f"CaptureIO: {self._port} to {self._writer.path}"
+
+    @property
+    def port_key(self):
+        return self._port.port_key
+
+    def connect(self) -> None:
+        return self._port.connect()
+
+    def disconnect(self) -> None:
+        return self._port.disconnect()
+
+    def _record(self, kwargs, response, latency) -> None:
+        try:
+            self._writer.write(
+                self._port_name,
+                get_kwargs(kwargs, "command"),
+                get_kwargs(kwargs, "full_command"),
+                response,
+                latency,
+            )
+        except Exception as e:
+            log.warning(f"Unable to write to capture log {self._writer.path}: {e}")
+
+    def send_and_receive(self, *args, **kwargs) -> dict:
+        start = time.monotonic()
+        response = self._port.send_and_receive(*args, **kwargs)
+        self._record(kwargs, response, time.monotonic() - start)
+        return response
+
+    async def async_send_and_receive(self, *args, **kwargs) -> dict:
+        start = time.monotonic()
+        response = await self._port.async_send_and_receive(*args, **kwargs)
+        self._record(kwargs, response, time.monotonic() - start)
+        return response
@@ -1,11 +1,19 @@
 import logging
 import serial
-import time
 
 from .baseio import BaseIO
 from ..helpers import get_kwargs
 
 log = logging.getLogger("DalySerialIO")
+# longest to wait for a (multiframe) response
+RESPONSE_TIMEOUT = 5
+
+
+def never_complete(buffer) -> bool:
+    """
+    Without a protocol the frame length isnt known, so read until no more data
+    """
+    return False
 
 
 class DalySerialIO(BaseIO):
@@ -15,7 +23,8 @@ class DalySerialIO(BaseIO):
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         full_command = get_kwargs(kwargs, "full_command")
-        response_line = b""
+        protocol = get_kwargs(kwargs, "protocol")
+        frame_complete = protocol.frame_complete if protocol is not None else never_complete
         log.debug(f"port {self._serial_port}, baudrate {self._serial_baud}")
         try:
             with serial.serial_for_url(self._serial_port, self._serial_baud) as s:
@@ -25,15 +34,8 @@ class DalySerialIO(BaseIO):
                 s.reset_input_buffer()
                 s.reset_output_buffer()
                 s.write(full_command)
-                # read until no more data
-                while True:
-                    time.sleep(0.5)  # give serial port time to receive the data
-                    to_read = s.in_waiting
-                    log.debug(f"bytes waiting {to_read}")
-                    if to_read == 0:
-                        break
-                    # got some data to read
-                    response_line += s.read(to_read)
+                # read until the frame is complete, or no more data
+                response_line = self.read_frame(s, frame_complete, timeout=RESPONSE_TIMEOUT, idle_timeout=s.timeout)
 
                 log.debug("serial response was: %s", response_line)
                 return response_line
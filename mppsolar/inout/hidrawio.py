@@ -1,67 +1,107 @@
 # shamelessly stolen from ccrisan https://github.com/qtoggle/qtoggleserver-mppsolar/blob/master/qtoggleserver/mppsolar/io.py
 # Added better error handling principals 2025 Corey DeLasaux <cordelster@gmail.com>
+import asyncio
 import logging
 import os
+import select
+import threading
 import time
 import errno
 
-from .baseio import BaseIO
+from .baseio import BaseIO, cr_terminated, get_async_lock, hold_thread_lock, wait_readable, wait_writable
 from ..helpers import get_kwargs
 
 log = logging.getLogger(__name__)
 
+# HID reports are 8 bytes
+REPORT_SIZE = 8
+
 
 class HIDRawIO(BaseIO):
     """
     Handles HIDRAW serial communications.
     Purpose: Added better error handling and progressive backoff.
+    - the device is opened once and kept open between commands (it is reopened after an error)
+    - waits for the device with poll() rather than fixed sleeps
+    - this is the only retry policy for hidraw, failures are returned as an ERROR (not raised) so the device doesnt retry again
     """
     def __init__(self, device_path: str, timeout: float = 5.0, max_retries: int = 3) -> None:
         self._device = device_path
         self._timeout = timeout
         self._max_retries = max_retries
+        self._fd = None
+        self._lock = threading.Lock()
+
+    @property
+    def port_key(self):
+        return self._device
+
+    def disconnect(self) -> None:
+        with self._lock:
+            self._close()
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         full_command = get_kwargs(kwargs, "full_command")
-        
-        for attempt in range(self._max_retries):
-            try:
-                return self._attempt_communication(full_command)
-            except (TimeoutError, OSError) as e:
-                log.warning(f"Communication attempt {attempt + 1} failed: {e}")
-                if attempt == self._max_retries - 1:
-                    # Last attempt failed, return error
-                    error_msg = f"Communication failed after {self._max_retries} attempts: {e}"
-                    log.error(error_msg)
-                    return {"ERROR": [error_msg, ""]}
-                # Wait before retry
-                time.sleep(0.5 * (attempt + 1))  # Progressive backoff
-        
+        protocol = get_kwargs(kwargs, "protocol")
+        frame_complete = protocol.frame_complete if protocol is not None else cr_terminated
+
+        with self._lock:
+            for attempt in range(self._max_retries):
+                try:
+                    return self._attempt_communication(full_command, frame_complete)
+                except (TimeoutError, OSError) as e:
+                    log.warning(f"Communication attempt {attempt + 1} failed: {e}")
+                    # start the next attempt with a freshly opened device
+                    self._close()
+                    if attempt == self._max_retries - 1:
+                        # Last attempt failed, return error
+                        error_msg = f"Communication failed after {self._max_retries} attempts: {e}"
+                        log.error(error_msg)
+                        return {"ERROR": [error_msg, ""]}
+                    # Wait before retry
+                    time.sleep(0.1 * (attempt + 1))  # Progressive backoff
+
         # This shouldn't be reached, but just in case
         return {"ERROR": ["Unexpected error in communication retry loop", ""]}
 
-    def _attempt_communication(self, full_command: bytes) -> dict:
+    def _open(self) -> int:
+        """Open the device, or return the already open device"""
+        if self._fd is None:
+            self._fd = os.open(self._device, os.O_RDWR | os.O_NONBLOCK)
+            log.debug(f"Opened device: {self._device}")
+        return self._fd
+
+    def _close(self) -> None:
+        """Close the device if it is open"""
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+                log.debug("Closed USB device")
+            except Exception as e:
+                log.warning(f"Error closing USB device: {e}")
+            self._fd = None
+
+    def _attempt_communication(self, full_command: bytes, frame_complete=cr_terminated) -> bytes:
         """Single attempt at communication with the device"""
-        response_line = bytes()
-        usb0 = None
-        
         try:
-            # Open device
-            usb0 = os.open(self._device, os.O_RDWR | os.O_NONBLOCK)
-            log.debug(f"Opened device: {self._device}")
-            
+            usb0 = self._open()
+
+            # Drop anything left over from an earlier (timed out) command
+            self._drain(usb0)
+
             # Send command
             self._send_command(usb0, full_command)
-            
+
             # Receive response
-            response_line = self._receive_response(usb0)
-            
-            if not response_line:
-                raise TimeoutError("No response received from device")
-                
+            response_line = self._receive_response(usb0, frame_complete)
+
             log.debug("usb response was: %s", response_line)
             return response_line
-            
+
+        except TimeoutError as e:
+            log.error(f"Communication timeout: {e}")
+            raise
+
         except OSError as e:
             if e.errno == errno.ENOENT:
                 error_msg = f"Device not found: {self._device}"
@@ -73,98 +113,132 @@ class HIDRawIO(BaseIO):
                 error_msg = f"USB device error: {e}"
             log.error(error_msg)
             raise OSError(error_msg) from e
-            
-        except TimeoutError as e:
-            log.error(f"Communication timeout: {e}")
-            raise
-            
+
         except Exception as e:
             error_msg = f"Unexpected error during communication: {e}"
             log.error(error_msg)
             raise OSError(error_msg) from e
-            
-        finally:
-            # Always close the device if it was opened
-            if usb0 is not None:
-                try:
-                    os.close(usb0)
-                    log.debug("Closed USB device")
-                except Exception as e:
-                    log.warning(f"Error closing USB device: {e}")
+
+    def _drain(self, usb_fd: int) -> None:
+        """Discard any unread data"""
+        while True:
+            try:
+                if not os.read(usb_fd, 256):
+                    return
+            except BlockingIOError:
+                return
+
+    def _wait(self, poller, deadline: float, what: str) -> None:
+        """Wait for the device to be ready, raising TimeoutError at the deadline"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not poller.poll(remaining * 1000):
+            raise TimeoutError(f"Overall timeout ({self._timeout}s) exceeded while {what}")
 
     def _send_command(self, usb_fd: int, full_command: bytes) -> None:
-        """Send command to the USB device"""
+        """Send command to the USB device, in 8 byte reports if it is longer than a report"""
+        poller = select.poll()
+        poller.register(usb_fd, select.POLLOUT)
+        deadline = time.monotonic() + self._timeout
+        try:
+            for chunk in self._reports(full_command):
+                log.debug("Sending chunk: %s", bytes(chunk))
+                self._wait(poller, deadline, "sending command")
+                os.write(usb_fd, chunk)
+        except OSError as e:
+            raise OSError(f"Failed to send command: {e}") from e
+
+    def _reports(self, full_command: bytes):
+        """The command as 8 byte reports, the last padded to a full report, if it is longer than a report"""
         cmd_len = len(full_command)
         log.debug(f"Sending command of length: {cmd_len}")
-        
+        if cmd_len > REPORT_SIZE:
+            # Pad the last chunk to a full report
+            full_command = bytes(full_command) + bytes(-cmd_len % REPORT_SIZE)
+        command = memoryview(full_command)
+        return [command[i:i + REPORT_SIZE] for i in range(0, len(command), REPORT_SIZE)]
+
+    def _read(self, usb_fd: int) -> bytes:
+        """Read what is available from the device, b"" if there wasnt anything after all"""
         try:
-            if cmd_len <= 8:
-                # Send all at once
-                log.debug("Sending full_command in one shot")
-                time.sleep(0.05)
-                os.write(usb_fd, full_command)
-            else:
-                # Send in 8-byte chunks
-                log.debug("Sending command in multiple chunks")
-                chunks = [full_command[i:i + 8] for i in range(0, cmd_len, 8)]
-                for chunk in chunks:
-                    # Pad chunk to 8 bytes
-                    if len(chunk) < 8:
-                        padding = 8 - len(chunk)
-                        chunk += b'\x00' * padding
-                    log.debug("Sending chunk: %s", chunk)
-                    time.sleep(0.05)
-                    os.write(usb_fd, chunk)
-                    
-            time.sleep(0.25)  # Wait for device to process
-            
+            r = os.read(usb_fd, 256)
+        except BlockingIOError:
+            # No data available after all, this is expected with non-blocking I/O
+            return b""
         except OSError as e:
-            raise OSError(f"Failed to send command: {e}") from e
+            if e.errno == errno.ETIMEDOUT:
+                raise TimeoutError(f"Read operation timed out: {e}") from e
+            raise
+        if not r:
+            raise OSError(f"Device closed: {self._device}")
+        log.debug(f"Read {len(r)} bytes")
+        return r
+
+    def _trim(self, response_line: bytearray) -> bytes:
+        """Remove the report padding after the final \r"""
+        end = response_line.rfind(b"\r")
+        if end != -1:
+            del response_line[end + 1:]
+        log.debug("Complete response received")
+        return bytes(response_line)
+
+    def _receive_response(self, usb_fd: int, frame_complete=cr_terminated) -> bytes:
+        """Receive response from the USB device, until frame_complete or the timeout"""
+        response_line = bytearray()
+        poller = select.poll()
+        poller.register(usb_fd, select.POLLIN)
+        deadline = time.monotonic() + self._timeout
 
-    def _receive_response(self, usb_fd: int) -> bytes:
-        """Receive response from the USB device with timeout handling"""
-        response_line = bytes()
-        start_time = time.time()
-        read_attempts = 0
-        max_read_attempts = 100
-        
         log.debug(f"Starting to read response (timeout: {self._timeout}s)")
-        
-        while read_attempts < max_read_attempts:
-            # Check for overall timeout
-            if time.time() - start_time > self._timeout:
-                raise TimeoutError(f"Overall timeout ({self._timeout}s) exceeded while reading response")
-            
+
+        while not frame_complete(response_line):
+            self._wait(poller, deadline, "reading response")
+            response_line += self._read(usb_fd)
+        return self._trim(response_line)
+
+    async def async_send_and_receive(self, *args, **kwargs) -> dict:
+        full_command = get_kwargs(kwargs, "full_command")
+        protocol = get_kwargs(kwargs, "protocol")
+        frame_complete = protocol.frame_complete if protocol is not None else cr_terminated
+
+        async with get_async_lock(self._device), hold_thread_lock(self._lock):
+            for attempt in range(self._max_retries):
+                try:
+                    usb0 = self._open()
+                    self._drain(usb0)
+                    await self._async_send_command(usb0, full_command)
+                    response_line = await self._async_receive_response(usb0, frame_complete)
+                    log.debug("usb response was: %s", response_line)
+                    return response_line
+                except (TimeoutError, OSError) as e:
+                    log.warning(f"Communication attempt {attempt + 1} failed: {e}")
+                    self._close()
+                    if attempt == self._max_retries - 1:
+                        error_msg = f"Communication failed after {self._max_retries} attempts: {e}"
+                        log.error(error_msg)
+                        return {"ERROR": [error_msg, ""]}
+                    await asyncio.sleep(0.1 * (attempt + 1))
+        return {"ERROR": ["Unexpected error in communication retry loop", ""]}
+
+    async def _async_send_command(self, usb_fd: int, full_command: bytes) -> None:
+        """Send command to the USB device from the event loop"""
+        deadline = time.monotonic() + self._timeout
+        for chunk in self._reports(full_command):
+            log.debug("Sending chunk: %s", bytes(chunk))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await wait_writable(usb_fd, remaining):
+                raise TimeoutError(f"Overall timeout ({self._timeout}s) exceeded while sending command")
             try:
-                time.sleep(0.15)
-                r = os.read(usb_fd, 256)
-                if r:  # Only add if we got data
-                    response_line += r
-                    log.debug(f"Read {len(r)} bytes, total: {len(response_line)}")
-                
-                # Check if we have a complete response (ends with \r)
-                if bytes([13]) in response_line:
-                    # Remove anything after the \r
-                    response_line = response_line[:response_line.find(bytes([13])) + 1]
-                    log.debug("Complete response received")
-                    break
-                    
+                os.write(usb_fd, chunk)
             except OSError as e:
-                if e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
-                    # No data available, this is expected with non-blocking I/O
-                    log.debug("No data available (EAGAIN/EWOULDBLOCK)")
-                elif e.errno == errno.ETIMEDOUT or e.errno == 110:  # 110 is ETIMEDOUT on some systems
-                    raise TimeoutError(f"Read operation timed out: {e}") from e
-                else:
-                    log.debug(f"USB read error: {e}")
-                    # For other errors, we might want to continue trying
-                    
-            read_attempts += 1
-        
-        if read_attempts >= max_read_attempts:
-            raise TimeoutError(f"Maximum read attempts ({max_read_attempts}) exceeded")
-            
-        if not response_line:
-            raise TimeoutError("No response received from device")
-            
-        return response_line
+                raise OSError(f"Failed to send command: {e}") from e
+
+    async def _async_receive_response(self, usb_fd: int, frame_complete=cr_terminated) -> bytes:
+        """Receive response from the USB device on the event loop, until frame_complete or the timeout"""
+        response_line = bytearray()
+        deadline = time.monotonic() + self._timeout
+        while not frame_complete(response_line):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await wait_readable(usb_fd, remaining):
+                raise TimeoutError(f"Overall timeout ({self._timeout}s) exceeded while reading response")
+            response_line += self._read(usb_fd)
+        return self._trim(response_line)
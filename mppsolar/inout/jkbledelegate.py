@@ -1,6 +1,8 @@
 from bluepy import btle
 import logging
 
+from .jkblerecords import FrameAssembler
+
 
 log = logging.getLogger("jkBleDelegate")
 
@@ -19,27 +21,13 @@ class jkBleDelegate(btle.DefaultDelegate):
             exit(1)
         self._protocol = protocol
         self._record_type = record_type
-        self.notificationData = bytearray()
+        # (an assembler without a record_type keeps records of every type)
+        self._assembler = FrameAssembler(record_type)
 
     def handleNotification(self, handle, data):
         # handle is the handle of the characteristic / descriptor that posted the notification
         # data is the data in this notification - may take multiple notifications to get all of a message
         log.debug("From handle: {:#04x} Got {} bytes of data".format(handle, len(data)))
-        self.notificationData += bytearray(data)
-        log.debug(f"Pre wipe to start {self.notificationData}")
-        self.notificationData = self._protocol.wipe_to_start(self.notificationData)
-        log.debug(f"Post wipe to start {self.notificationData}")
-        # if not self._protocol.is_record_start(self.notificationData):
-        #     log.debug(f"Not valid start of record - wiping data {self.notificationData}")
-        #     self.notificationData = bytearray()
-        if not self._protocol.is_record_correct_type(
-            self.notificationData, self._record_type
-        ):
-            log.debug(
-                f"Not expected type of record - wiping data {self.notificationData}"
-            )
-            self.notificationData = bytearray()
-        if self._protocol.is_record_complete(self.notificationData):
-            self._jkbleio.record = self.notificationData
-            log.debug("record complete")
-            self.notificationData = bytearray()
+        self._assembler.feed(data)
+        while self._assembler.records:
+            self._jkbleio.record_received(self._assembler.records.popleft())
@@ -1,5 +1,7 @@
 """ mppsolar / inout / jkbleio.py """
 import logging
+import threading
+import time
 
 try:
     from bluepy import btle
@@ -11,6 +13,7 @@ except ImportError:
 from .baseio import BaseIO
 from ..helpers import get_kwargs
 from .jkbledelegate import jkBleDelegate
+from .jkblerecords import RecordCache
 
 log = logging.getLogger("JkBleIO")
 
@@ -18,14 +21,39 @@ getInfo = (
     b"\xaa\x55\x90\xeb\x97\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x11"
 )
 # getInfo = b"\xaa\x55\x90\xeb\x97\x00\xdf\x52\x88\x67\x9d\x0a\x09\x6b\x9a\xf6\x70\x9a\x17\xfd"
+# seconds a session poll waits for a new record
+RECORD_TIMEOUT = 10
 
 
 class JkBleIO(BaseIO):
-    def __init__(self, device_path) -> None:
+    def __init__(self, device_path, keep_open=False) -> None:
         self._device = None
         self._device_path = device_path
         self.maxConnectionAttempts = 3
         self.record = None
+        # session mode - stay connected with notifications subscribed, caching the latest record of each type
+        self._keep_open = keep_open
+        self._records = RecordCache()
+        self._last_sequence = {}
+        self._handle_read = None
+        self._lock = threading.Lock()
+
+    def record_received(self, record):
+        """
+        Called by the delegate with each complete record
+        """
+        self.record = record
+        if self._keep_open:
+            self._records.put(record)
+
+    @property
+    def port_key(self):
+        return self._device_path
+
+    def disconnect(self) -> None:
+        with self._lock:
+            if self._device is not None:
+                self.ble_disconnect()
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         # Send the full command via the communications port
@@ -38,6 +66,12 @@ class JkBleIO(BaseIO):
         record_type = command_defn["record_type"]
         log.debug(f"expected record type {record_type} for command {command}")
 
+        if self._keep_open:
+            with self._lock:
+                response = self.session_get_data(protocol, full_command, record_type)
+            log.debug(f"Raw response {response}")
+            return response
+
         # Connect to BLE device
         if self.ble_connect(self._device_path, protocol, record_type):
             response = self.ble_get_data(full_command)
@@ -78,18 +112,63 @@ class JkBleIO(BaseIO):
 
     def ble_disconnect(self):
         log.info("Disconnecting BLE Device...")
-        self._device.disconnect()
-        self._device = None
+        try:
+            self._device.disconnect()
+        finally:
+            self._device = None
+            self._handle_read = None
         return
 
-    def ble_get_data(self, command=None):
-        self.record = None
-
-        log.debug(f"Command: {command}")
-
-        if command is None:
-            return self.record
-
+    def session_get_data(self, protocol, command, record_type):
+        """
+        Get a record using the kept open session, (re)connecting if needed
+        - returns the cached record of record_type if a new one has arrived since the last poll,
+          otherwise writes command and waits for the next one
+        """
+        try:
+            if self._device is None:
+                # everything is received while connected, so start afresh
+                self._records.clear()
+                self._last_sequence = {}
+                if not self.ble_connect(self._device_path, protocol, None):
+                    log.error(f"Failed to connect to {self._device_path}")
+                    self._device = None
+                    return None
+                self._handle_read = self.ble_enable_notifications()
+            record_type = int(record_type)
+            after = self._last_sequence.get(record_type, 0)
+            # pick up anything already notified
+            while self._device.waitForNotifications(0.01):
+                pass
+            latest = self._records.get(record_type, after)
+            if latest is None:
+                log.debug(f"No new record type {record_type} cached, writing command {command}")
+                self._device.writeCharacteristic(self._handle_read, command)
+                deadline = time.monotonic() + RECORD_TIMEOUT
+                while latest is None and time.monotonic() < deadline:
+                    self._device.waitForNotifications(1.0)
+                    latest = self._records.get(record_type, after)
+            if latest is None:
+                log.warning(f"No record type {record_type} received in {RECORD_TIMEOUT}sec")
+                return None
+            sequence, record = latest
+            self._last_sequence[record_type] = sequence
+            return record[:300]
+        except Exception as e:
+            # drop the session, it will reconnect on the next poll
+            log.warning(f"BLE session error: {e}")
+            if self._device is not None:
+                try:
+                    self.ble_disconnect()
+                except Exception as e:
+                    log.debug(f"Error disconnecting: {e}")
+            return None
+
+    def ble_enable_notifications(self):
+        """
+        Find the read handle, enable notifications and send getInfo
+        - returns the read handle
+        """
         # Get the device name
         try:
             serviceId = self._device.getServiceByUUID(btle.AssignedNumbers.genericAccess)
@@ -129,6 +208,17 @@ class JkBleIO(BaseIO):
             "Write getInfo to read handle %s",
             self._device.writeCharacteristic(handleRead, getInfo)
         )
+        return handleRead
+
+    def ble_get_data(self, command=None):
+        self.record = None
+
+        log.debug(f"Command: {command}")
+
+        if command is None:
+            return self.record
+
+        handleRead = self.ble_enable_notifications()
         secs = 0
         while True:
             if self._device.waitForNotifications(1.0):
@@ -0,0 +1,165 @@
+""" mppsolar / inout / jkblerecords.py """
+import logging
+import threading
+from collections import deque
+
+from ..protocols.jkabstractprotocol import RECORD_TYPE_OFFSET, SOR, XSOR, record_length
+
+log = logging.getLogger("jkBleRecords")
+
+# bytes kept by the ring buffer, room for a record of the longest type and the notifications that complete it
+RING_CAPACITY = 1024
+
+
+class FrameAssembler:
+    """
+    Assemble complete JK BMS records from a stream of BLE notifications
+    - notifications are copied once into a fixed capacity ring buffer
+    - the start of record is searched for incrementally, from where the last search stopped
+    - the record length comes from the record type (as in jkabstractprotocol.record_length),
+      with a running checksum of the record bytes, so completion is only checked once that many bytes have arrived
+    - a record with a bad checksum is dropped and the search restarts after its start of record
+    - complete records (of record_type, if set) are appended to the records queue
+    """
+
+    def __init__(self, record_type=None, maxlen=16, capacity=RING_CAPACITY) -> None:
+        self.record_type = None if record_type is None else int(record_type)
+        self.records = deque(maxlen=maxlen)
+        self._ring = bytearray(capacity)
+        # count of records assembled
+        self.emitted = 0
+        self.reset()
+
+    def reset(self) -> None:
+        # ring index of the first byte kept, and the number of bytes kept
+        self._start = 0
+        self._size = 0
+        # offset (from _start) the start of record search has reached
+        self._scan = 0
+        # length of the record being collected (0 while searching), and the checksum of its first _summed bytes
+        self._length = 0
+        self._checksum = 0
+        self._summed = 0
+
+    def _write(self, data) -> None:
+        capacity = len(self._ring)
+        end = (self._start + self._size) % capacity
+        first = min(len(data), capacity - end)
+        self._ring[end:end + first] = data[:first]
+        self._ring[: len(data) - first] = data[first:]
+        self._size += len(data)
+
+    def _peek(self, offset, count) -> bytes:
+        """
+        Get count bytes, from offset bytes after the first byte kept
+        """
+        capacity = len(self._ring)
+        start = (self._start + offset) % capacity
+        if start + count <= capacity:
+            return bytes(self._ring[start:start + count])
+        return bytes(self._ring[start:]) + bytes(self._ring[: start + count - capacity])
+
+    def _consume(self, count) -> None:
+        self._start = (self._start + count) % len(self._ring)
+        self._size -= count
+        self._scan = max(self._scan - count, 0)
+
+    def _find_start(self) -> bool:
+        """
+        Search the bytes not yet searched for a start of record, dropping everything before it
+        - returns whether one was found, if not the last 3 bytes are kept in case it is split across notifications
+        """
+        data = self._peek(self._scan, self._size - self._scan)
+        starts = [i for i in (data.find(SOR), data.find(XSOR)) if i != -1]
+        if not starts:
+            self._scan = max(self._size - (len(SOR) - 1), self._scan)
+            self._consume(self._scan)
+            return False
+        self._consume(self._scan + min(starts))
+        return True
+
+    def _emit(self, record) -> None:
+        if self.record_type is not None and record[RECORD_TYPE_OFFSET] != self.record_type:
+            log.debug(f"Not expected type of record - dropping {record}")
+            return
+        log.debug("record complete")
+        self.records.append(record)
+        self.emitted += 1
+
+    def _assemble(self) -> None:
+        while True:
+            if not self._length:
+                if not self._find_start() or self._size <= RECORD_TYPE_OFFSET:
+                    return
+                self._length = record_length(self._peek(0, RECORD_TYPE_OFFSET + 1))
+                self._checksum = 0
+                self._summed = 0
+            # add the new bytes (up to the checksum byte) to the running checksum
+            summed = min(self._size, self._length - 1)
+            self._checksum += sum(self._peek(self._summed, summed - self._summed))
+            self._summed = summed
+            if self._size < self._length:
+                return
+            if self._checksum & 0xFF == self._ring[(self._start + self._length - 1) % len(self._ring)]:
+                self._emit(self._peek(0, self._length))
+                self._consume(self._length)
+            else:
+                # look for a start of record in what was collected
+                log.debug("No valid record found, resyncing")
+                self._consume(1)
+            self._length = 0
+
+    def feed(self, data) -> int:
+        """
+        Add the data from a notification, returns the number of records completed
+        """
+        emitted = self.emitted
+        data = bytes(data)
+        while data:
+            # at most a partial record is kept after assembling, so there is always room for more
+            free = len(self._ring) - self._size
+            self._write(data[:free])
+            data = data[free:]
+            self._assemble()
+        return self.emitted - emitted
+
+
+class RecordCache:
+    """
+    The latest complete record of each type received from a JK BMS
+    - each record gets a sequence number, so a poll can tell if a record is newer than the one it last used
+    """
+
+    def __init__(self) -> None:
+        self._records = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def put(self, record) -> int:
+        """
+        Cache record as the latest of its type, returns its sequence number
+        """
+        record_type = record[RECORD_TYPE_OFFSET]
+        with self._lock:
+            self._sequence += 1
+            self._records[record_type] = (self._sequence, bytes(record))
+            log.debug(f"cached record type {record_type} as #{self._sequence}")
+            return self._sequence
+
+    def get(self, record_type, after=0):
+        """
+        Get the (sequence, record) of the latest record of record_type, if it is newer than sequence after
+        - None if there isnt one
+        """
+        with self._lock:
+            latest = self._records.get(int(record_type))
+        if latest is None or latest[0] <= after:
+            return None
+        return latest
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
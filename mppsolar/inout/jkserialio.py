@@ -1,9 +1,9 @@
 import logging
 import serial
-import time
 
 from .baseio import BaseIO
 from ..helpers import get_kwargs
+from ..protocols.abstractprotocol import AbstractProtocol
 
 log = logging.getLogger("JKSerialIO")
 
@@ -12,7 +12,6 @@ class JKSerialIO(BaseIO):
     def __init__(self, *args, **kwargs) -> None:
         self._serial_port = get_kwargs(kwargs, "device_path")
         self._serial_baud = get_kwargs(kwargs, "serial_baud")
-        self.no_data_counter = 0
 
     def pattern_matched(self, data):
         if len(data) >= 5:
@@ -26,8 +25,12 @@ class JKSerialIO(BaseIO):
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         full_command = get_kwargs(kwargs, "full_command")
-        response_line = None
+        protocol = get_kwargs(kwargs, "protocol")
         log.debug(f"port {self._serial_port}, baudrate {self._serial_baud}")
+        # read until the end frame pattern, or the protocol's frame_complete if it has its own
+        frame_complete = self.pattern_matched
+        if protocol is not None and type(protocol).frame_complete is not AbstractProtocol.frame_complete:
+            frame_complete = protocol.frame_complete
         try:
             with serial.serial_for_url(self._serial_port, self._serial_baud) as s:
                 log.debug("Executing command via jkserialio...")
@@ -36,25 +39,9 @@ class JKSerialIO(BaseIO):
                 s.flushInput()
                 s.flushOutput()
                 s.write(full_command)
-                time.sleep(0.1)
-
-                while self.no_data_counter < 5:  # Try up to 5 times with no new data before exiting
-                    if s.in_waiting > 0:
-                        if response_line is None:
-                            response_line = bytearray()
-                        response_line.extend(s.read(s.in_waiting))
-                        self.no_data_counter = 0  # Reset counter if data was received
-        
-                        # Check if the last 5 bytes match the pattern
-                    if self.pattern_matched(response_line):
-                        log.debug("JK serial end frame pattern matched.")
-                        break  # Exit the loop if the pattern is matched
-                else:
-                    self.no_data_counter += 1
-                    time.sleep(0.01)
-
+                response_line = self.read_frame(s, frame_complete, timeout=s.timeout)
                 log.debug("serial response was: %s", response_line)
-                return response_line
+                return response_line or None
         except Exception as e:
             log.warning(f"Serial read error: {e}")
         log.info("Command execution failed")
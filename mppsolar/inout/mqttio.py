@@ -1,7 +1,12 @@
+import asyncio
 import binascii
 import json as js
 import logging
+import itertools
+import threading
 import time
+import uuid
+from collections import OrderedDict
 
 import paho.mqtt.client as mqttc
 
@@ -11,90 +16,231 @@ from .baseio import BaseIO
 log = logging.getLogger("MqttIO")
 
 
+class PendingRequest:
+    """
+    A command waiting for its result message
+    - async requests also have a future (on loop) that is resolved with the message
+    - seq is the order the requests were published in
+    """
+
+    __slots__ = ("command", "seq", "event", "message", "loop", "future")
+
+    def __init__(self, command, loop=None) -> None:
+        self.command = command
+        self.seq = None
+        self.event = threading.Event()
+        self.message = None
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+
+    def set_message(self, message) -> None:
+        self.message = message
+        self.event.set()
+        if self.future is not None:
+            # called from the mqtt network thread
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(message))
+
+
 class MqttIO(BaseIO):
     def __init__(self, *args, **kwargs) -> None:
         # self._serial_port = device_path
         # self._serial_baud = serial_baud
         self.mqtt_broker = get_kwargs(kwargs, "mqtt_broker", "localhost")
-        self.mqtt_port = self.mqtt_broker.port
-        self.mqtt_user = self.mqtt_broker.username
-        self.mqtt_pass = self.mqtt_broker.password
+        self.mqtt_host = getattr(self.mqtt_broker, "name", self.mqtt_broker)
+        self.mqtt_port = getattr(self.mqtt_broker, "port", 1883)
+        self.mqtt_user = getattr(self.mqtt_broker, "username", None)
+        self.mqtt_pass = getattr(self.mqtt_broker, "password", None)
         # self.mqtt_port = get_kwargs(kwargs, "mqtt_port", 1883)
         # self.mqtt_user = get_kwargs(kwargs, "mqtt_user")
         # self.mqtt_pass = get_kwargs(kwargs, "mqtt_pass")
         self.client_id = get_kwargs(kwargs, "client_id")
+        # seconds to wait for a result message
+        self.timeout = get_kwargs(kwargs, "mqtt_timeout", 5)
         log.info(
             f"__init__: client_id: {self.client_id}, mqtt_broker: {self.mqtt_broker}, port: {self.mqtt_port}, user: {self.mqtt_user}, pass: {self.mqtt_pass}"
         )
-        self._msg = None
+        self.command_topic = f"{self.client_id}/command"
+        self.result_topic = f"{self.client_id}/result"
+        # the long lived client, connected on first use
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._subscribed = threading.Event()
+        # in flight requests by correlation id, oldest first
+        self._pending = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._sequence = itertools.count()
+        # requests that timed out, by correlation id: (seq, command, forget at), their late results are discarded
+        self._expired = OrderedDict()
+
+    def _new_client(self):
+        # Client(client_id="", clean_session=True, userdata=None, protocol=MQTTv311, transport="tcp")
+        return mqttc.Client()
+
+    def _get_client(self):
+        """
+        Get the long lived mqtt client, creating and connecting it on first use
+        """
+        with self._client_lock:
+            if self._client is not None:
+                return self._client
+            mqtt_client = self._new_client()
+            if self.mqtt_user is not None and self.mqtt_pass is not None:
+                # auth = {"username": self.mqtt_user, "password": self.mqtt_pass}
+                log.info(f"Using mqtt authentication, username: {self.mqtt_user}, password: [supplied]")
+                mqtt_client.username_pw_set(self.mqtt_user, password=self.mqtt_pass)
+            else:
+                log.debug("No mqtt authentication used")
+            mqtt_client.on_connect = self.on_connect
+            mqtt_client.on_subscribe = self.on_subscribe
+            mqtt_client.on_message = self.sub_cb
+            mqtt_client.connect(self.mqtt_host, port=self.mqtt_port)
+            mqtt_client.loop_start()
+            # make sure results will be received before sending the first command
+            if not self._subscribed.wait(self.timeout):
+                log.warning(f"Mqttio not subscribed to {self.result_topic} after {self.timeout}sec")
+            self._client = mqtt_client
+            return mqtt_client
+
+    def on_connect(self, client, userdata, flags, rc):
+        # (re)subscribe on every connect, so results are still received after a reconnect
+        log.debug(f"Mqttio connected, rc: {rc}, subscribing to {self.result_topic}")
+        client.subscribe(self.result_topic)
+
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        self._subscribed.set()
+
+    def disconnect(self) -> None:
+        with self._client_lock:
+            if self._client is not None:
+                self._client.loop_stop()
+                self._client.disconnect()
+                self._client = None
+                self._subscribed.clear()
 
     def sub_cb(self, client, userdata, message):
         log.debug(f"Mqttio sub_cb got msg, topic: {message.topic}, payload: {message.payload}")
-        self._msg = message
+        try:
+            payload = js.loads(message.payload)
+            correlation_id, command = payload.get("id"), payload.get("command")
+        except (ValueError, AttributeError):
+            correlation_id = command = None
+        with self._pending_lock:
+            if correlation_id is not None:
+                request = self._pending.pop(correlation_id, None)
+                if request is None and self._expired.pop(correlation_id, None) is not None:
+                    log.info(f"Mqttio got late result (id: {correlation_id}) for a request that timed out, ignoring")
+                    return
+            else:
+                # a bridge that doesnt echo the correlation id, so assume results arrive in order
+                request = self._match_in_order(command)
+                if request is False:
+                    log.info(f"Mqttio got late result on {message.topic} for a request that timed out, ignoring")
+                    return
+        if request is None:
+            log.info(f"Mqttio got unexpected result (id: {correlation_id}) on {message.topic}, ignoring")
+            return
+        request.set_message(message)
+
+    def _forget_expired(self) -> None:
+        now = time.monotonic()
+        while self._expired and next(iter(self._expired.values()))[2] < now:
+            self._expired.popitem(last=False)
+
+    def _match_in_order(self, command):
+        """
+        Match a result without a correlation id to the oldest request for its command (or any command if it has none)
+        - returns the request, None if there isnt one or False if the result is (most likely) the late result
+          of an older request that timed out
+        - must be called holding the pending lock
+        """
+        self._forget_expired()
+        pending = next((cid for cid, r in self._pending.items() if command is None or r.command == command), None)
+        expired = next((cid for cid, e in self._expired.items() if command is None or e[1] == command), None)
+        if expired is not None and (pending is None or self._expired[expired][0] < self._pending[pending].seq):
+            del self._expired[expired]
+            return False
+        if pending is None:
+            return None
+        return self._pending.pop(pending)
+
+    def _publish(self, mqtt_client, request, full_command) -> str:
+        """
+        Publish the command for request, returns its correlation id
+        """
+        correlation_id = uuid.uuid4().hex
+        with self._pending_lock:
+            request.seq = next(self._sequence)
+            self._pending[correlation_id] = request
+
+        command_hex = binascii.hexlify(full_command)
+        payload = {"command": request.command, "command_hex": command_hex.decode(), "id": correlation_id}
+        payload = js.dumps(payload)
+
+        log.debug(f"Publishing {payload} to topic: {self.command_topic}")
+        mqtt_client.publish(self.command_topic, payload=payload)
+        return correlation_id
+
+    def _timed_out(self, correlation_id) -> dict:
+        with self._pending_lock:
+            request = self._pending.pop(correlation_id, None)
+            self._forget_expired()
+            if request is not None:
+                # remember it for a while, so its result (if it turns up) isnt taken for a later request's
+                self._expired[correlation_id] = (request.seq, request.command, time.monotonic() + self.timeout)
+        # Didnt get a result
+        return {
+            "ERROR": [
+                f"Mqtt result message not received on topic {self.result_topic} after {self.timeout}sec",
+                "",
+            ]
+        }
+
+    def _decode_result(self, message) -> bytes:
+        # decode the payload
+        # payload should be a json dumped byte string
+        # payload: b'{"command_hex": "515049beac0d", "result": "", "command": "QPI", "id": "..."}'
+        log.debug(f"mqtt raw response on {message.topic} was: {message.payload}, payload type: {type(message.payload)}")
+        # Return the byte-string to a dict
+        payload_dict = js.loads(message.payload)
+        # Get 'results', and convert back to bytes
+        result = binascii.unhexlify(payload_dict["result"])
+        # TODO: Currently ignoring this - might want to update return types at some point
+        cmd = payload_dict["command"]
+        log.debug(f"mqtt response on {message.topic} for command {cmd} was: {result}")
+        return result
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         full_command = get_kwargs(kwargs, "full_command")
         command = get_kwargs(kwargs, "command")
-        client_id = self.client_id
-
-        wait_time = 5
-        # response_line = None
-        command_topic = f"{client_id}/command"
-        result_topic = f"{client_id}/result"
-        # print(self.mqtt_broker)
-        # Create mqtt client
-        # Client(client_id="", clean_session=True, userdata=None, protocol=MQTTv311, transport="tcp")
-        mqtt_client = mqttc.Client()
-        # mqtt_client.on_connect = on_connect
 
-        if self.mqtt_user is not None and self.mqtt_pass is not None:
-            # auth = {"username": self.mqtt_user, "password": self.mqtt_pass}
-            log.info(
-                f"Using mqtt authentication, username: {self.mqtt_user}, password: [supplied]"
-            )
-            mqtt_client.username_pw_set(self.mqtt_user, password=self.mqtt_pass)
-        else:
-            log.debug("No mqtt authentication used")
-            # auth = None
+        try:
+            mqtt_client = self._get_client()
+        except Exception as e:
+            log.warning(f"Mqtt connection error: {e}")
+            return {"ERROR": [f"Unable to connect to mqtt broker {self.mqtt_host}: {e}", ""]}
 
-        mqtt_client.connect(self.mqtt_broker, port=self.mqtt_port)
+        request = PendingRequest(command)
+        correlation_id = self._publish(mqtt_client, request, full_command)
+        if not request.event.wait(self.timeout):
+            return self._timed_out(correlation_id)
+        return self._decode_result(request.message)
 
-        command_hex = binascii.hexlify(full_command)
-        payload = {"command": command, "command_hex": command_hex.decode()}
-        payload = js.dumps(payload)
+    async def async_send_and_receive(self, *args, **kwargs) -> dict:
+        full_command = get_kwargs(kwargs, "full_command")
+        command = get_kwargs(kwargs, "command")
+        loop = asyncio.get_running_loop()
+
+        try:
+            # connecting (and waiting for the subscription) blocks, but only happens once
+            mqtt_client = await loop.run_in_executor(None, self._get_client)
+        except Exception as e:
+            log.warning(f"Mqtt connection error: {e}")
+            return {"ERROR": [f"Unable to connect to mqtt broker {self.mqtt_host}: {e}", ""]}
 
-        log.debug(f"Publishing {payload} to topic: {command_topic}")
-
-        mqtt_client.publish(command_topic, payload=payload)
-
-        mqtt_client.on_message = self.sub_cb
-        mqtt_client.subscribe(result_topic)
-        mqtt_client.loop_start()
-        time.sleep(wait_time)
-        mqtt_client.loop_stop(force=False)
-
-        if self._msg is None:
-            # Didnt get a result
-            return {
-                "ERROR": [
-                    f"Mqtt result message not received on topic {result_topic} after {wait_time}sec",
-                    "",
-                ]
-            }
-        else:
-            msg_topic = self._msg.topic
-            # decode the payload
-            # payload should be a json dumped byte string
-            # payload: b'{"command_hex": "515049beac0d", "result": "", "command": "QPI"}'
-            log.debug(
-                f"mqtt raw response on {self._msg.topic} was: {self._msg.payload}, payload type: {type(self._msg.payload)}"
-            )
-            # Return the byte-string to a dict
-            payload_dict = js.loads(self._msg.payload)
-            # Get 'results', and convert back to bytes
-            result = binascii.unhexlify(payload_dict["result"])
-            # TODO: Currently ignoring this - might want to update return types at some point
-            cmd = payload_dict["command"]
-            self._msg = None
-            log.debug(f"mqtt response on {msg_topic} for command {cmd} was: {result}")
-            return result
+        request = PendingRequest(command, loop=loop)
+        correlation_id = self._publish(mqtt_client, request, full_command)
+        try:
+            message = await asyncio.wait_for(request.future, self.timeout)
+        except asyncio.TimeoutError:
+            return self._timed_out(correlation_id)
+        return self._decode_result(message)
@@ -1,34 +1,155 @@
 import logging
+import select
 import socket
+import threading
 import time
 
-from .baseio import BaseIO
+from .baseio import BaseIO, get_async_lock
 from ..helpers import get_kwargs
 
 log = logging.getLogger("remoteSocketIO")
 
+# seconds to wait to connect, and for a complete response
+CONNECT_TIMEOUT = 5
+RESPONSE_TIMEOUT = 5
+# once a response has started, seconds without data after which it is assumed complete
+# (for protocols whose frame_complete doesnt recognise their responses)
+IDLE_TIMEOUT = 0.5
+
+# Persistent connections, one per (ip, port), shared by every device using that gateway port
+_connections = {}
+# Per (ip, port) locks, so commands from different callers dont interleave on a connection
+_connection_locks = {}
+_connection_locks_lock = threading.Lock()
+
+
+def get_connection_lock(address) -> threading.Lock:
+    """
+    Get the lock for the connection to address
+    """
+    with _connection_locks_lock:
+        lock = _connection_locks.get(address)
+        if lock is None:
+            lock = threading.Lock()
+            _connection_locks[address] = lock
+        return lock
+
 
 class remoteSocketIO(BaseIO):
     def __init__(self, *args, **kwargs) -> None:
         self._remote_ip = get_kwargs(kwargs, "remote_ip")
         self._remote_port = get_kwargs(kwargs, "remote_port")
+        self._address = (self._remote_ip, self._remote_port)
+
+    def _connect(self) -> socket.socket:
+        log.debug(f"Connecting to {self._remote_ip}:{self._remote_port}")
+        s = socket.create_connection(self._address, timeout=CONNECT_TIMEOUT)
+        # send commands straight away, and notice if the gateway goes away
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        s.settimeout(RESPONSE_TIMEOUT)
+        return s
+
+    def _get_connection(self):
+        """
+        Get the persistent connection to the gateway, connecting if needed
+        - returns (connection, reused), must be called holding the connection lock
+        """
+        s = _connections.get(self._address)
+        if s is not None:
+            return s, True
+        s = self._connect()
+        _connections[self._address] = s
+        return s, False
+
+    def _close_connection(self) -> None:
+        """
+        Close and forget the persistent connection
+        - must be called holding the connection lock
+        """
+        s = _connections.pop(self._address, None)
+        if s is not None:
+            try:
+                s.close()
+            except Exception as e:
+                log.debug(f"Error closing connection to {self._remote_ip}:{self._remote_port}: {e}")
+
+    def _drain(self, s) -> None:
+        """
+        Discard anything left over from an earlier (timed out) command
+        """
+        while select.select([s], [], [], 0)[0]:
+            if not s.recv(4096):
+                raise ConnectionError("Connection closed by gateway")
+
+    def _read_frame(self, s, frame_complete) -> bytes:
+        """
+        Read a response until frame_complete, the line goes quiet or RESPONSE_TIMEOUT
+        """
+        buffer = bytearray()
+        deadline = time.monotonic() + RESPONSE_TIMEOUT
+        while not (buffer and frame_complete is not None and frame_complete(buffer)):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait = min(remaining, IDLE_TIMEOUT) if buffer else remaining
+            if not select.select([s], [], [], wait)[0]:
+                if buffer:
+                    log.debug(f"no data for {IDLE_TIMEOUT}s, assuming response complete")
+                    break
+                continue
+            chunk = s.recv(4096)
+            if not chunk:
+                raise ConnectionError("Connection closed by gateway")
+            buffer.extend(chunk)
+        return bytes(buffer)
+
+    def _exchange(self, s, full_command, frame_complete) -> bytes:
+        self._drain(s)
+        log.debug("Executing command via remoteserialio...")
+        s.sendall(full_command)
+        response_line = self._read_frame(s, frame_complete)
+        log.debug("socket response was: %s", response_line)
+        return response_line
+
+    @property
+    def port_key(self):
+        return self._address
+
+    def disconnect(self) -> None:
+        with get_connection_lock(self._address):
+            self._close_connection()
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         full_command = get_kwargs(kwargs, "full_command")
-        response_line = None
+        protocol = get_kwargs(kwargs, "protocol")
+        frame_complete = protocol.frame_complete if protocol is not None else None
         log.debug(f"host ip: {self._remote_ip}, host port: {self._remote_port}")
 
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self._remote_ip, self._remote_port))
-                log.debug("Executing command via remoteserialio...")
-                s.send(full_command)
-                time.sleep(0.1)  # give serial port time to receive the data
-                response_line = s.recv(1024)
-                # response_line = s.read_until(b"\r")
-                log.debug("socket response was: %s", response_line)
-                return response_line
-        except Exception as e:
-            log.warning(f"socket read error: {e}")
+        with get_connection_lock(self._address):
+            try:
+                s, reused = self._get_connection()
+                try:
+                    return self._exchange(s, full_command, frame_complete)
+                except OSError as e:
+                    if not reused:
+                        raise
+                    # the gateway may have dropped an idle connection, so reconnect and try once more
+                    log.info(f"Connection to {self._remote_ip}:{self._remote_port} failed ({e}), reconnecting")
+                    self._close_connection()
+                    s, _ = self._get_connection()
+                    return self._exchange(s, full_command, frame_complete)
+            except Exception as e:
+                log.warning(f"socket read error: {e}")
+                self._close_connection()
         log.info("Command execution failed")
         return {"ERROR": ["Socket command execution failed", ""]}
+
+    async def async_send_and_receive(self, *args, **kwargs) -> dict:
+        """
+        Async version of send_and_receive
+        - the command is sent on the shared connection from a worker thread, holding the connection lock,
+          so async commands take turns with commands from other threads and there is only one connection to the gateway
+        """
+        async with get_async_lock(self._address):
+            return await super().async_send_and_receive(*args, **kwargs)
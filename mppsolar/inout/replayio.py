@@ -0,0 +1,55 @@
+""" mppsolar / inout / replayio.py """
+import logging
+import time
+
+from .baseio import BaseIO
+from .captureio import read_capture
+from ..helpers import get_kwargs
+
+log = logging.getLogger("ReplayIO")
+
+
+class ReplayIO(BaseIO):
+    """
+    Play back the responses recorded in a capture log (see CaptureIO)
+    - each command gets the recorded responses to that command in turn, starting again once they are used up
+    - if port_filter is set only the records captured from that port are used
+    - realtime replays each response at its recorded time (relative to the first command replayed, which is taken as
+      the time the earliest recorded command was sent), and after at least its recorded latency,
+      otherwise they are returned as fast as possible
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._path = get_kwargs(kwargs, "device_path")
+        self._port_filter = get_kwargs(kwargs, "port_filter")
+        self._realtime = get_kwargs(kwargs, "realtime", False)
+        self._records = {}
+        self._positions = {}
+        # when the earliest recorded command was sent, and the offset from the recorded times to time.monotonic()
+        self._capture_start = None
+        self._offset = None
+        for record in read_capture(self._path):
+            if self._port_filter is not None and record.port != self._port_filter:
+                continue
+            self._records.setdefault(record.command, []).append(record)
+            sent = record.timestamp - record.latency
+            if self._capture_start is None or sent < self._capture_start:
+                self._capture_start = sent
+        log.info(f"Loaded {sum(len(r) for r in self._records.values())} records for {len(self._records)} commands from {self._path}")
+
+    def send_and_receive(self, *args, **kwargs) -> dict:
+        command = get_kwargs(kwargs, "command")
+        records = self._records.get(command)
+        if not records:
+            return {"ERROR": [f"No captured response for {command} in {self._path}", ""]}
+        position = self._positions.get(command, 0)
+        record = records[position]
+        self._positions[command] = (position + 1) % len(records)
+        if self._realtime:
+            now = time.monotonic()
+            if self._offset is None:
+                self._offset = now - self._capture_start
+            # (once the responses start again, their recorded times have passed so only the latency is kept)
+            time.sleep(max(record.timestamp + self._offset - now, record.latency))
+        log.debug(f"Replaying response {record.response} to {command} captured at {record.timestamp}")
+        return record.response
@@ -1,35 +1,128 @@
 import logging
 import serial
-import time
+import threading
 
-from .baseio import BaseIO
+from .baseio import BaseIO, get_async_lock, hold_thread_lock
 from ..helpers import get_kwargs
 
 log = logging.getLogger("SerialIO")
 
+# Long lived ports (for keep_open mode), one per device path
+_open_ports = {}
+# Per device path locks, so concurrent callers (eg the main loop and mqtt commands) take turns on a port
+_port_locks = {}
+_port_locks_lock = threading.Lock()
+
+
+def get_port_lock(device_path) -> threading.Lock:
+    """
+    Get the lock for device_path
+    """
+    with _port_locks_lock:
+        lock = _port_locks.get(device_path)
+        if lock is None:
+            lock = threading.Lock()
+            _port_locks[device_path] = lock
+        return lock
+
 
 class SerialIO(BaseIO):
     def __init__(self, *args, **kwargs) -> None:
         self._serial_port = get_kwargs(kwargs, "device_path")
         self._serial_baud = get_kwargs(kwargs, "serial_baud")
+        # keep the port open between commands (rather than open and close it for each command)
+        self._keep_open = get_kwargs(kwargs, "keep_open", False)
+
+    def _open(self):
+        s = serial.serial_for_url(self._serial_port, self._serial_baud)
+        s.timeout = 1
+        s.write_timeout = 1
+        return s
+
+    def _get_open_port(self):
+        """
+        Get the long lived port for this device path, (re)opening it if needed
+        - must be called holding the port lock
+        """
+        s = _open_ports.get(self._serial_port)
+        if s is not None and not s.is_open:
+            log.info(f"Port {self._serial_port} was closed, reopening")
+            s = None
+        if s is None:
+            log.debug(f"Opening port {self._serial_port} to keep open")
+            s = self._open()
+            _open_ports[self._serial_port] = s
+        return s
+
+    def _close_open_port(self):
+        """
+        Close and forget the long lived port for this device path
+        - must be called holding the port lock
+        """
+        s = _open_ports.pop(self._serial_port, None)
+        if s is not None:
+            try:
+                s.close()
+            except Exception as e:
+                log.debug(f"Error closing port {self._serial_port}: {e}")
+
+    def _exchange(self, s, full_command, protocol=None):
+        log.debug("Executing command via serialio...")
+        s.flushInput()
+        s.flushOutput()
+        s.write(full_command)
+        # read until the protocol says the response is complete (default is \r terminated)
+        frame_complete = protocol.frame_complete if protocol is not None else None
+        response_line = self.read_frame(s, frame_complete, timeout=s.timeout)
+        log.debug("serial response was: %s", response_line)
+        return response_line
+
+    async def _async_exchange(self, s, full_command, protocol=None):
+        log.debug("Executing command via serialio (async)...")
+        s.flushInput()
+        s.flushOutput()
+        s.write(full_command)
+        frame_complete = protocol.frame_complete if protocol is not None else None
+        response_line = await self.async_read_frame(s, frame_complete, timeout=s.timeout)
+        log.debug("serial response was: %s", response_line)
+        return response_line
+
+    def disconnect(self) -> None:
+        if self._keep_open:
+            with get_port_lock(self._serial_port):
+                self._close_open_port()
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         full_command = get_kwargs(kwargs, "full_command")
-        response_line = None
-        log.debug(f"port {self._serial_port}, baudrate {self._serial_baud}")
-        try:
-            with serial.serial_for_url(self._serial_port, self._serial_baud) as s:
-                log.debug("Executing command via serialio...")
-                s.timeout = 1
-                s.write_timeout = 1
-                s.flushInput()
-                s.flushOutput()
-                s.write(full_command)
-                time.sleep(0.1)  # give serial port time to receive the data
-                response_line = s.read_until(b"\r")
-                log.debug("serial response was: %s", response_line)
-                return response_line
-        except Exception as e:
-            log.warning(f"Serial read error: {e}")
+        protocol = get_kwargs(kwargs, "protocol")
+        log.debug(f"port {self._serial_port}, baudrate {self._serial_baud}, keep_open {self._keep_open}")
+        with get_port_lock(self._serial_port):
+            try:
+                if self._keep_open:
+                    return self._exchange(self._get_open_port(), full_command, protocol)
+                with self._open() as s:
+                    return self._exchange(s, full_command, protocol)
+            except Exception as e:
+                log.warning(f"Serial read error: {e}")
+                if self._keep_open:
+                    # drop the port, it will be reopened for the next command
+                    self._close_open_port()
+        log.info("Command execution failed")
+        return {"ERROR": ["Serial command execution failed", ""]}
+
+    async def async_send_and_receive(self, *args, **kwargs) -> dict:
+        full_command = get_kwargs(kwargs, "full_command")
+        protocol = get_kwargs(kwargs, "protocol")
+        log.debug(f"port {self._serial_port}, baudrate {self._serial_baud}, keep_open {self._keep_open} (async)")
+        async with get_async_lock(self._serial_port), hold_thread_lock(get_port_lock(self._serial_port)):
+            try:
+                if self._keep_open:
+                    return await self._async_exchange(self._get_open_port(), full_command, protocol)
+                with self._open() as s:
+                    return await self._async_exchange(s, full_command, protocol)
+            except Exception as e:
+                log.warning(f"Serial read error: {e}")
+                if self._keep_open:
+                    self._close_open_port()
         log.info("Command execution failed")
         return {"ERROR": ["Serial command execution failed", ""]}
@@ -1,4 +1,10 @@
 import logging
+import queue
+import re
+import threading
+import time
+from collections import deque
+
 import serial
 
 # import time
@@ -7,13 +13,178 @@ from .baseio import BaseIO
 from ..helpers import get_kwargs
 
 log = logging.getLogger("VSerialIO")
+# how long to listen for VE.Direct text blocks (a partial block and 2 whole blocks, which are sent every second)
+VEDTEXT_TIMEOUT = 5
+# blocks older than this are stale (eg the device has stopped sending or been unplugged), and not returned
+MAX_BLOCK_AGE = 5
+# a text block ends with the Checksum field and its single byte value
+CHECKSUM_FIELD = b"Checksum\t"
+# HEX protocol messages can be interleaved with the text blocks
+HEX_MESSAGE = re.compile(rb":[0-9A-Fa-f]+\n")
+# drop unframed data beyond this (eg a port not sending text blocks)
+MAX_BUFFER = 4096
+
+# Streaming readers (for keep_open mode), one per device path
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+class VEDTextStream:
+    """
+    Read the VE.Direct text blocks a device sends every second, in a background thread
+    - blocks are framed on the Checksum field, and only kept if the bytes of the block sum to 0 (modulo 256)
+    - the latest valid block of each kind (by its first field, as some devices alternate 2 blocks) is kept,
+      plus an optional bounded history of blocks, blocks older than max_age seconds arent returned
+    - HEX protocol messages are passed to hex_messages
+    """
+
+    def __init__(self, port=None, history=0, max_age=MAX_BLOCK_AGE) -> None:
+        self._port = port
+        self.max_age = max_age
+        self._buffer = bytearray()
+        self._latest = {}
+        self.history = deque(maxlen=history) if history else None
+        self.hex_messages = queue.Queue()
+        self.valid_blocks = 0
+        self.invalid_blocks = 0
+        self._updated = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __str__(self):
+        return f"VEDTextStream: {self._port}, valid blocks: {self.valid_blocks}, invalid blocks: {self.invalid_blocks}"
+
+    def feed(self, data) -> None:
+        """
+        Add data read from the port, framing any complete blocks
+        """
+        self._buffer += data
+        for message in HEX_MESSAGE.findall(self._buffer):
+            self.hex_messages.put(message)
+        if b":" in self._buffer:
+            self._buffer = bytearray(HEX_MESSAGE.sub(b"", self._buffer))
+        while True:
+            checksum = self._buffer.find(CHECKSUM_FIELD)
+            end = checksum + len(CHECKSUM_FIELD) + 1
+            if checksum == -1 or len(self._buffer) < end:
+                break
+            block = bytes(self._buffer[:end])
+            del self._buffer[:end]
+            self._add_block(block)
+        if len(self._buffer) > MAX_BUFFER:
+            del self._buffer[:-MAX_BUFFER]
+
+    def _add_block(self, block) -> None:
+        if sum(block) & 0xFF:
+            # includes the partial block read when the stream starts
+            log.debug(f"Dropping text block with invalid checksum: {block}")
+            self.invalid_blocks += 1
+            return
+        kind = block.lstrip(b"\r\n").split(b"\t", 1)[0]
+        with self._updated:
+            self._latest[kind] = (time.monotonic(), block)
+            if self.history is not None:
+                self.history.append(block)
+            self.valid_blocks += 1
+            self._updated.notify_all()
+
+    def _current(self) -> list:
+        """
+        The latest block of each kind received in the last max_age seconds
+        - must be called holding _updated
+        """
+        oldest = time.monotonic() - self.max_age
+        return [block for received, block in self._latest.values() if received >= oldest]
+
+    def latest(self, timeout=0):
+        """
+        Get the latest valid block of each kind, waiting up to timeout seconds if there isnt a current one
+        - None if there isnt one (eg the device has stopped sending)
+        """
+        with self._updated:
+            blocks = self._current()
+            if not blocks and timeout:
+                blocks = self._updated.wait_for(self._current, timeout)
+            if not blocks:
+                return None
+            return b"".join(blocks)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name=f"VEDTextStream {self._port.port}", daemon=True)
+        self._thread.start()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self) -> None:
+        log.debug(f"Streaming text blocks from {self._port.port}")
+        try:
+            while not self._stop.is_set():
+                data = self._port.read(self._port.in_waiting or 1)
+                if data:
+                    self.feed(data)
+        except Exception as e:
+            log.warning(f"VSerial stream read error: {e}")
+        finally:
+            self._port.close()
+
+    def write(self, data) -> None:
+        self._port.write(data)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2)
 
 
 class VSerialIO(BaseIO):
     def __init__(self, *args, **kwargs) -> None:
         self._serial_port = get_kwargs(kwargs, "device_path")
         self._serial_baud = get_kwargs(kwargs, "serial_baud")
-        self._records = get_kwargs(kwargs, "records")
+        # keep the port open, streaming text blocks in the background
+        self._keep_open = get_kwargs(kwargs, "keep_open", False)
+
+    def _get_stream(self) -> VEDTextStream:
+        """
+        Get the streaming reader for this device path, (re)starting it if needed
+        """
+        with _streams_lock:
+            stream = _streams.get(self._serial_port)
+            if stream is None or not stream.is_alive():
+                log.debug(f"Starting text block stream on {self._serial_port}")
+                s = serial.serial_for_url(self._serial_port, self._serial_baud)
+                s.timeout = 1
+                s.write_timeout = 1
+                stream = VEDTextStream(s)
+                stream.start()
+                _streams[self._serial_port] = stream
+            return stream
+
+    def disconnect(self) -> None:
+        if self._keep_open:
+            with _streams_lock:
+                stream = _streams.pop(self._serial_port, None)
+            if stream is not None:
+                stream.stop()
+
+    def _stream_send_and_receive(self, full_command):
+        stream = self._get_stream()
+        if full_command == "VEDTEXT":
+            # text blocks are sent every second, so only the first poll has to wait
+            responses = stream.latest(timeout=VEDTEXT_TIMEOUT)
+            if responses is None:
+                raise TimeoutError(f"No valid text block received in the last {stream.max_age}sec")
+            log.debug("vserial response was: %s", responses)
+            return responses
+        # drop any unclaimed HEX messages before sending the command
+        while not stream.hex_messages.empty():
+            stream.hex_messages.get_nowait()
+        if isinstance(full_command, str):
+            full_command = full_command.encode()
+        stream.write(full_command)
+        response_line = stream.hex_messages.get(timeout=1)
+        log.debug("vserial response was: %s", response_line)
+        return response_line
 
     def send_and_receive(self, *args, **kwargs) -> dict:
         # self._port.send_and_receive(
@@ -23,15 +194,27 @@ class VSerialIO(BaseIO):
         #    command_defn=self._protocol.get_command_defn(command),
 
         full_command = get_kwargs(kwargs, "full_command")
+        protocol = get_kwargs(kwargs, "protocol")
+        frame_complete = protocol.frame_complete if protocol is not None else None
         # print(full_command)
         # "VEDTEXT"
-        responses = b""
-        log.debug(
-            f"port {self._serial_port}, baudrate {self._serial_baud}, records {self._records}"
-        )
+        log.debug(f"port {self._serial_port}, baudrate {self._serial_baud}, keep_open {self._keep_open}")
+
+        if self._keep_open:
+            try:
+                return self._stream_send_and_receive(full_command)
+            except Exception as e:
+                log.warning(f"VSerial stream error: {e}")
+            log.info(f"Error occured while processing command {full_command} on {self._serial_port}")
+            return {
+                "ERROR": [
+                    f"Error occured while processing command {full_command} on {self._serial_port}",
+                    "",
+                ]
+            }
 
         if full_command == "VEDTEXT":
-            # Just grab _records from the serial port
+            # Just listen to the serial port until the protocol has the text blocks it needs
             try:
                 with serial.serial_for_url(self._serial_port, self._serial_baud) as s:
                     # log.debug(f"Executing command via serialio...")
@@ -41,10 +224,9 @@ class VSerialIO(BaseIO):
                     # s.flushOutput()
                     # s.write(full_command)
                     # time.sleep(0.1)  # give serial port time to receive the data
-                    for _ in range(self._records):
-                        response_line = s.read_until(b"\n")
-                        log.debug("vserial response was: %s", response_line)
-                        responses += response_line
+                    # text blocks are sent every second
+                    responses = self.read_frame(s, frame_complete, timeout=VEDTEXT_TIMEOUT)
+                    log.debug("vserial response was: %s", responses)
                     return responses
             except Exception as e:
                 log.warning(f"VSerial read error: {e}")
@@ -65,8 +247,7 @@ class VSerialIO(BaseIO):
                     s.flushInput()
                     s.flushOutput()
                     s.write(full_command)
-                    # time.sleep(0.1)  # give serial port time to receive the data
-                    response_line = s.read_until(b"\n")
+                    response_line = self.read_frame(s, frame_complete, timeout=s.timeout)
                     log.debug("vserial response was: %s", response_line)
                     return response_line
             except Exception as e:
@@ -211,7 +211,8 @@ class MqttConnection:
         response_topic = f"{hostname}/{device_name}/cmd_response"
 
         if isinstance(response, dict):
-            payload = json.dumps(response)
+            # default=str for values (eg the raw_response) that arent json types
+            payload = json.dumps(response, default=str)
         else:
             payload = str(response)
         log.debug(f"Sending command response with QoS=1, retain=True to topic: {response_topic}")
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Simulate inverters and BMSs, for testing and load testing without any hardware
+
+Each simulated device answers the commands of its protocol with the test_responses from the protocol definition
+(PI style CRCs are corrected where a recorded response doesnt have them), after a configurable latency and jitter,
+optionally with injected faults. Devices are served on ptys (use porttype=serial etc) and/or tcp ports
+(use porttype=remotesocket), all from one event loop thread so hundreds of devices can be run on a laptop
+
+usage: python -m mppsolar.libs.simulator -P PI30MAX -n 100 --tcp 9000 --config sim.conf
+       mpp-solar -C sim.conf
+"""
+import argparse
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import selectors
+import socket
+import threading
+import time
+import tty
+from collections import Counter
+
+from ..protocols import get_protocol
+from ..protocols.protocol_checksums import crcPI
+
+log = logging.getLogger("simulator")
+
+FAULTS = ("drop", "nak", "corrupt", "truncate")
+# seconds between VE.Direct text blocks (as sent by a real device)
+VEDTEXT_INTERVAL = 1
+# requests longer than this without a recognised command or terminator are discarded
+MAX_REQUEST = 256
+# the pi17 / pi18 command prefix, eg ^P005
+COMMAND_PREFIX = re.compile(r"^\^[PS]\d{3}")
+
+# porttype to use for each protocol's devices when served on a pty
+PTY_PORTTYPES = {
+    "JK485": "jkserial",
+    "JKPB": "jkserial",
+    "DALY": "daly",
+    "DALY40": "daly",
+    "VED": "vserial",
+}
+
+
+def parse_faults(faults) -> dict:
+    """
+    Parse a fault specification, eg drop=0.01,corrupt=0.05 into a dict of fault: probability
+    """
+    result = {}
+    if not faults:
+        return result
+    for item in faults.split(","):
+        name, _, probability = item.partition("=")
+        name = name.strip().lower()
+        if name not in FAULTS:
+            raise ValueError(f"Unknown fault '{name}', must be one of {', '.join(FAULTS)}")
+        result[name] = float(probability)
+    if sum(result.values()) > 1:
+        raise ValueError(f"Fault probabilities add up to more than 1: {faults}")
+    return result
+
+
+class SimulatedDevice:
+    """
+    A device that answers the commands of protocol from the protocol's test_responses
+    - latency + a random 0 - jitter seconds is added before each response
+    - faults is a dict of fault: probability (see parse_faults)
+    - parallel is the number of inverters in a parallel set, QPGSn is answered for n less than parallel
+    """
+
+    def __init__(self, protocol, name=None, latency=0.0, jitter=0.0, faults=None, parallel=1, seed=None) -> None:
+        self.protocol_id = protocol.upper()
+        self.protocol = get_protocol(protocol)
+        if self.protocol is None:
+            raise ValueError(f"No protocol found for {protocol}")
+        self.name = name or self.protocol_id
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = faults or {}
+        self.parallel = parallel
+        self._random = random.Random(seed)
+        self.stats = Counter()
+        # full command bytes -> command, for the commands that can be sent
+        self._requests = {}
+        # command name -> responses, and the position of the next one to use
+        self._responses = {}
+        self._positions = {}
+        self._nak = None
+        self.text_blocks = []
+        for command, command_defn in self.protocol.COMMANDS.items():
+            responses = []
+            for response in command_defn.get("test_responses", []):
+                if not response:
+                    continue
+                response = self._with_crc(response)
+                if b"NAK" in response:
+                    if self._nak is None:
+                        self._nak = response
+                    continue
+                responses.append(response)
+            if command_defn.get("type") == "VEDTEXT":
+                # text blocks arent requested, they are sent continuously
+                self.text_blocks.extend(responses)
+                continue
+            self._responses[command_defn.get("name", command)] = responses
+            if "regex" in command_defn:
+                # these need a value, so are recognised from the request
+                continue
+            full_command = self.protocol.get_full_command(command)
+            if isinstance(full_command, str):
+                # eg VE.Direct HEX commands
+                full_command = full_command.encode("utf-8")
+            if isinstance(full_command, (bytes, bytearray)):
+                self._requests[bytes(full_command)] = command
+        self._request_lengths = sorted({len(r) for r in self._requests}, reverse=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.protocol_id})"
+
+    def _with_crc(self, response) -> bytes:
+        """
+        Get response as bytes, with the CRC corrected if it is a PI style (...CRC\\r) response that fails validation
+        """
+        if isinstance(response, str):
+            response = response.encode("latin-1")
+        if not (response.startswith(b"(") and response.endswith(b"\r") and len(response) > 3):
+            return response
+        try:
+            if self.protocol.check_response_valid(response)[0]:
+                return response
+        except Exception:
+            return response
+        body = response[:-3]
+        fixed = body + bytes(crcPI(body)) + b"\r"
+        try:
+            valid = self.protocol.check_response_valid(fixed)[0]
+        except Exception:
+            valid = False
+        return fixed if valid else response
+
+    def next_request(self, buffer):
+        """
+        Get the first complete request in buffer, None if there isnt one yet
+        """
+        for length in self._request_lengths:
+            if len(buffer) >= length and bytes(buffer[:length]) in self._requests:
+                return bytes(buffer[:length])
+        for terminator in (b"\r", b"\n"):
+            end = buffer.find(terminator)
+            if end != -1:
+                return bytes(buffer[: end + 1])
+        return None
+
+    def _resolve(self, request):
+        """
+        Find the command for a request that isnt a fixed command (eg QPGS1 or a setter with a value)
+        - the command must give back exactly the same request, so requests with bad CRCs are not answered
+        """
+        text = COMMAND_PREFIX.sub("", request.decode("latin-1").rstrip("\r\n"))
+        for command in (text, text[:-2]):
+            if not command or self.protocol.resolve_command(command) is None:
+                continue
+            if self.protocol.get_full_command(command) == request:
+                return command
+        return None
+
+    def respond(self, request):
+        """
+        Get the response to request (or None for no response)
+        """
+        self.stats["requests"] += 1
+        command = self._requests.get(request) or self._resolve(request)
+        if command is None:
+            log.info(f"{self}: unrecognised request {request}")
+            self.stats["unrecognised"] += 1
+            return self._nak
+        resolved = self.protocol.resolve_command(command)
+        name = resolved.command_defn.get("name", command)
+        if name == "QPGS" and resolved.value is not None and int(resolved.value) >= self.parallel:
+            log.debug(f"{self}: no inverter {resolved.value} in parallel set of {self.parallel}")
+            return self._nak
+        responses = self._responses.get(name)
+        if not responses:
+            log.debug(f"{self}: no test response for {command}")
+            return self._nak
+        position = self._positions.get(name, 0)
+        self._positions[name] = (position + 1) % len(responses)
+        return self._inject_fault(responses[position])
+
+    def _inject_fault(self, response):
+        chance = self._random.random()
+        for fault, probability in self.faults.items():
+            if chance >= probability:
+                chance -= probability
+                continue
+            self.stats[fault] += 1
+            log.debug(f"{self}: injecting {fault} fault")
+            if fault == "drop":
+                return None
+            if fault == "nak":
+                return self._nak
+            if fault == "corrupt":
+                corrupted = bytearray(response)
+                corrupted[self._random.randrange(len(corrupted))] ^= 0xFF
+                return bytes(corrupted)
+            if fault == "truncate":
+                return response[: self._random.randrange(1, len(response))] if len(response) > 1 else b""
+        self.stats["responses"] += 1
+        return response
+
+    def delay(self) -> float:
+        """
+        Seconds to wait before sending a response
+        """
+        if self.jitter:
+            return self.latency + self._random.uniform(0, self.jitter)
+        return self.latency
+
+    def next_text_block(self):
+        """
+        Get the next VE.Direct text block to send, None if the device doesnt send them
+        """
+        if not self.text_blocks:
+            return None
+        position = self._positions.get("VEDTEXT", 0)
+        self._positions["VEDTEXT"] = (position + 1) % len(self.text_blocks)
+        return self._inject_fault(self.text_blocks[position])
+
+
+class _Endpoint:
+    """
+    A connection (pty or tcp) to a simulated device
+    """
+
+    def __init__(self, device, fd, read, write, close) -> None:
+        self.device = device
+        self.fd = fd
+        self.read = read
+        self.write = write
+        self.close = close
+        self.buffer = bytearray()
+        self.closed = False
+        # responses on an endpoint are sent in order, even with jitter
+        self.last_due = 0
+        self.next_text = time.monotonic() if device.text_blocks else None
+
+
+class Simulator:
+    """
+    Serve simulated devices on ptys and tcp ports, from a single event loop
+    """
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        # (due, sequence, endpoint, data) of responses waiting for their latency
+        self._scheduled = []
+        self._sequence = itertools.count()
+        self._endpoints = []
+        self.devices = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+
+    def _add_endpoint(self, endpoint) -> None:
+        with self._lock:
+            self._endpoints.append(endpoint)
+            self._selector.register(endpoint.fd, selectors.EVENT_READ, endpoint)
+        self._wakeup()
+
+    def add_pty(self, device) -> str:
+        """
+        Serve device on a new pty, returns the path of the pty to connect to
+        """
+        self.devices.append(device)
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        path = os.ttyname(slave)
+
+        def close():
+            os.close(master)
+            os.close(slave)
+
+        # the slave stays open, so the pty still works between clients opening and closing it
+        self._add_endpoint(_Endpoint(device, master, lambda: os.read(master, 4096), lambda d: os.write(master, d), close))
+        log.info(f"{device} on {path}")
+        return path
+
+    def add_tcp(self, device, host="127.0.0.1", port=0):
+        """
+        Serve device on a tcp port (port 0 picks a free port), returns the (host, port) listened on
+        """
+        self.devices.append(device)
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen()
+        server.setblocking(False)
+        address = server.getsockname()
+        with self._lock:
+            self._selector.register(server, selectors.EVENT_READ, device)
+        self._wakeup()
+        log.info(f"{device} on {address[0]}:{address[1]}")
+        return address
+
+    def _accept(self, server, device) -> None:
+        try:
+            conn, address = server.accept()
+        except BlockingIOError:
+            return
+        log.debug(f"{device}: connection from {address}")
+        conn.setblocking(True)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def read():
+            try:
+                return conn.recv(4096)
+            except OSError:
+                return b""
+
+        self._add_endpoint(_Endpoint(device, conn, read, conn.sendall, conn.close))
+
+    def _close_endpoint(self, endpoint) -> None:
+        with self._lock:
+            self._selector.unregister(endpoint.fd)
+            self._endpoints.remove(endpoint)
+        endpoint.closed = True
+        endpoint.close()
+
+    def _receive(self, endpoint) -> None:
+        data = endpoint.read()
+        if not data:
+            log.debug(f"{endpoint.device}: connection closed")
+            self._close_endpoint(endpoint)
+            return
+        endpoint.buffer.extend(data)
+        device = endpoint.device
+        while True:
+            request = device.next_request(endpoint.buffer)
+            if request is None:
+                if len(endpoint.buffer) > MAX_REQUEST:
+                    log.info(f"{device}: discarding unrecognised data {bytes(endpoint.buffer)}")
+                    endpoint.buffer.clear()
+                return
+            del endpoint.buffer[: len(request)]
+            response = device.respond(request)
+            if response:
+                self._schedule(endpoint, response)
+
+    def _schedule(self, endpoint, response) -> None:
+        due = max(time.monotonic() + endpoint.device.delay(), endpoint.last_due)
+        endpoint.last_due = due
+        heapq.heappush(self._scheduled, (due, next(self._sequence), endpoint, response))
+
+    def _send(self, endpoint, data) -> None:
+        if endpoint.closed:
+            return
+        try:
+            endpoint.write(data)
+        except OSError as e:
+            log.debug(f"{endpoint.device}: send failed: {e}")
+            self._close_endpoint(endpoint)
+
+    def _wakeup(self) -> None:
+        os.write(self._wakeup_write, b"\0")
+
+    def _next_timeout(self, now):
+        due = [self._scheduled[0][0]] if self._scheduled else []
+        due.extend(e.next_text for e in self._endpoints if e.next_text is not None)
+        if not due:
+            return None
+        return max(0, min(due) - now)
+
+    def run(self) -> None:
+        """
+        Serve the devices until stop is called
+        """
+        self._running = True
+        while self._running:
+            with self._lock:
+                timeout = self._next_timeout(time.monotonic())
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    os.read(self._wakeup_read, 4096)
+                elif isinstance(key.data, _Endpoint):
+                    self._receive(key.data)
+                else:
+                    self._accept(key.fileobj, key.data)
+            now = time.monotonic()
+            while self._scheduled and self._scheduled[0][0] <= now:
+                _, _, endpoint, response = heapq.heappop(self._scheduled)
+                self._send(endpoint, response)
+            for endpoint in list(self._endpoints):
+                if endpoint.next_text is not None and endpoint.next_text <= now:
+                    endpoint.next_text = now + VEDTEXT_INTERVAL
+                    block = endpoint.device.next_text_block()
+                    if block:
+                        self._send(endpoint, block)
+
+    def start(self) -> None:
+        """
+        Serve the devices in a background thread
+        """
+        self._thread = threading.Thread(target=self.run, name="simulator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._wakeup()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for key in list(self._selector.get_map().values()):
+            if isinstance(key.data, _Endpoint):
+                key.data.close()
+            elif key.data is not None:
+                key.fileobj.close()
+        self._selector.close()
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+
+
+def default_command(device) -> str:
+    """
+    The first command of device's protocol that has a test response (or its text command, for VE.Direct)
+    """
+    if device.text_blocks:
+        return "vedtext"
+    for command, command_defn in device.protocol.COMMANDS.items():
+        if "regex" not in command_defn and device._responses.get(command_defn.get("name", command)):
+            return command
+    return None
+
+
+def write_config(path, sections, pause=60) -> None:
+    """
+    Write an mpp-solar config file with a section for each (name, protocol, port, porttype, command)
+    """
+    with open(path, "w") as f:
+        f.write(f"[SETUP]\npause={pause}\n")
+        for name, protocol, port, porttype, command in sections:
+            f.write(f"\n[{name}]\nprotocol={protocol}\nport={port}\nporttype={porttype}\ncommand={command}\noutputs=screen\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate inverters and BMSs on ptys and tcp ports")
+    parser.add_argument(
+        "-P",
+        "--protocol",
+        action="append",
+        help="protocol of the devices to simulate, can be repeated (default: PI30)",
+    )
+    parser.add_argument("-n", "--count", type=int, default=1, help="number of devices of each protocol (default: 1)")
+    parser.add_argument("--pty", action="store_true", help="serve each device on a pty (default if --tcp isnt set)")
+    parser.add_argument("--tcp", type=int, help="serve each device on a tcp port, numbered from this port")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on for --tcp (default: 127.0.0.1)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds before each response, up to (default: 0)")
+    parser.add_argument("--faults", help=f"fault probabilities, eg drop=0.01,corrupt=0.05 (faults: {', '.join(FAULTS)})")
+    parser.add_argument("--parallel", type=int, default=1, help="number of inverters in each parallel set for QPGSn (default: 1)")
+    parser.add_argument("--seed", type=int, help="random seed, to make jitter and faults repeatable")
+    parser.add_argument("--config", help="write an mpp-solar config file for the simulated devices to this file")
+    parser.add_argument("-c", "--command", help="command for the sections of the config file (default: a command of each protocol)")
+    parser.add_argument("--pause", type=int, default=60, help="pause for the config file (default: 60)")
+    parser.add_argument("-D", "--debug", action="store_true", help="enable debug logging")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.DEBUG if args.debug else logging.INFO)
+    faults = parse_faults(args.faults)
+    use_pty = args.pty or args.tcp is None
+
+    simulator = Simulator()
+    sections = []
+    tcp_port = args.tcp
+    number = 0
+    for protocol in args.protocol or ["PI30"]:
+        for _ in range(args.count):
+            name = f"SIM{number:03}_{protocol.upper()}"
+            seed = None if args.seed is None else args.seed + number
+            device = SimulatedDevice(
+                protocol,
+                name=name,
+                latency=args.latency,
+                jitter=args.jitter,
+                faults=faults,
+                parallel=args.parallel,
+                seed=seed,
+            )
+            command = args.command or default_command(device)
+            if use_pty:
+                path = simulator.add_pty(device)
+                porttype = PTY_PORTTYPES.get(device.protocol_id, "serial")
+                sections.append((f"{name}_PTY", device.protocol_id, path, porttype, command))
+                print(f"{name}: {path}")
+            if tcp_port is not None:
+                host, port = simulator.add_tcp(device, args.host, tcp_port)
+                tcp_port += 1
+                sections.append((f"{name}_TCP", device.protocol_id, f"{host}:{port}", "remotesocket", command))
+                print(f"{name}: {host}:{port}")
+            number += 1
+    if args.config:
+        write_config(args.config, sections, args.pause)
+        print(f"Config for {len(sections)} sections written to {args.config}")
+
+    try:
+        simulator.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        totals = Counter()
+        for device in {id(d): d for d in simulator.devices}.values():
+            totals.update(device.stats)
+        print(f"Simulated {number} devices: {dict(totals)}")
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import importlib
 import pkgutil
 import re
 
+from ..dispatcher import DROP_OLDEST, OutputSink
 from ..helpers import key_wanted, get_kwargs
 
 log = logging.getLogger("helpers")
@@ -64,6 +65,49 @@ def get_outputs(output_list):
     return ops
 
 
+class OutputPipeline:
+    """
+    The output processors for a config section (or command line), created once and reused for every result
+    - the filters are compiled once and the processors keep their connections and sockets open between results
+    - params (mqtt_broker, udp_port, postgres_url etc) are passed to every output call
+    - with a queue_size each processor runs on its own worker thread, fed from a queue of that size (see OutputSink)
+    - close() releases the processors' connections
+    """
+
+    def __init__(self, output_list, filter=None, excl_filter=None, queue_size=0, overflow=DROP_OLDEST, **params) -> None:
+        self.outputs = get_outputs(output_list)
+        self.sinks = []
+        if queue_size:
+            self.sinks = [OutputSink(op, maxsize=queue_size, overflow=overflow) for op in self.outputs]
+            self.outputs = self.sinks
+        self.filter = None if filter is None else re.compile(filter)
+        self.excl_filter = None if excl_filter is None else re.compile(excl_filter)
+        self.params = params
+        log.debug(f"output pipeline {output_list}: {self.outputs}")
+
+    def output(self, data, **kwargs) -> None:
+        """
+        Send data (a copy for each processor) to every output processor (or queue it for them)
+        """
+        for op in self.outputs:
+            op.output(
+                data=data.copy(),
+                filter=self.filter,
+                excl_filter=self.excl_filter,
+                **self.params,
+                **kwargs,
+            )
+
+    def close(self) -> None:
+        for op in self.outputs:
+            try:
+                op.close()
+            except Exception as e:
+                log.warning(f"Error closing output processor {type(op).__name__}: {e}")
+        self.outputs = []
+        self.sinks = []
+
+
 def output_results(results, command, mqtt_broker, fullconfig={}):
     # "normal command definition"
     # - command: QPIGS
@@ -7,3 +7,9 @@ log = logging.getLogger("baseoutput")
 class baseoutput:
     def __str__(self):
         return "the base class for the output processors, not used directly"
+
+    def close(self):
+        """
+        Release any connections, sockets etc kept open between outputs
+        """
+        pass
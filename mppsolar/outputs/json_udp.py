@@ -16,6 +16,8 @@ class json_udp(baseoutput):
 
     def __init__(self, *args, **kwargs) -> None:
         log.debug(f"__init__: kwargs {kwargs}")
+        # the socket is kept for the life of the output
+        self._sock = None
 
     def output(self, *args, **kwargs):
         data = get_kwargs(kwargs, "data")
@@ -41,8 +43,14 @@ class json_udp(baseoutput):
         payload = js.dumps(output)
         log.debug(payload)
         msgs.append(payload)
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # UDP datagram
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # UDP datagram
         for msg in msgs:
-            count = sock.sendto(bytes(msg, "utf-8"), ("localhost", int(udp_port)))
+            count = self._sock.sendto(bytes(msg, "utf-8"), ("localhost", int(udp_port)))
         log.debug(f"Udp sent response {count}")
         return msgs
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
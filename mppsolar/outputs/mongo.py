@@ -23,6 +23,9 @@ class mongo(baseoutput):
 
     def __init__(self, *args, **kwargs) -> None:
         log.debug(f"__init__: kwargs {kwargs}")
+        # the client (which has its own connection pool) is kept for the life of the output
+        self._client = None
+        self._mongo_url = None
 
     def output(self, *args, **kwargs):
         if not pymongo:
@@ -40,9 +43,12 @@ class mongo(baseoutput):
 
         mongo_url = get_kwargs(kwargs, "mongo_url")
         mongo_database = get_kwargs(kwargs, "mongo_db", "mppsolar")
-        log.debug(f"Connecting to {mongo_url} / {mongo_database}")
-        client = pymongo.MongoClient(mongo_url)
-        db = client[mongo_database]
+        if self._client is None or self._mongo_url != mongo_url:
+            self.close()
+            log.debug(f"Connecting to {mongo_url}")
+            self._client = pymongo.MongoClient(mongo_url)
+            self._mongo_url = mongo_url
+        db = self._client[mongo_database]
 
         msgs = []
         # Remove command and _command_description
@@ -68,3 +74,8 @@ class mongo(baseoutput):
         except pymongo.errors.ServerSelectionTimeoutError as dbe:
             log.error(f"Mongo error {dbe}")
         return msgs
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
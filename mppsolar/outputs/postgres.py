@@ -1,15 +1,21 @@
 import logging
+import re
+import threading
+import time
 from datetime import datetime
 
 try:
     import psycopg2 as psycopg2
+    import psycopg2.pool
     from psycopg2._json import Json
     from psycopg2.extensions import register_adapter
+    from psycopg2.extras import execute_values
 except ImportError:
     print("You are missing dependencies in order to be able to use that output.")
     print("To install them, use that command:")
     print("    python -m pip install 'mppsolar[pgsql]'")
     psycopg2 = None
+    execute_values = None
 
 from . import to_json, get_common_params
 from .baseoutput import baseoutput
@@ -17,6 +23,30 @@ from ..helpers import get_kwargs
 
 log = logging.getLogger("postgres")
 
+# connections in the pool (a flush uses one at a time, so only needs more if outputs run on several threads)
+POOL_SIZE = 4
+# most rows kept waiting to be written, the oldest are dropped after this
+MAX_BUFFERED = 10000
+# column types for the decoded values in wide tables, anything else is text
+COLUMN_TYPES = ((bool, "boolean"), (int, "bigint"), (float, "double precision"))
+# columns every wide table has, decoded fields with these names get a field_ prefix
+RESERVED_COLUMNS = ("id", "name", "updated")
+
+
+def column_type(value):
+    for _type, column in COLUMN_TYPES:
+        if isinstance(value, _type):
+            return column
+    return "text"
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_name(command):
+    return "mppsolar_" + re.sub(r"[^a-z0-9_]", "_", command.lower())
+
 
 class postgres(baseoutput):
     """
@@ -35,6 +65,12 @@ class postgres(baseoutput):
 
         create index mppsolar_command_updated_index
             on mppsolar (command, updated);
+
+    In wide mode (postgres_wide) each command has its own table, mppsolar_{command}, with a typed column for each field
+    these are created (and new columns added) as results arrive
+
+    Rows are buffered and written postgres_batch at a time (or when the oldest has waited postgres_flush seconds)
+    a timer writes them when due, so they dont wait for the next result
 """
 
     def __str__(self):
@@ -44,6 +80,136 @@ class postgres(baseoutput):
         log.debug(f"__init__: kwargs {kwargs}")
         if psycopg2:
             register_adapter(dict, Json)
+        # the pool is kept for the life of the output
+        self._pool = None
+        self._postgres_url = None
+        # rows waiting to be written, (table, columns, values)
+        self._buffer = []
+        self._buffered_at = None
+        self._flush_interval = 10
+        # writes the buffered rows when they are due, the lock is held for anything touching the buffer
+        self._timer = None
+        self._lock = threading.RLock()
+        # column types of the wide tables, and the columns known to exist in the database
+        self._tables = {}
+        self._created = set()
+
+    def _get_pool(self):
+        if self._pool is None:
+            log.debug(f"Connecting to {self._postgres_url}")
+            self._pool = psycopg2.pool.ThreadedConnectionPool(1, POOL_SIZE, self._postgres_url)
+        return self._pool
+
+    def _wide_row(self, command, name, msg, now):
+        """
+        Get the (table, columns, values) for msg
+        - the first value for a column decides its type, later values that dont fit it
+          (eg an empty string in a number column) are stored as null
+        """
+        table = table_name(command)
+        columns = self._tables.setdefault(table, {})
+        values = [name, now]
+        keys = []
+        for key, value in msg.items():
+            if key in RESERVED_COLUMNS:
+                key = f"field_{key}"
+            keys.append(key)
+            _type = columns.setdefault(key, column_type(value))
+            if _type != column_type(value):
+                # ints fit in a double precision column, anything fits as text
+                if _type == "double precision" and isinstance(value, int) and not isinstance(value, bool):
+                    value = float(value)
+                elif _type == "text":
+                    value = str(value)
+                else:
+                    value = None
+            values.append(value)
+        return table, ("name", "updated") + tuple(keys), tuple(values)
+
+    def _create_columns(self, cursor, table, columns):
+        if table not in self._created:
+            cursor.execute(
+                f"create table if not exists {quote_identifier(table)} "
+                "(id bigserial primary key, name text, updated timestamptz)"
+            )
+            self._created.add(table)
+        for column in columns:
+            if (table, column) not in self._created and column in self._tables[table]:
+                cursor.execute(
+                    f"alter table {quote_identifier(table)} "
+                    f"add column if not exists {quote_identifier(column)} {self._tables[table][column]}"
+                )
+                self._created.add((table, column))
+
+    def _schedule_flush(self, delay):
+        if self._timer is None:
+            self._timer = threading.Timer(max(delay, 0), self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows, one insert for each table (and set of columns)
+        - rows that cant be written as there is no connection (or it is broken) are kept and tried again
+          postgres_flush seconds later (up to MAX_BUFFERED of them), rows the server rejects are dropped
+        """
+        with self._lock:
+            self._cancel_flush()
+            if self._buffer:
+                self._flush()
+
+    def _flush(self):
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+        except Exception as e:
+            log.error(f"Postgres error {e}, keeping {len(self._buffer)} rows")
+            self._schedule_flush(self._flush_interval)
+            return
+        rows, self._buffer, self._buffered_at = self._buffer, [], None
+        groups = {}
+        for table, columns, values in rows:
+            groups.setdefault((table, columns), []).append(values)
+        try:
+            with conn.cursor() as cursor:
+                for (table, columns), values in groups.items():
+                    if table in self._tables:
+                        self._create_columns(cursor, table, columns)
+                    execute_values(
+                        cursor,
+                        f"insert into {quote_identifier(table)} ({','.join(quote_identifier(c) for c in columns)}) values %s",
+                        values,
+                        page_size=len(values),
+                    )
+            conn.commit()
+            pool.putconn(conn)
+            log.debug(f"inserted {len(rows)} rows")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # the connection is broken (eg the server restarted), so keep the rows and try again on a new connection
+            log.error(f"Postgres error {e}, keeping {len(rows)} rows")
+            self._created = set()
+            pool.putconn(conn, close=True)
+            self._buffer[:0] = rows
+            if len(self._buffer) > MAX_BUFFERED:
+                log.warning(f"Postgres buffer full, dropping {len(self._buffer) - MAX_BUFFERED} rows")
+                del self._buffer[: len(self._buffer) - MAX_BUFFERED]
+            self._buffered_at = time.monotonic()
+            self._schedule_flush(self._flush_interval)
+        except Exception as e:
+            log.error(f"Postgres error {e}, {len(rows)} rows not written")
+            # the tables are checked again next time
+            self._created = set()
+            pool.putconn(conn, close=True)
 
     def output(self, *args, **kwargs):
         if not psycopg2:
@@ -52,10 +218,20 @@ class postgres(baseoutput):
         (data, tag, keep_case, filter_, excl_filter) = get_common_params(kwargs)
 
         postgres_url = get_kwargs(kwargs, "postgres_url")
-        log.debug(f"Connecting to {postgres_url}")
-        conn = psycopg2.connect(postgres_url)
+        batch_size = get_kwargs(kwargs, "postgres_batch", 1) or 1
+        if kwargs.get("postgres_flush") is not None:
+            self._flush_interval = kwargs["postgres_flush"]
+        wide = get_kwargs(kwargs, "postgres_wide", False)
+        name = get_kwargs(kwargs, "name")
+        with self._lock:
+            if postgres_url != self._postgres_url:
+                if self._pool is not None:
+                    self._close_pool()
+                self._postgres_url = postgres_url
 
         msgs = []
+        # the command is taken before filtering, as the filter may not keep _command
+        command = data.get("_command")
         # Remove command and _command_description
         # cmd = data.pop("_command", None)
         data.pop("_command_description", None)
@@ -66,22 +242,42 @@ class postgres(baseoutput):
 
         log.debug(output)
         msgs.append(output)
-        inserted = 0
         now = datetime.now().astimezone().replace(microsecond=0).isoformat()
-        try:
+        with self._lock:
             for msg in msgs:
-                command = msg.pop("_command")
-                msg['updated'] = now
-                log.debug(conn)
-                cursor = conn.cursor()
-                log.debug(cursor)
-                cursor.execute('insert into mppsolar (command,data, updated) values (%s,%s,%s)', (command, msg, now))
-                conn.commit()
-                inserted += 1
-                cursor.close()
-            log.debug(f"inserted {inserted} docs")
-        except Exception as e:
-            log.error(f"Postgres error {e}")
-        finally:
-            conn.close()
+                msg.pop("_command", None)
+                if wide:
+                    self._buffer.append(self._wide_row(command, name, msg, now))
+                else:
+                    msg['updated'] = now
+                    self._buffer.append(("mppsolar", ("command", "data", "updated"), (command, msg, now)))
+            if len(self._buffer) > MAX_BUFFERED:
+                log.warning(f"Postgres buffer full, dropping {len(self._buffer) - MAX_BUFFERED} rows")
+                del self._buffer[: len(self._buffer) - MAX_BUFFERED]
+            if self._buffered_at is None:
+                self._buffered_at = time.monotonic()
+            waited = time.monotonic() - self._buffered_at
+            if len(self._buffer) >= batch_size or waited >= self._flush_interval:
+                self.flush()
+            else:
+                self._schedule_flush(self._flush_interval - waited)
         return msgs
+
+    def _close_pool(self):
+        self.flush()
+        try:
+            self._pool.closeall()
+        except Exception as e:
+            log.debug(f"Postgres error closing connections {e}")
+        self._pool = None
+        self._created = set()
+
+    def close(self):
+        with self._lock:
+            if self._pool is None:
+                # try once more to write anything left
+                self.flush()
+            if self._pool is not None:
+                self._close_pool()
+            # dont try again after the output is closed
+            self._cancel_flush()
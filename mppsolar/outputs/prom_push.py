@@ -16,6 +16,8 @@ log = logging.getLogger("prom")
 
 class prom_push(prom):
     push_url = ""
+    # the session keeps the connection to the server open between pushes
+    _session = None
 
     def __str__(self):
         return "pushes Node exporter Prometheus format to PushGateway"
@@ -32,8 +34,17 @@ class prom_push(prom):
     
         headers = {'Content-Type': 'text/plain'}
         try:
-            with requests.post(self.push_url, data=content, headers=headers, timeout=5) as req:
+            with self._get_session().post(self.push_url, data=content, headers=headers, timeout=5) as req:
                 log.debug(f"POST'ed data to PushGateway {self.push_url!r}: status_code={req.status_code}")
         except requests.RequestException as e:
             log.error(f"Failed to push to PushGateway: {e}")
-    
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
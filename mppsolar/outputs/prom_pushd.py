@@ -18,6 +18,8 @@ log = logging.getLogger("prom")
 class prom_pushd(prom):
     push_url = ""
     job = "mppsolar"  # static default
+    # the session keeps the connection to the server open between pushes
+    _session = None
 
     def __str__(self):
         return "Pushes Prometheus exposition format directly to VictoiaMetrics (Not Gateway)"
@@ -40,9 +42,17 @@ class prom_pushd(prom):
         target_url = f"{self.push_url}/metrics/job/{self.job}/instance/{self.instance}"
 
         try:
-            with requests.post(target_url, data=content, headers=headers, timeout=(2,10)) as req:
+            with self._get_session().post(target_url, data=content, headers=headers, timeout=(2,10)) as req:
                 log.debug(f"POST'ed data to PushGateway {target_url!r}: status_code={req.status_code}")
         except requests.RequestException as e:
             log.error(f"Failed to push to PushGateway: {e}")
 
-    
+    def _get_session(self):
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
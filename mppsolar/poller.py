@@ -0,0 +1,127 @@
+""" mppsolar / poller.py """
+import logging
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from mppsolar.asyncrunner import get_port_key, group_by_port
+
+log = logging.getLogger("poller")
+
+
+class PortStats:
+    """
+    Cycle statistics for a port
+    """
+
+    __slots__ = ("port", "cycles", "commands", "errors", "skipped", "last_duration", "max_duration", "total_duration")
+
+    def __init__(self, port) -> None:
+        self.port = port
+        self.cycles = 0
+        self.commands = 0
+        self.errors = 0
+        # commands not run as the port was still busy (without barrier)
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.port}: {self.cycles} cycles, {self.commands} commands, {self.errors} errors, {self.skipped} skipped, "
+            f"last {self.last_duration:.3f}s, mean {self.mean_duration:.3f}s, max {self.max_duration:.3f}s"
+        )
+
+    @property
+    def mean_duration(self) -> float:
+        return self.total_duration / self.cycles if self.cycles else 0.0
+
+    def add_cycle(self, duration, commands, errors) -> None:
+        self.cycles += 1
+        self.commands += commands
+        self.errors += errors
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+
+
+class Poller:
+    """
+    Run the (device, command, tag, outputs, filter, excl_filter, dev) commands on a pool of worker threads
+    - commands are grouped by the physical port of their device, each port's commands run in turn on one worker
+      and different ports run in parallel (up to max_workers at a time)
+    - with barrier, run_cycle runs the commands and returns when every port is done
+      without, dispatch starts the commands and returns straight away, so a slow port doesnt hold up the others
+    - result_handler(item, results) is called with the results of each command, one at a time
+    """
+
+    def __init__(self, commands, result_handler, max_workers=None, barrier=True) -> None:
+        self.groups = group_by_port(commands)
+        self.barrier = barrier
+        self._result_handler = result_handler
+        self._result_lock = threading.Lock()
+        self.max_workers = max_workers or len(self.groups) or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="poller")
+        self._stopped = threading.Event()
+        # each port's commands in progress (without barrier)
+        self._busy = {}
+        self.stats = {}
+        for items in self.groups:
+            key = get_port_key(items[0][0])
+            self.stats[key] = PortStats(key)
+        log.info(f"{len(commands)} commands on {len(self.groups)} ports, {self.max_workers} workers")
+
+    def __str__(self):
+        return "Poller stats:\n  " + "\n  ".join(str(stats) for stats in self.stats.values())
+
+    def _poll_port(self, items) -> None:
+        stats = self.stats[get_port_key(items[0][0])]
+        errors = 0
+        start = time.monotonic()
+        for item in items:
+            if self._stopped.is_set():
+                return
+            device, command = item[0], item[1]
+            results = device.run_command(command=command, filter=item[4], excl_filter=item[5])
+            # port errors are returned as ERROR, responses that failed the protocol's checks as validity check
+            if isinstance(results, Mapping) and ("ERROR" in results or "validity check" in results):
+                errors += 1
+            try:
+                with self._result_lock:
+                    self._result_handler(item, results)
+            except Exception as e:
+                log.error(f"Error handling results of {command} from {device}: {e}", exc_info=True)
+        stats.add_cycle(time.monotonic() - start, len(items), errors)
+
+    def run_cycle(self, commands=None) -> None:
+        """
+        Run every command (or just commands, eg the ones that are due) once, returning when they are all done
+        """
+        groups = self.groups if commands is None else group_by_port(commands)
+        futures = [self._executor.submit(self._poll_port, items) for items in groups]
+        for future in wait(futures).done:
+            if future.exception() is not None:
+                log.error(f"Error polling port: {future.exception()}")
+
+    def dispatch(self, commands=None) -> None:
+        """
+        Start running every command (or just commands) without waiting for them (no barrier)
+        - a port still busy with earlier commands skips these ones
+        """
+        for items in self.groups if commands is None else group_by_port(commands):
+            key = get_port_key(items[0][0])
+            busy = self._busy.get(key)
+            if busy is not None and not busy.done():
+                log.debug(f"Port {key} is busy, skipping {len(items)} commands")
+                self.stats[key].skipped += len(items)
+                continue
+            self._busy[key] = self._executor.submit(self._poll_port, items)
+
+    def close(self) -> None:
+        """
+        Stop polling, waiting for any commands in progress
+        """
+        self._stopped.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
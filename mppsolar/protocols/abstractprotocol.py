@@ -5,15 +5,33 @@ import re
 from datetime import datetime  # noqa: F401 # pylint: disable=W0611
 from typing import Tuple
 
-from ..helpers import get_resp_defn, get_value
 from .protocol_helpers import BigHex2Short, BigHex2Float  # noqa: F401 # pylint: disable=W0611
 from .protocol_helpers import LittleHex2Float, LittleHex2Short  # noqa: F401 # pylint: disable=W0611
 from .protocol_helpers import LittleHex2UInt, LittleHex2Int  # noqa: F401 # pylint: disable=W0611
 from .protocol_helpers import Hex2Ascii, Hex2Int, Hex2Str  # noqa: F401 # pylint: disable=W0611
 from .protocol_helpers import uptime  # noqa: F401 # pylint: disable=W0611
-from .protocol_helpers import crcPI as crc
+from .protocol_checksums import get_checksum
+from .protocol_commands import CommandIndex, ResolvedCommand
+from .protocol_layout import PositionalLayout
+from .protocol_plan import DecodePlan, compile_converter
+from .protocol_result import DecodedResult, RawResponse, ResultSchema
 
 log = logging.getLogger("AbstractProtocol")
+crc = get_checksum("crcPI")
+
+
+def length_field_frame_complete(buffer) -> bool:
+    """
+    frame_complete for the PI17 / PI18 responses, the ^Dxxx responses have a length field
+    - xxx is the length of the rest of the response (including the CRC and \r)
+    - other responses (eg ^0 and ^1 acknowledgements) end with \r
+    """
+    if buffer[:2] == b"^D":
+        if len(buffer) < 5:
+            return False
+        if buffer[2:5].isdigit():
+            return len(buffer) >= 5 + int(buffer[2:5])
+    return b"\r" in buffer
 
 
 class AbstractProtocol(metaclass=abc.ABCMeta):
@@ -27,7 +45,11 @@ class AbstractProtocol(metaclass=abc.ABCMeta):
         self.PID = None
         self.ID_COMMANDS = None
         self._protocol_id = None
-
+        self._decode_plans = {}
+        self._command_index = None
+        self._result_schema = ResultSchema()
+        # opt-in DecodeCache of results for unchanged responses
+        self.decode_cache = None
 
     def list_commands(self) -> dict:
         # print(f"{'Parameter':<30}\t{'Value':<15} Unit")
@@ -58,22 +80,36 @@ class AbstractProtocol(metaclass=abc.ABCMeta):
         log.debug(f"full command: {full_command}")
         return full_command
 
+    def get_command_index(self) -> CommandIndex:
+        """
+        Get the command resolution index, (re)building it if COMMANDS has changed
+        """
+        if self._command_index is None or not self._command_index.is_current(self.COMMANDS):
+            self._command_index = CommandIndex(self.COMMANDS)
+        return self._command_index
+
+    def resolve_command(self, command) -> ResolvedCommand:
+        """
+        Resolve command to its definition (and any value captured by a regex command)
+        """
+        resolved = self.get_command_index().resolve(command)
+        if resolved is None:
+            log.info(f"No command_defn found for {command}")
+        return resolved
+
     def get_command_defn(self, command) -> dict:
         log.debug(f"Processing command '{command}'")
-        if command in self.COMMANDS and "regex" not in self.COMMANDS[command]:
-            log.debug(f"Found command {command} in protocol {self._protocol_id}")
-            return self.COMMANDS[command]
-        for _command in self.COMMANDS:
-            if "regex" in self.COMMANDS[_command] and self.COMMANDS[_command]["regex"]:
-                log.debug(f"Regex commands _command: {_command}")
-                _re = re.compile(self.COMMANDS[_command]["regex"])
-                match = _re.match(command)
-                if match:
-                    log.debug(f"Matched: {command} to: {self.COMMANDS[_command]['name']} value: {match.group(1)}")
-                    self._command_value = match.group(1)
-                    return self.COMMANDS[_command]
-        log.info(f"No command_defn found for {command}")
-        return None
+        resolved = self.resolve_command(command)
+        if resolved is None:
+            return None
+        return resolved.command_defn
+
+    def frame_complete(self, buffer) -> bool:
+        """
+        Has a complete response been received in buffer
+        - default is once the \r terminator has been received
+        """
+        return b"\r" in buffer
 
     def get_responses(self, response) -> list:
         """
@@ -101,125 +137,40 @@ class AbstractProtocol(metaclass=abc.ABCMeta):
         frame_number=0,
         extra_info=None,
     ):
-        template = None
-        # Check for a format modifying template
-        if ":" in data_type:
-            data_type, template = data_type.split(":", 1)
-            log.debug(f"Got template {template} for {data_name} {raw_value}")
-        log.debug(f"Processing data_type: {data_type} for data_name: {data_name}, raw_value {raw_value}")
-        if data_type == "loop":
-            log.warning("loop not implemented...")
-            return [(data_name, None, data_units, extra_info)]
-        if data_type == "exclude" or data_type == "discard" or raw_value == "extra":
-            # Just ignore these ones
-            log.debug(f"Discarding {data_name}:{raw_value}")
-            return [(None, raw_value, data_units, extra_info)]
-        if data_type == 'ack':
-            log.debug(f'ack mode {raw_value} {type(data_units)}')
-            key = raw_value.decode()
-            r = data_units.get(key)
-            print(data_name, r, "", extra_info)
-            return [(data_name, r, "", extra_info)]
-        if data_type == "option":
-            try:
-                key = int(raw_value)
-                r = data_units[key]
-            except ValueError:
-                r = f"Unable to process to int: {raw_value}"
-                return [(None, r, "", None)]
-            except IndexError:
-                r = f"Invalid option: {key}"
-            return [(data_name, r, "", extra_info)]
-        if data_type == "hex_option":
-            key = int(raw_value[0])
-            if key < len(data_units):
-                r = data_units[key]
-            else:
-                r = f"Invalid hex_option: {key}"
-            return [(data_name, r, "", extra_info)]
-        if data_type == "flags":
-            log.debug("flags defn")
-            # [
-            #     "flags",
-            #     "Device Status",
-            #     [
-            #         "Is SBU Priority Version Added",
-            #         "Is SCC Firmware Updated",
-            #         "Is Load On",
-            #     ],
-            # ],
-            return_value = []
-            for i, flag in enumerate(raw_value):
-                return_value.append((data_units[i], int(chr(flag)), "bool", None))
-
-            # if flag != "" and flag != b'':
-            # msgs[resp_format[2][j]] = [int(flag), "bool"]
-            # print(j, int(flag))
-            return return_value
-        if data_type == "keyed":
-            log.debug("keyed defn")
-            # [
-            #     "keyed",
-            #     1,
-            #     "Command response flag",
-            #     {
-            #         "00": "OK",
-            #         "01": "Unknown ID",
-            #         "02": "Not supported",
-            #         "04": "Parameter Error",
-            #     },
-            # ],
-            key = ""
-            for x in raw_value:
-                key += f"{x:02x}"
-            r = data_units.get(key, f"Invalid key: {key}")
-            return [(data_name, r, "", None)]
-        if data_type == "str_keyed":
-            log.debug("str_keyed defn")
-            # [
-            #     "str_keyed",
-            #     "Device Mode",
-            #     {
-            #         "B": "Inverter (Battery) Mode",
-            #         "C": "PV charging Mode",
-            #         "D": "Shutdown Mode",
-            #         "F": "Fault Mode",
-            #         "G": "Grid Mode",
-            #         "L": "Line Mode",
-            #         "P": "Power on Mode",
-            #         "S": "Standby Mode",
-            #         "Y": "Bypass Mode",
-            #     },
-            # ]
-            key = raw_value.decode()
-            r = data_units.get(key, f"Invalid key: {key}")
-            return [(data_name, r, "", extra_info)]
-        if data_type == "string":
-            return [(data_name, raw_value.decode(), data_units, extra_info)]
-        format_string = f"{data_type}(raw_value)"
-        log.debug("Processing format string: '%s'", format_string)
-        try:
-            r = eval(format_string)  # pylint: disable=W0123
-        except ValueError as e:
-            log.info("Failed to eval format '%s' (setting r=0), error: %s", format_string, e)
-            r = 0
-        except TypeError as e:
-            log.warning("Failed to eval format: '%s', error: %s", format_string, e)
-            r = format_string
-        if template is not None:
-            # eg template=r/1000
-            r = eval(template)  # pylint: disable=W0123
-        if "{" in data_name:
-            # eg "f'Frame Number {f:02d}'"
-            f = frame_number  # noqa: F841
-            data_name = eval(data_name)  # pylint: disable=W0123
-        return [(data_name, r, data_units, extra_info)]
+        """
+        Decode a single raw_value as per its definition
+        - returns a list of (data_name, value, data_units, extra_info)
+        """
+        convert = compile_converter(
+            data_name=data_name,
+            data_type=data_type,
+            data_units=data_units,
+            extra_info=extra_info,
+        )
+        return convert(raw_value, frame_number)
+
+    def get_decode_plan(self, command_defn) -> DecodePlan:
+        """
+        Get the compiled decode plan for command_defn, compiling it on first use
+        """
+        name = command_defn.get("name")
+        plan = self._decode_plans.get(name)
+        if plan is None or plan.command_defn is not command_defn:
+            plan = DecodePlan(command_defn)
+            self._decode_plans[name] = plan
+        return plan
+
+    def get_layout(self, command_defn) -> PositionalLayout:
+        """
+        Get the field layout for splitting a POSITIONAL response to command_defn
+        """
+        return self.get_decode_plan(command_defn).layout
 
     def decode_result(self, result, command):
         log.info("decode_result: raw: %s, command: %s" % (result.raw_response, command.name))
 
         # TODO: sort this so it isnt so carp
-        data = self.decode(result.raw_response, command.name)
+        data = self.decode(result.raw_response, command.name).copy()
         # Clean data
         data.pop("raw_response", None)
         data.pop("_command", None)
@@ -227,7 +178,31 @@ class AbstractProtocol(metaclass=abc.ABCMeta):
         result.decoded_response = data
         return result
 
-    def decode(self, response, command) -> dict:
+    def decode(self, response, command, filter=None, excl_filter=None) -> DecodedResult:
+        """
+        Take the raw response and turn it into a DecodedResult (a read-only mapping of name: value, unit entries)
+        - if a filter and/or excl_filter (as used by the outputs) are supplied, fields no output would keep are not decoded
+        """
+        cache = self.decode_cache
+        if cache is None or not isinstance(response, (bytes, bytearray, memoryview, str)):
+            msgs = self.decode_msgs(response, command, filter=filter, excl_filter=excl_filter)
+            return DecodedResult.from_msgs(self._result_schema, msgs)
+
+        # Identical responses give identical (read-only) results, so use the cached one if there is one
+        if not isinstance(response, str):
+            # a copy, so the cached result doesnt change if a buffer is reused
+            response = bytes(response)
+        key = (self._protocol_id, command, response, getattr(filter, "pattern", filter), getattr(excl_filter, "pattern", excl_filter))
+        result = cache.get(key)
+        if result is None:
+            msgs = self.decode_msgs(response, command, filter=filter, excl_filter=excl_filter)
+            result = DecodedResult.from_msgs(self._result_schema, msgs)
+            cache.put(key, result)
+        else:
+            log.debug(f"Using cached result for {command}")
+        return result
+
+    def decode_msgs(self, response, command, filter=None, excl_filter=None) -> dict:
         """
         Take the raw response and turn it into a dict of name: value, unit entries
         """
@@ -238,11 +213,11 @@ class AbstractProtocol(metaclass=abc.ABCMeta):
         # Add metadata
         msgs["_command"] = command
         # Check for a stored command definition
-        command_defn = self.get_command_defn(command)
+        resolved = self.resolve_command(command)
+        command_defn = resolved.command_defn if resolved is not None else None
 
         if command_defn is not None:
             msgs["_command_description"] = command_defn["description"]
-            len_command_defn = len(command_defn["response"])
 
         # Check response is valid
         valid, _msg = self.check_response_valid(response)
@@ -251,338 +226,32 @@ class AbstractProtocol(metaclass=abc.ABCMeta):
             log.info(f"validity check fail: {_msg}")
             return msgs
 
-        # Add Raw response
-        _response = b""
-        for item in response:
-            if type(item) is int:
-                _response += chr(item).encode()
-            else:
-                _response += item.encode()
-        raw_response = _response.decode("utf-8")
+        # Add Raw response, kept as received (its printable form is only built if an output uses it)
+        raw_response = RawResponse(response)
         msgs["raw_response"] = [raw_response, ""]
 
         if command_defn is None:
             # No definition, so just return the data
-            len_command_defn = 0
             log.debug(f"No definition for command {command}, (splitted) raw response returned")
             msgs["WARNING"] = [
                 f"No definition for command {command} in protocol {self._protocol_id}",
                 "",
             ]
-            msgs["response"] = [raw_response, ""]
+            msgs["response"] = [raw_response.text, ""]
             return msgs
 
-        # Determine the type of response
-        if "response_type" in command_defn:
-            response_type = command_defn["response_type"]
-        else:
-            response_type = "DEFAULT"
-        log.debug(f"Processing response of type {response_type}")
+        # Get the compiled decode plan for this command
+        plan = self.get_decode_plan(command_defn)
+        log.debug(f"Processing response of type {plan.response_type}")
 
         # Split the response into individual responses
         responses = self.get_responses(response)
         log.debug(f"trimmed and split responses: {responses}")
 
-        # Decode response based on stored command definition and type
-        # process default response type
-        # TODO: fix this - move into new approach
-        # DEFAULT - responses are determined by the order they are returned
-        if response_type == "DEFAULT":
-            log.info("Processing DEFAULT type responses")
-            # print("Processing DEFAULT type responses")
-            for i, result in enumerate(responses):
-                # decode result
-                if result == b'':
-                    continue
-                if type(result) is bytes:
-                    result = result.decode("utf-8")
-
-                # Check if we are past the 'known' responses
-                if i >= len_command_defn:
-                    resp_format = ["string", f"Unknown value in response {i}", ""]
-                else:
-                    resp_format = command_defn["response"][i]
-
-                # key = "{}".format(resp_format[1]).lower().replace(" ", "_")
-                key = resp_format[1]
-                log.debug(f'result {result}, key {key}, resp_format {resp_format}')
-                # Process results
-                if result == "NAK":
-                    msgs[f"WARNING{i}"] = [
-                        f"Command {command} was rejected",
-                        "",
-                    ]
-                elif resp_format[0] == "float":
-                    try:
-                        result = float(result)
-                    except ValueError:
-                        log.debug(f"Error resolving {result} as float")
-                    msgs[key] = [result, resp_format[2]]
-                elif resp_format[0] == "int":
-                    try:
-                        result = int(result)
-                    except ValueError:
-                        log.debug(f"Error resolving {result} as int")
-                    msgs[key] = [result, resp_format[2]]
-                elif resp_format[0] == "string":
-                    msgs[key] = [result, resp_format[2]]
-                elif resp_format[0] == "10int":
-                    if "--" in result:
-                        result = 0
-                    msgs[key] = [float(result) / 10, resp_format[2]]
-                # eg. ['option', 'Output source priority', ['Utility first', 'Solar first', 'SBU first']],
-                elif resp_format[0] == "option":
-                    msgs[key] = [resp_format[2][int(result)], ""]
-                # eg. ['keyed', 'Machine type', {'00': 'Grid tie', '01': 'Off Grid', '10': 'Hybrid'}],
-                elif resp_format[0] == "keyed":
-                    msgs[key] = [resp_format[2][result], ""]
-                # eg. ['flags', 'Device status', [ 'is_load_on', 'is_charging_on' ...
-                elif resp_format[0] == "flags":
-                    for j, flag in enumerate(result):
-                        # if flag != "" and flag != b'':
-                        msgs[resp_format[2][j]] = [int(flag), "bool"]
-                # eg. ['stat_flags', 'Warning status', ['Reserved', 'Inver...
-                elif resp_format[0] == "stat_flags":
-                    output = ""
-                    for j, flag in enumerate(result):
-                        # only display 'enabled' flags
-                        # if flag == "1" or flag == b"1":
-                        #    output = "{}\n\t- {}".format(output, resp_format[2][j])
-                        # display all flags
-                        try:
-                            key = resp_format[2][j]
-                            output = flag
-                            if key:  # only add msg if key is something
-                                msgs[key] = [output, ""]
-                        except IndexError:
-                            pass
-                # eg. ['enflags', 'Device Status', {'a': {'name': 'Buzzer', 'state': 'disabled'},
-                elif resp_format[0] == "enflags":
-                    # output = {}
-                    status = "unknown"
-                    for item in result:
-                        if item == "E":
-                            status = "enabled"
-                        elif item == "D":
-                            status = "disabled"
-                        else:
-                            # output[resp_format[2][item]['name']] = status
-                            # _key = "{}".format(resp_format[2][item]["name"]).lower().replace(" ", "_")
-                            if resp_format[2].get(item, None):
-                                _key = resp_format[2][item]["name"]
-                            else:
-                                _key = "unknown_{}".format(item)
-                            msgs[_key] = [status, ""]
-                    # msgs[key] = [output, '']
-                elif resp_format[0] == "multi":
-                    for x, item in enumerate(result):
-                        item_value = int(item)
-                        item_resp_format = resp_format[1][x]
-                        item_type = item_resp_format[0]
-                        # print(x, item_value, item_resp_format, item_type)
-                        if item_type == "option":
-                            item_name = item_resp_format[1]
-                            resolved_value = item_resp_format[2][item_value]
-                            msgs[item_name] = [resolved_value, ""]
-                        elif item_type == "string":
-                            item_name = item_resp_format[1]
-                            msgs[item_name] = [item_value, ""]
-                        else:
-                            print(f"item type {item_type} not defined")
-                elif command_defn["type"] in ["SETTER", "BLE_SETTER"]:
-                    # _key = "{}".format(command_defn["name"]).lower().replace(" ", "_")
-                    _key = command_defn["name"]
-                    msgs[_key] = [result, ""]
-                else:
-                    log.info(f"Processing unknown response format {result}")
-                    msgs[i] = [result, ""]
-
-                # add extra info about the command
-                if len(resp_format) > 3:
-                    msgs[key].append(resp_format[3])                    
-
-            return msgs
-
-        # Check for multiple frame type responses
-        if response_type == "MULTIFRAME-POSITIONAL":
-            log.debug("Processing MULTIFRAME-POSITIONAL type responses")
-            # MULTIFRAME-POSITIONAL - multiple frames of responses are not separated and are determined by the position in the response
-            # each frame has the same definition
-            frame_count = len(responses)
-            log.debug(f"got {frame_count} frames")
-            # the responses are the frames
-            frames = responses
-        else:
-            frames = [responses]
-            frame_count = 1
-
-        for frame_number, frame in enumerate(frames):
-            for i, response in enumerate(frame):
-                extra_info = None
-                if response_type == "KEYED":
-                    log.debug("Processing KEYED type responses")
-                    # example defn ["V", "Main or channel 1 (battery) voltage", "V", "float:r/1000"]
-                    # example response data [b'H1', b'-32914']
-                    if len(response) <= 1:
-                        # Not enough data in response, so ignore
-                        continue
-                    lookup_key = response[0]
-                    raw_value = response[1]
-                    response_defn = get_resp_defn(lookup_key, command_defn["response"])
-                    if response_defn is None:
-                        # No definition for this key, so ignore???
-                        log.warning(f"No definition for {response}")
-                        continue
-                    # key = response_defn[0] #0
-                    data_type = response_defn[3]  # 1
-                    data_name = response_defn[1]  # 2
-                    data_units = response_defn[2]  # 3
-
-                elif response_type == "SEQUENTIAL":
-                    log.debug("Processing SEQUENTIAL type responses")
-                    # check for extra definitions...
-                    extra_responses_needed = len(command_defn["response"]) - len(frame)
-                    if extra_responses_needed > 0:
-                        for _ in range(extra_responses_needed):
-                            frame.append("extra")
-                    # example ["int", "Energy produced", "Wh"]
-
-                    # Check if we are past the 'known' responses
-                    if i >= len_command_defn:
-                        response_defn = ["str", f"Unknown value in response {i}", ""]
-                    else:
-                        response_defn = command_defn["response"][i]
-                    log.debug(f"Got defn {response_defn}")
-                    raw_value = response
-                    # spacer = response_defn[0] #0
-                    data_type = response_defn[0]  # 1
-                    data_name = response_defn[1]  # 2
-                    data_units = response_defn[2]  # 3
-
-                elif response_type == "INDEXED":
-                    log.debug("Processing INDEXED type responses")
-                    # [1, "AC Input Voltage", "float", "V", {icon: blah}]
-                    # check for extra definitions...
-                    extra_responses_needed = len(command_defn["response"]) - len(frame)
-                    if extra_responses_needed > 0:
-                        for _ in range(extra_responses_needed):
-                            frame.append("extra")
-
-                    # Check if we are past the 'known' responses
-                    if i >= len_command_defn:
-                        if not response:
-                            continue
-                        response_defn = [
-                            i + 1,
-                            f"Unknown value in response {i+1}",
-                            "str",
-                            "",
-                        ]
-                    else:
-                        response_defn = command_defn["response"][i]
-                    log.debug(f"Got defn {response_defn}")
-                    raw_value = response
-                    # data_posi = get_value(response_defn, 0)
-                    data_name = get_value(response_defn, 1)
-                    data_type = get_value(response_defn, 2)
-                    data_units = get_value(response_defn, 3)
-                    extra_info = get_value(response_defn, 4)
-
-                    # print(f"{data_type=}, {data_name=}, {raw_value=}")
-                elif response_type in ["POSITIONAL", "MULTIFRAME-POSITIONAL"]:
-                    log.debug("Processing POSITIONAL type responses")
-                    # check for extra definitions...
-                    extra_responses_needed = len(command_defn["response"]) - len(frame)
-                    if extra_responses_needed > 0:
-                        for _ in range(extra_responses_needed):
-                            frame.append("extra")
-                    # POSITIONAL - responses are not separated and are determined by the position in the response
-                    # example defn :
-                    #   ["discard", 1, "start flag", ""],
-                    #   ["BigHex2Short", 2, "Battery Bank Voltage", "V"],
-                    # example response data:
-                    #   [b'\xa5', b'\x01', b'\x90', b'\x08', b'\x01\t', b'\x00\x00', b'u\xcf', b'\x03\x99', b'']
-                    raw_value = response
-                    # Check if we are past the 'known' responses
-                    if i >= len_command_defn:
-                        response_defn = ["str", 1, f"Unknown value in response {i}", ""]
-                    else:
-                        response_defn = command_defn["response"][i]
-                    if response_defn is None:
-                        # No definition for this key, so ignore???
-                        log.warning(f"No definition for {response}")
-                        response_defn = [
-                            "str",
-                            1,
-                            f"Undefined value in response {i}",
-                            "",
-                        ]
-                    log.debug(f"Got defn {response_defn}")
-                    # length = response_defn[1] #0
-                    data_type = response_defn[0]  # 1
-                    data_name = response_defn[2]  # 2
-                    data_units = response_defn[3]  # 3
-                elif response_type == "BLE_SETTER":
-                    #[["option", "DSP Has Bootstrap", ["No", "Yes"]]],
-                    #["ack", "Command execution", {"NAK": "Failed", "ACK": "Successful"}]
-                    raw_value = response
-                    response_defn = command_defn["response"][0]
-                    log.debug(f"Got defn {response_defn}")
-                    # length = response_defn[1] #0
-                    data_type = response_defn[0]  # 1
-                    data_name = response_defn[1]  # 2
-                    data_units = response_defn[2]  # 3
-                else:
-                    log.warning(f'Unknown response type {response_type}')
-
-                # Check for lookup
-                if data_type.startswith("lookup"):
-                    log.debug("processing lookup...")
-                    log.info(f"Processing data_type: '{data_type}' for data_name: '{data_name}', raw_value '{raw_value}'")
-                    m = msgs
-                    template = data_type.split(":", 1)[1]
-                    log.debug(f"Got template {template} for {data_name} {raw_value}")
-                    lookup = eval(template)
-                    log.debug(f"looking up values for: {lookup}")
-                    value, data_units = m[lookup]
-                    if data_name is not None:
-                        msgs[data_name] = [value, data_units, extra_info]
-                elif data_type.startswith("info"):
-                    log.debug("processing info...")
-                    # print(
-                    #    f"Processing {data_type=} for {data_name=}, {data_units=} {response=} {command=} {self._command_value=}"
-                    # )
-                    template = data_type.split(":", 1)[1]
-                    # Provide cv as shortcut to self._command_value for info fields
-                    cv = self._command_value  # noqa: F841
-                    value = eval(template)
-                    if data_name is not None:
-                        msgs[data_name] = [value, data_units, extra_info]
-                else:
-                    # Process response
-                    processed_responses = self.process_response(
-                        data_name=data_name,
-                        raw_value=raw_value,
-                        data_units=data_units,
-                        data_type=data_type,
-                        frame_number=frame_number,
-                        extra_info=extra_info,
-                    )
-                    # data_name, value, data_units = self.process_response(
-                    #     data_name=data_name,
-                    #     raw_value=raw_value,
-                    #     data_units=data_units,
-                    #     data_type=data_type,
-                    #     frame_number=frame_number,
-                    # )
-                    # print(data_type, data_name, raw_value, value)
-                    for item in processed_responses:
-                        data_name, value, data_units, extra_info = item
-                        if data_name is not None:
-                            if extra_info:
-                                msgs[data_name] = [value, data_units, extra_info]
-                            else:
-                                msgs[data_name] = [value, data_units]
-            # print(f"{i=} {response=} {len(command_defn['response'])}")
-
-        return msgs
+        # Decode response based on the compiled plan
+        if isinstance(filter, str):
+            filter = re.compile(filter)
+        if isinstance(excl_filter, str):
+            excl_filter = re.compile(excl_filter)
+        wanted = plan.wanted(filter, excl_filter)
+        return plan.run(command, responses, msgs, command_value=resolved.value, wanted=wanted)
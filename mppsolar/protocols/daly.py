@@ -2,9 +2,10 @@ import logging
 from typing import Tuple
 
 from .abstractprotocol import AbstractProtocol
-from .protocol_helpers import crc8 as dalyChecksum
+from .protocol_checksums import get_checksum
 
 log = logging.getLogger("daly")
+dalyChecksum = get_checksum("crc8")
 
 # (AAA BBB CCC DDD EEE
 # (000 001 002 003 004
@@ -182,6 +183,8 @@ COMMANDS = {
     },
 }
 startFlag = bytes.fromhex("A5")
+# start flag, address, command id, data length, 8 data bytes and checksum
+DALY_FRAME_LENGTH = 13
 
 
 class daly(AbstractProtocol):
@@ -238,6 +241,19 @@ class daly(AbstractProtocol):
             and len(response) > response_length
         )
 
+    def frame_complete(self, buffer) -> bool:
+        """
+        Override the default frame_complete as DALY responses are fixed length frames
+        - multiframe responses have an unknown number of frames, so are never complete
+          (the port reads until the line goes quiet)
+        """
+        command_defn = getattr(self, "_command_defn", None)
+        if command_defn is None:
+            return len(buffer) >= DALY_FRAME_LENGTH
+        if command_defn["response_type"] == "MULTIFRAME-POSITIONAL":
+            return False
+        return len(buffer) >= command_defn.get("response_length", DALY_FRAME_LENGTH)
+
     def check_response_valid(self, response) -> Tuple[bool, dict]:
         """
         DALY protocol - checksum is sum of bytes
@@ -283,25 +299,10 @@ class daly(AbstractProtocol):
             and self._command_defn["response_type"] == "MULTIFRAME-POSITIONAL"
         ):
             # Have multiple frames of positional data
-            # Split into frames
+            # Split into frames and process each frame as per definition
             frame_size = self._command_defn["response_length"]
-            frames = [
-                response[i : i + frame_size]
-                for i in range(0, len(response), frame_size)
-            ]
-            log.info(f"Multi frame response with {len(frames)} frames")
-            # Loop through each frame and process as per definition
-            for frame in frames:
-                if len(frame) == 0:
-                    continue
-                items = []
-                for defn in self._command_defn["response"]:
-                    size = defn[1]
-                    item = frame[:size]
-                    items.append(item)
-                    frame = frame[size:]
-                responses.append(items)
-            # print(responses)
+            responses = self.get_layout(self._command_defn).split_frames(response, frame_size)
+            log.info(f"Multi frame response with {len(responses)} frames")
             return responses
 
         if (
@@ -317,11 +318,7 @@ class daly(AbstractProtocol):
             #   ["discard", 1, "data length", ""],
             # ]
             # example response data b"\xa5\x01\x90\x08\x02\x10\x00\x00uo\x03\xbc\xf3",
-            for defn in self._command_defn["response"]:
-                size = defn[1]
-                item = response[:size]
-                responses.append(item)
-                response = response[size:]
+            responses = self.get_layout(self._command_defn).split(response)
             return responses
         else:
             return bytearray(response)
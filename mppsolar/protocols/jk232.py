@@ -1,10 +1,11 @@
 import logging
 
 from .abstractprotocol import AbstractProtocol
-from .protocol_helpers import crcJK232 as crc
+from .protocol_checksums import get_checksum
 
 
 log = logging.getLogger("jk232")
+crc = get_checksum("crcJK232")
 
 
 # Read basic information and status
@@ -124,6 +125,16 @@ class jk232(AbstractProtocol):
             log.debug(f"cmd with crc: {cmd}")
             return cmd
 
+    def frame_complete(self, buffer) -> bool:
+        """
+        Override the default frame_complete as JK232 responses are length based
+        - 0xDD start, status, command code, data length, data, 2 byte checksum, 0x77 end
+        """
+        start = buffer.find(b"\xdd")
+        if start == -1 or len(buffer) < start + 4:
+            return False
+        return len(buffer) >= start + 4 + buffer[start + 3] + 3
+
     def get_responses(self, response):
         """
         Override the default get_responses as its different
@@ -142,13 +153,7 @@ class jk232(AbstractProtocol):
             #   ["discard", 1, "data length", ""],
             # ]
             # example response data b"\xa5\x01\x90\x08\x02\x10\x00\x00uo\x03\xbc\xf3",
-            for defn in self._command_defn["response"]:
-                size = defn[1]
-                item = response[:size]
-                responses.append(item)
-                response = response[size:]
-            if response:
-                responses.append(response)
+            responses = self.get_layout(self._command_defn).split(response, remainder=True)
             log.debug(f"get_responses: responses {responses}")
             return responses
         else:
@@ -1,10 +1,11 @@
 import logging
 
 from .jkabstractprotocol import jkAbstractProtocol
-from .protocol_helpers import crc8
+from .protocol_checksums import get_checksum
 
 
 log = logging.getLogger("jk485")
+crc8 = get_checksum("crc8")
 
 
 # Request balancer data
@@ -2,13 +2,28 @@ import logging
 import struct
 
 from .abstractprotocol import AbstractProtocol
-from .protocol_helpers import crc8
+from .protocol_checksums import get_checksum
 
 
 log = logging.getLogger("jkAbstractProtocol")
+crc8 = get_checksum("crc8")
 
 SOR = bytes.fromhex("55aaeb90")
 XSOR = b'\xaaU\x90\xeb'
+# the record type follows the SOR, it decides the length of the record (the last byte of a record is its crc8)
+RECORD_TYPE_OFFSET = 4
+RECORD_LENGTHS = {0x01: 300, 0x02: 300, 0x03: 300, 0xC8: 20}
+# length of any other type of record
+DEFAULT_RECORD_LENGTH = 320
+
+
+def record_length(record):
+    """
+    The length of record (which starts with a SOR), from its record type - None until the record type has been received
+    """
+    if len(record) <= RECORD_TYPE_OFFSET:
+        return None
+    return RECORD_LENGTHS.get(record[RECORD_TYPE_OFFSET], DEFAULT_RECORD_LENGTH)
 
 
 COMMANDS = {
@@ -76,7 +91,8 @@ class jkAbstractProtocol(AbstractProtocol):
         log.info(f"Using protocol {self._protocol_id} with {len(self.COMMANDS)} commands")
         # These need to be set to allow other functions to work`
         self._command = command
-        self._command_defn = self.get_command_defn(command)
+        resolved = self.resolve_command(command)
+        self._command_defn = resolved.command_defn if resolved is not None else None
         # log.debug(f"self._command = {self._command}, self._command_defn = {self._command_defn}")
         log.debug(f"self._command = {self._command}")
         # End of required variables setting
@@ -103,10 +119,10 @@ class jkAbstractProtocol(AbstractProtocol):
                 elif self._command_defn["name"] == "setDischargingOff":
                     value = [0,0]
                 elif self._command_defn["name"] == "setBalanceStart":
-                    value = struct.pack("<h", int(float(self._command_value) * 1000))
+                    value = struct.pack("<h", int(float(resolved.value) * 1000))
                     cmd[10:19] = [0x23, 0xb2, 0xcd, 0x31, 0x2d, 0x28, 0xf2, 0x6b, 0x4]
                 else:
-                    value = struct.pack("<h", int(float(self._command_value) * 1000))
+                    value = struct.pack("<h", int(float(resolved.value) * 1000))
                 cmd[6] = value[0]
                 cmd[7] = value[1]
             log.debug(f"cmd with command code: {cmd}")
@@ -137,17 +153,9 @@ class jkAbstractProtocol(AbstractProtocol):
             #   ["discard", 1, "data length", ""],
             # ]
             # example response data b"\xa5\x01\x90\x08\x02\x10\x00\x00uo\x03\xbc\xf3",
-            for defn in self._command_defn["response"]:
-                log.debug(f"Got defn: {defn}")
-                if defn[0].startswith("lookup"):
-                    responses.append("lookup")
-                    continue
-                size = defn[1]
-                item = response[:size]
-                responses.append(item)
-                response = response[size:]
-            if len(response) > 0:
-                responses.append(response)
+            # lookup definitions dont take any bytes, they get a "lookup" placeholder
+            # and any data past the end of the definition is added as a final item
+            responses = self.get_layout(self._command_defn).split(response, remainder=True)
             return responses
         if self._command_defn is not None and self._command_defn["response_type"] == "BLE_SETTER":
             log.debug("BLE_SETTER")
@@ -159,6 +167,17 @@ class jkAbstractProtocol(AbstractProtocol):
         else:
             return bytearray(response)
 
+    def frame_complete(self, buffer) -> bool:
+        """
+        Override the default frame_complete as JK responses are binary records (which can contain \r)
+        - complete once a record of the length for its record type, with a valid crc, has been received after the SOR
+        """
+        record = self.wipe_to_start(bytearray(buffer))
+        length = record_length(record)
+        if length is None or len(record) < length:
+            return False
+        return self.is_record_complete(record[:length])
+
     def is_record_start(self, record):
         if record.startswith(SOR) or record.startswith(XSOR):
             log.debug("SOR found in record")
@@ -186,8 +205,8 @@ class jkAbstractProtocol(AbstractProtocol):
         if not self.is_record_start(record):
             log.debug("No SOR found in record looking for completeness")
             return False
-        # check that length one of the valid lengths (300, 320)
-        if len(record) == 300 or len(record) == 320 or len(record) == 20:
+        # check that length is the length for the record type (300, 320 or 20)
+        if len(record) == record_length(record):
             # check the crc/checksum is correct for the record data
             crc = record[-1]
             calcCrc = crc8(record[:-1])
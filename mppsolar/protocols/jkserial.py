@@ -1,8 +1,9 @@
 import logging
 from .abstractprotocol import AbstractProtocol
-from .protocol_helpers import crcJK232 as crc
+from .protocol_checksums import get_checksum
 
 log = logging.getLogger("jk232")
+crc = get_checksum("crcJK232")
 
 
 COMMANDS = {
@@ -159,6 +160,13 @@ class jkserial(AbstractProtocol):
             log.debug(f"cmd with crc: {cmd}")
             return cmd
 
+    def frame_complete(self, buffer) -> bool:
+        """
+        Override the default frame_complete as JK serial responses end with
+        0x68 0x00 0x00 followed by the 2 byte checksum
+        """
+        return len(buffer) >= 5 and buffer[-5:-2] == b"\x68\x00\x00"
+
     def get_responses(self, response):
         """
         Override the default get_responses as its different
@@ -177,13 +185,7 @@ class jkserial(AbstractProtocol):
             #   ["discard", 1, "data length", ""],
             # ]
             # example response data  b'NW\x01\x1b\x00\x00\x00\x00\x03\x00\x01y*\x01\x0f\x91\x02\x0f\x94\x03\x0f\x97\x04\x0f\x91\x05\x0f\x94\x06\x0f\x94\x07\x0f\x93\x08\x0f\x92\t\x0f\x96\n\x0f\x91\x0b\x0f\x92\x0c\x0f\x92\r'
-            for defn in self._command_defn["response"]:
-                size = defn[1]
-                item = response[:size]
-                responses.append(item)
-                response = response[size:]
-            if response:
-                responses.append(response)
+            responses = self.get_layout(self._command_defn).split(response, remainder=True)
             log.debug(f"get_responses: responses {responses}")
             return responses
         else:
@@ -1,8 +1,10 @@
 import logging
 
 from .abstractprotocol import AbstractProtocol
+from .protocol_checksums import get_checksum
 
 log = logging.getLogger("pi16")
+chk = get_checksum("crc8")
 
 # (AAA BBB CCC DDD EEE
 # (000 001 002 003 004
@@ -249,14 +251,10 @@ class pi16(AbstractProtocol):
     def checksum(self, data):
         # QED20150620106
 
-        _sum = 0
         _len = data.find("%")
         if _len == -1:
             _len = len(data)
-        while _len > 0:
-            _len -= 1
-            _sum += ord(data[_len])
-        _sum &= 0xFF
+        _sum = chk(data[:_len].encode("latin-1"))
         _sum = f"{_sum:03}"
         _sum = _sum.encode()
         return _sum
@@ -1,11 +1,12 @@
 import logging
 
-from .abstractprotocol import AbstractProtocol
-from ..helpers import CRC_XModem
+from .abstractprotocol import AbstractProtocol, length_field_frame_complete
+from .protocol_checksums import get_checksum
 
 from typing import Tuple
 
 log = logging.getLogger("pi17")
+crcXModem = get_checksum("crcXModem")
 
 QUERY_COMMANDS = {
     "GPMP": {
@@ -1018,7 +1019,6 @@ class pi17(AbstractProtocol):
         self.ID_COMMANDS = ["PI", "DM"]
         self.POLYNOMIAL = 0x1021
         self.PRESET = 0
-        self.crcXModem = CRC_XModem()
 
     def get_full_command(self, command) -> bytes:
         """
@@ -1081,13 +1081,19 @@ class pi17(AbstractProtocol):
         """
         if response is None:
             return False, {"validity check": ["Error: Response was empty", ""]}
-        crc = self.crcXModem.crc_hex(response[:-3])
+        crc = f"{crcXModem(response[:-3]):04X}"
 
         if response[-3:-1].hex().upper() != crc:
             # print(response[-3:-1].hex().upper(), crc)
             return False, {"validity check": ["Error: CRC error P17", ""]}
         return True, {}
 
+    def frame_complete(self, buffer) -> bool:
+        """
+        Override the default frame_complete as the ^Dxxx responses have a length field
+        """
+        return length_field_frame_complete(buffer)
+
     def get_responses(self, raw_response):
         """
         Override the default get_responses as its different
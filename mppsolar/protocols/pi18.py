@@ -1,9 +1,10 @@
 import logging
 
-from .abstractprotocol import AbstractProtocol
-from .protocol_helpers import crcPI as crc
+from .abstractprotocol import AbstractProtocol, length_field_frame_complete
+from .protocol_checksums import get_checksum
 
 log = logging.getLogger("pi18")
+crc = get_checksum("crcPI")
 
 COMMANDS = {
     # QUERY #
@@ -637,6 +638,12 @@ class pi18(AbstractProtocol):
         log.debug(f"full command: {full_command}")
         return full_command
 
+    def frame_complete(self, buffer) -> bool:
+        """
+        Override the default frame_complete as the ^Dxxx responses have a length field
+        """
+        return length_field_frame_complete(buffer)
+
     def get_responses(self, response):
         """
         Override the default get_responses as its different for PI18
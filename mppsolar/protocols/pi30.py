@@ -1,9 +1,10 @@
 import logging
 
 from mppsolar.protocols.abstractprotocol import AbstractProtocol
-from mppsolar.protocols.protocol_helpers import crcPI as crc
+from mppsolar.protocols.protocol_checksums import get_checksum
 
 log = logging.getLogger("pi30")
+crc = get_checksum("crcPI")
 
 SETTER_COMMANDS = {
     "F": {
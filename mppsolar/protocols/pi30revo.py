@@ -2,10 +2,11 @@
 import logging
 
 from .abstractprotocol import AbstractProtocol
-from .protocol_helpers import crcPI as crc
-from .protocol_helpers import crc8 as chk
+from .protocol_checksums import get_checksum
 
 log = logging.getLogger("pi30revo")
+crc = get_checksum("crcPI")
+chk = get_checksum("crc8")
 
 COMMANDS = {
     "PSET": {
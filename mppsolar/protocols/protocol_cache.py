@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Decode result cache
+
+Many responses (eg settings like QPIRI, QFLAG, getInfo) are byte-identical from poll to poll,
+the cache keeps the (read-only) DecodedResult of recent responses so these arent validated and decoded again
+the cache is opt-in, a protocol only uses one if its decode_cache is set
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger("protocol_cache")
+
+
+class DecodeCache:
+    """
+    Bounded least recently used cache of decoded results
+    - keyed on (protocol id, command, raw response, filters)
+    """
+
+    def __init__(self, maxsize=128) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return f"DecodeCache: maxsize={self.maxsize}, size={len(self._results)}, hits={self.hits}, misses={self.misses}"
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key):
+        """
+        Get the cached result for key, None if there isnt one
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result) -> None:
+        """
+        Cache result for key, dropping the least recently used result if the cache is full
+        """
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        The cache hit / miss counters
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._results), "maxsize": self.maxsize}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Checksums and CRCs used by the protocols
+
+The CRC-16 (XModem and the PI variant) use a byte-wise 256 entry table built once at import,
+the 8 and 16 bit checksums are simple sums of the data
+all are registered in CHECKSUMS so protocols can look them up by name, eg get_checksum("crcPI")
+"""
+import logging
+
+log = logging.getLogger("protocol_checksums")
+
+
+def crc16_table(poly):
+    """
+    Generate the byte-wise lookup table for a (non-reflected) CRC-16 with polynomial poly
+    """
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ poly
+            else:
+                crc = crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+
+CRC16_XMODEM_TABLE = crc16_table(0x1021)
+
+# PI CRC bytes cant be one of the reserved values ( \r \n or 0x00) so these get incremented
+PI_RESERVED_BYTES = (0x28, 0x0D, 0x0A, 0x00)
+PI_CRC_BYTE = [b + 1 if b in PI_RESERVED_BYTES else b for b in range(256)]
+
+
+def crcXModem(data_bytes, crc=0x0000):
+    """
+    Generate the CRC-16/XModem of data_bytes
+    """
+    table = CRC16_XMODEM_TABLE
+    for b in data_bytes:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+
+def crcPI(data_bytes):
+    """
+    Calculates CRC for supplied data_bytes
+    - the CRC-16/XModem with any reserved bytes incremented, returned as [crc_high, crc_low]
+    """
+    if isinstance(data_bytes, str):
+        data_bytes = data_bytes.encode("latin-1")
+    crc = crcXModem(data_bytes)
+    return [PI_CRC_BYTE[crc >> 8], PI_CRC_BYTE[crc & 0xFF]]
+
+
+def crc8(byteData):
+    """
+    Generate 8 bit CRC of supplied string
+    """
+    return sum(byteData) & 0xFF
+
+
+def crc8P1(byteData):
+    """
+    Generate 8 bit CRC of supplied string + 1
+    eg as used in REVO PI30 protocol
+    """
+    return (sum(byteData) + 1) & 0xFF
+
+
+def crcJK232(byteData):
+    """
+    Generate JK RS232 / RS485 CRC
+    - 2 bytes, the verification field is "command code + length byte + data segment content",
+    the verification method is thesum of the above fields and then the inverse plus 1, the high bit is in the front and the low bit is in the back.
+    """
+    crc = sum(byteData)
+    return [(crc >> 8) & 0xFF, crc & 0xFF]
+
+
+def vedHexChecksum(byteData):
+    """
+    Generate VE Direct HEX Checksum
+    - sum of byteData + CS = 0x55
+    """
+    return (0x55 - sum(byteData)) & 0xFF
+
+
+CHECKSUMS = {
+    "crcXModem": crcXModem,
+    "crcPI": crcPI,
+    "crc8": crc8,
+    "crc8P1": crc8P1,
+    "crcJK232": crcJK232,
+    "vedHexChecksum": vedHexChecksum,
+}
+
+
+def get_checksum(name):
+    """
+    Get the checksum function registered as name
+    """
+    try:
+        return CHECKSUMS[name]
+    except KeyError:
+        raise ValueError(f"Unknown checksum {name}, must be one of {', '.join(CHECKSUMS)}") from None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Command resolution index
+
+Built once per protocol from its COMMANDS
+  - a dict for the commands that are matched exactly (eg QPIGS)
+  - a single precompiled alternation of all the regex commands (eg QPGS(\\d+)$, QEY(\\d\\d\\d\\d)$, PLEDE([01])$)
+resolving a command returns a ResolvedCommand that carries the value captured by a regex command
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+log = logging.getLogger("protocol_commands")
+
+# Maximum number of resolved command strings remembered by an index
+RESOLVED_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class ResolvedCommand:
+    """A command string matched to its command definition"""
+
+    command: str
+    command_defn: dict = field(repr=False)
+    value: Optional[str] = None
+
+
+class CommandIndex:
+    """
+    Index of a protocol's COMMANDS for fast command resolution
+    """
+
+    def __init__(self, commands) -> None:
+        self.commands = commands
+        self.size = len(commands)
+        self.exact = {}
+        # combined regex group number -> (command_defn, group number of the captured value)
+        self._regex_defns = {}
+        self._resolved = {}
+        patterns = []
+        group = 1
+        for name, command_defn in commands.items():
+            if "regex" not in command_defn:
+                self.exact[name] = command_defn
+                continue
+            regex = command_defn["regex"]
+            if not regex:
+                continue
+            inner_groups = re.compile(regex).groups
+            self._regex_defns[group] = (command_defn, group + 1 if inner_groups else None)
+            patterns.append(f"({regex})")
+            group += 1 + inner_groups
+        self.regex = re.compile("|".join(patterns)) if patterns else None
+        log.debug(f"Built command index with {len(self.exact)} exact and {len(patterns)} regex commands")
+
+    def is_current(self, commands) -> bool:
+        """
+        Check the index was built from (an unchanged) commands
+        """
+        return commands is self.commands and len(commands) == self.size
+
+    def resolve(self, command) -> Optional[ResolvedCommand]:
+        """
+        Find the command definition for command, returns None if there isnt one
+        """
+        if command is None:
+            return None
+        resolved = self._resolved.get(command)
+        if resolved is not None:
+            return resolved
+        command_defn = self.exact.get(command)
+        if command_defn is not None:
+            resolved = ResolvedCommand(command=command, command_defn=command_defn)
+        elif self.regex is not None:
+            match = self.regex.match(command)
+            if match is None:
+                return None
+            command_defn, value_group = self._regex_defns[match.lastindex]
+            value = match.group(value_group) if value_group is not None else None
+            log.debug(f"Matched: {command} to: {command_defn['name']} value: {value}")
+            resolved = ResolvedCommand(command=command, command_defn=command_defn, value=value)
+        else:
+            return None
+        if len(self._resolved) >= RESOLVED_CACHE_SIZE:
+            self._resolved.clear()
+        self._resolved[command] = resolved
+        return resolved
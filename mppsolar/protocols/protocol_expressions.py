@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Compiled template expressions
+
+The response definitions use small python expressions, eg
+  - data_types: "int", "LittleHex2Short", "BigHex2Short:r/1000", "bytes:r.decode()"
+  - data names: "f'Frame Number {f:02d}'"
+  - lookup / info templates: "'Voltage Cell{:02d}'.format(m['Highest Cell'][0])", "cv[:4]"
+these are parsed and checked once, compiled to a function and cached keyed by the template string
+only the helpers from protocol_helpers (and a few safe builtins) are available to the expressions,
+with a few whitelisted module functions (eg calendar.month_name) and methods (eg r.decode()), no other attributes
+"""
+import ast
+import calendar
+import logging
+import string
+from datetime import datetime
+from functools import lru_cache
+
+from . import protocol_helpers
+
+log = logging.getLogger("protocol_expressions")
+
+# The public helper functions defined in protocol_helpers
+HELPERS = {
+    name: obj
+    for name, obj in vars(protocol_helpers).items()
+    if callable(obj) and not name.startswith("_") and getattr(obj, "__module__", None) == protocol_helpers.__name__
+}
+
+SAFE_BUILTINS = {
+    "abs": abs,
+    "bool": bool,
+    "bytes": bytes,
+    "chr": chr,
+    "float": float,
+    "hex": hex,
+    "int": int,
+    "len": len,
+    "max": max,
+    "min": min,
+    "ord": ord,
+    "round": round,
+    "str": str,
+}
+
+
+def _strptime(date_string, format):
+    return datetime.strptime(date_string, format)
+
+
+def _call_decode(value, *args):
+    return value.decode(*args)
+
+
+def _call_format(value, *args, **kwargs):
+    return value.format(*args, **kwargs)
+
+
+def _call_strftime(value, format):
+    return value.strftime(format)
+
+
+# The module attributes an expression can use, and the names they are compiled to
+MODULE_ATTRIBUTES = {
+    ("calendar", "month_name"): ("_calendar_month_name", calendar.month_name),
+    ("datetime", "strptime"): ("_datetime_strptime", _strptime),
+}
+# The methods an expression can call, value.method(...) is compiled to a call of the function with value as its first argument
+# (so the expression never gets hold of an attribute)
+METHODS = {
+    "decode": ("_call_decode", _call_decode),
+    "format": ("_call_format", _call_format),
+    "strftime": ("_call_strftime", _call_strftime),
+}
+
+# Everything an expression is allowed to refer to (as well as its own variables)
+NAMESPACE = {"__builtins__": {}}
+NAMESPACE.update(SAFE_BUILTINS)
+NAMESPACE.update(HELPERS)
+# the compiled names of the module attributes and methods, which start with _ so an expression cant use them directly
+INTERNAL_NAMES = dict(MODULE_ATTRIBUTES.values())
+INTERNAL_NAMES.update(METHODS.values())
+
+ALLOWED_NODES = (
+    ast.Expression,
+    ast.Load,
+    ast.Name,
+    ast.Constant,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Slice,
+    ast.Call,
+    ast.keyword,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.Tuple,
+    ast.List,
+    ast.JoinedStr,
+    ast.FormattedValue,
+    ast.operator,
+    ast.unaryop,
+    ast.boolop,
+    ast.cmpop,
+)
+
+
+def _module_attribute(node):
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        return MODULE_ATTRIBUTES.get((node.value.id, node.attr))
+    return None
+
+
+def check_expression(tree, variables=()):
+    """
+    Make sure the parsed expression only uses allowed constructs, names and attributes
+    - the only attributes allowed are the MODULE_ATTRIBUTES and calls of the METHODS
+    - raises ValueError if not
+    """
+    # the module names are only allowed as part of a module attribute, and methods only when called
+    allowed = set()
+    for node in ast.walk(tree):
+        if _module_attribute(node):
+            allowed.update((node, node.value))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in METHODS:
+            allowed.add(node.func)
+            if node.func.attr == "format":
+                check_format(node.func.value)
+    for node in ast.walk(tree):
+        if node in allowed:
+            continue
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"{type(node).__name__} not allowed in template expressions")
+        if isinstance(node, ast.Name) and (node.id.startswith("_") or (node.id not in variables and node.id not in NAMESPACE)):
+            raise ValueError(f"name '{node.id}' not allowed in template expressions")
+        if isinstance(node, ast.Attribute):
+            raise ValueError(f"attribute '{node.attr}' not allowed in template expressions")
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and "__" in node.value:
+            raise ValueError(f"string '{node.value}' not allowed in template expressions")
+
+
+def check_format(node):
+    """
+    Make sure a format string is a constant, with no attribute or index lookups in its fields (eg '{0.decode}')
+    """
+    if not isinstance(node, ast.Constant) or not isinstance(node.value, str):
+        raise ValueError("format not allowed on anything but a string in template expressions")
+    for _, field, _, _ in string.Formatter().parse(node.value):
+        if field and ("." in field or "[" in field):
+            raise ValueError(f"format field '{field}' not allowed in template expressions")
+
+
+class _CompileAttributes(ast.NodeTransformer):
+    """
+    Replace the (checked) module attributes and method calls with calls of their functions
+    """
+
+    def visit_Attribute(self, node):
+        name, _ = _module_attribute(node)
+        return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Attribute) and node.func.attr in METHODS:
+            name, _ = METHODS[node.func.attr]
+            call = ast.Call(
+                func=ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node.func),
+                args=[node.func.value] + node.args,
+                keywords=node.keywords,
+            )
+            node = ast.copy_location(call, node)
+        return self.generic_visit(node)
+
+
+@lru_cache(maxsize=None)
+def compile_expression(template, variables=("r",)):
+    """
+    Compile template into a function of variables, eg
+      compile_expression("r/1000")(1234) -> 1.234
+      compile_expression("f'Frame Number {f:02d}'", ("f",))(3) -> 'Frame Number 03'
+    """
+    log.debug(f"Compiling template expression '{template}' with variables {variables}")
+    try:
+        tree = ast.parse(template.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid template expression '{template}': {e}") from e
+    check_expression(tree, variables)
+    tree = _CompileAttributes().visit(tree)
+    # wrap the checked expression in a lambda of the supplied variables
+    function = ast.Expression(
+        body=ast.Lambda(
+            args=ast.arguments(
+                posonlyargs=[],
+                args=[ast.arg(arg=variable) for variable in variables],
+                kwonlyargs=[],
+                kw_defaults=[],
+                defaults=[],
+            ),
+            body=tree.body,
+        )
+    )
+    ast.fix_missing_locations(function)
+    code = compile(function, f"<template {template}>", "eval")
+    return eval(code, dict(NAMESPACE, **INTERNAL_NAMES))  # pylint: disable=W0123
+
+
+@lru_cache(maxsize=None)
+def compile_data_type(data_type):
+    """
+    Get the function that converts a raw value for data_type, eg
+      "int" -> int, "LittleHex2Short" -> LittleHex2Short, "bytes.decode" -> function(raw_value)
+    """
+    if not data_type:
+        # no data_type, so the raw value is the value
+        return compile_expression("raw_value", ("raw_value",))
+    if data_type in NAMESPACE and callable(NAMESPACE[data_type]):
+        return NAMESPACE[data_type]
+    return compile_expression(f"{data_type}(raw_value)", ("raw_value",))
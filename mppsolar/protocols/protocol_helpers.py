@@ -4,59 +4,10 @@ import math
 
 from struct import unpack
 
-log = logging.getLogger("protocol_helpers")
-
-
-def crc8(byteData):
-    """
-    Generate 8 bit CRC of supplied string
-    """
-    CRC = 0
-    # for j in range(0, len(str),2):
-    for b in byteData:
-        # char = int(str[j:j+2], 16)
-        # print(b)
-        CRC = CRC + b
-    CRC &= 0xFF
-    return CRC
-
-
-def crc8P1(byteData):
-    """
-    Generate 8 bit CRC of supplied string + 1
-    eg as used in REVO PI30 protocol
-    """
-    CRC = 0
-    for b in byteData:
-        CRC = CRC + b
-    CRC += 1
-    CRC &= 0xFF
-    return CRC
-
+# the checksums now live in protocol_checksums
+from .protocol_checksums import crc8, crc8P1, crcJK232, crcPI, vedHexChecksum  # noqa: F401 # pylint: disable=W0611
 
-def crcJK232(byteData):
-    """
-    Generate JK RS232 / RS485 CRC
-    - 2 bytes, the verification field is "command code + length byte + data segment content",
-    the verification method is thesum of the above fields and then the inverse plus 1, the high bit is in the front and the low bit is in the back.
-    """
-    CRC = 0
-    for b in byteData:
-        CRC += b
-    crc_low = CRC & 0xFF
-    crc_high = (CRC >> 8) & 0xFF
-    return [crc_high, crc_low]    
-
-def vedHexChecksum(byteData):
-    """
-    Generate VE Direct HEX Checksum
-    - sum of byteData + CS = 0x55
-    """
-    CS = 0x55
-    for b in byteData:
-        CS -= b
-    CS = CS & 0xFF
-    return CS
+log = logging.getLogger("protocol_helpers")
 
 
 def uptime(byteData):
@@ -300,65 +251,6 @@ def _decode4ByteHex(hexToDecode):
     return answer
 
 
-def crcPI(data_bytes):
-    """
-    Calculates CRC for supplied data_bytes
-    """
-    # assert type(byte_cmd) == bytes
-    log.debug(f"Calculating CRC for {data_bytes}")
-
-    crc = 0
-    da = 0
-    crc_ta = [
-        0x0000,
-        0x1021,
-        0x2042,
-        0x3063,
-        0x4084,
-        0x50A5,
-        0x60C6,
-        0x70E7,
-        0x8108,
-        0x9129,
-        0xA14A,
-        0xB16B,
-        0xC18C,
-        0xD1AD,
-        0xE1CE,
-        0xF1EF,
-    ]
-
-    for c in data_bytes:
-        # log.debug('Encoding %s', c)
-        if type(c) == str:
-            c = ord(c)
-        da = ((crc >> 8) & 0xFF) >> 4
-        crc = (crc << 4) & 0xFFFF
-
-        index = da ^ (c >> 4)
-        crc ^= crc_ta[index]
-
-        da = ((crc >> 8) & 0xFF) >> 4
-        crc = (crc << 4) & 0xFFFF
-
-        index = da ^ (c & 0x0F)
-        crc ^= crc_ta[index]
-
-    crc_low = crc & 0xFF
-    crc_high = (crc >> 8) & 0xFF
-
-    if crc_low == 0x28 or crc_low == 0x0D or crc_low == 0x0A or crc_low == 0x00:
-        crc_low += 1
-    if crc_high == 0x28 or crc_high == 0x0D or crc_high == 0x0A or crc_high == 0x00:
-        crc_high += 1
-
-    crc = crc_high << 8
-    crc += crc_low
-
-    log.debug(f"Generated CRC {crc_high:#04x} {crc_low:#04x} {crc:#06x}")
-    return [crc_high, crc_low]
-
-
 def get_value(_list, _index):
     """
     get the value from _list or return None if _index is out of bounds
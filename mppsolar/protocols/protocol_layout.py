@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Precomputed layouts for POSITIONAL responses
+
+The response definition of a POSITIONAL (binary) record gives the size of each field, eg
+  ["Hex2Str", 4, "Header", ""],
+  ["LittleHex2Short:r/1000", 2, "Voltage_Cell01", "V"],
+these are compiled once to a single struct.Struct ("4s2s...") so a record is split into its fields
+with one unpack_from (over the record or a memoryview of it) rather than repeatedly slicing off the front
+"""
+import logging
+import struct
+
+log = logging.getLogger("protocol_layout")
+
+# Placeholder response for fields (eg lookups) that dont take any bytes from the record
+LOOKUP = "lookup"
+
+
+class PositionalLayout:
+    """
+    The field offsets of a POSITIONAL response definition
+    """
+
+    __slots__ = ("struct", "size", "offsets", "placeholders")
+
+    def __init__(self, response_defns) -> None:
+        self.offsets = []
+        self.placeholders = []
+        formats = []
+        offset = 0
+        for i, defn in enumerate(response_defns):
+            if defn[0].startswith("lookup"):
+                self.placeholders.append(i)
+                continue
+            size = defn[1]
+            if type(size) is not int:
+                raise TypeError(f"Field size must be an int, got {size} for {defn}")
+            formats.append(f"{size}s")
+            self.offsets.append((offset, offset + size))
+            offset += size
+        self.size = offset
+        self.struct = struct.Struct("<" + "".join(formats))
+
+    def split(self, record, remainder=False) -> list:
+        """
+        Split record into the (bytes) value of each field
+        - if remainder is True any data past the end of the layout is added as an extra item
+        """
+        record_length = len(record)
+        if record_length >= self.size:
+            items = list(self.struct.unpack_from(record))
+        else:
+            # short record, so the trailing fields will be short or empty
+            log.debug(f"Record length {record_length} shorter than layout size {self.size}")
+            items = [bytes(record[start:end]) for start, end in self.offsets]
+        for i in self.placeholders:
+            items.insert(i, LOOKUP)
+        if remainder and record_length > self.size:
+            items.append(bytes(record[self.size:]))
+        return items
+
+    def split_frames(self, response, frame_size) -> list:
+        """
+        Split a response of multiple frame_size frames, each frame with this layout
+        """
+        view = memoryview(response)
+        return [self.split(view[i : i + frame_size]) for i in range(0, len(view), frame_size)]
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+Compiled decode plans
+
+A command definition (an entry of a protocol's COMMANDS) is turned into a DecodePlan once,
+the plan holds a flat list of prebuilt field decoders so decode doesnt need to work out
+the response type, split data_types or walk if/elif chains on every poll
+"""
+import logging
+
+from ..helpers import key_wanted
+from .protocol_expressions import compile_data_type, compile_expression
+from .protocol_helpers import get_value
+from .protocol_layout import PositionalLayout
+
+log = logging.getLogger("protocol_plan")
+
+
+def field_wanted(name, filter=None, excl_filter=None) -> bool:
+    """
+    Check if an output could keep the field called name
+    - the outputs match the filters against the name with spaces (and for prom / and -) replaced, as is or lowercased
+    """
+    name = str(name)
+    key = name.replace(" ", "_")
+    for _key in {name, key, key.replace("/", "_").replace("-", "")}:
+        if key_wanted(_key, filter, excl_filter) or key_wanted(_key.lower(), filter, excl_filter):
+            return True
+    return False
+
+
+RESPONSE_TYPES = ["DEFAULT", "POSITIONAL", "MULTIFRAME-POSITIONAL", "INDEXED", "KEYED", "SEQUENTIAL", "BLE_SETTER"]
+
+
+def compile_converter(data_name=None, data_type=None, data_units=None, extra_info=None):
+    """
+    Build a converter for a single field definition
+    - returns a callable(raw_value, frame_number) that gives a list of (data_name, value, data_units, extra_info)
+    - this is the compiled form of AbstractProtocol.process_response
+    """
+    template = None
+    # Check for a format modifying template
+    if ":" in data_type:
+        data_type, template = data_type.split(":", 1)
+    dynamic_name = data_name is not None and "{" in data_name
+
+    if data_type == "loop":
+
+        def convert(raw_value, frame_number=0):
+            log.warning("loop not implemented...")
+            return [(data_name, None, data_units, extra_info)]
+
+        return convert
+
+    if data_type == "exclude" or data_type == "discard":
+
+        def convert(raw_value, frame_number=0):
+            return [(None, raw_value, data_units, extra_info)]
+
+        return convert
+
+    if data_type == "ack":
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            r = data_units.get(raw_value.decode())
+            return [(data_name, r, "", extra_info)]
+
+    elif data_type == "option":
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            try:
+                key = int(raw_value)
+                r = data_units[key]
+            except ValueError:
+                r = f"Unable to process to int: {raw_value}"
+                return [(None, r, "", None)]
+            except IndexError:
+                r = f"Invalid option: {key}"
+            return [(data_name, r, "", extra_info)]
+
+    elif data_type == "hex_option":
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            key = int(raw_value[0])
+            if key < len(data_units):
+                r = data_units[key]
+            else:
+                r = f"Invalid hex_option: {key}"
+            return [(data_name, r, "", extra_info)]
+
+    elif data_type == "flags":
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            return [(data_units[i], int(chr(flag)), "bool", None) for i, flag in enumerate(raw_value)]
+
+    elif data_type == "keyed":
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            key = "".join(f"{x:02x}" for x in raw_value)
+            r = data_units.get(key, f"Invalid key: {key}")
+            return [(data_name, r, "", None)]
+
+    elif data_type == "str_keyed":
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            key = raw_value.decode()
+            r = data_units.get(key, f"Invalid key: {key}")
+            return [(data_name, r, "", extra_info)]
+
+    elif data_type == "string":
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            return [(data_name, raw_value.decode(), data_units, extra_info)]
+
+    else:
+        format_string = f"{data_type}(raw_value)"
+        to_value = compile_data_type(data_type)
+        # eg template=r/1000
+        apply_template = compile_expression(template) if template is not None else None
+        # eg "f'Frame Number {f:02d}'"
+        build_name = compile_expression(data_name, ("f",)) if dynamic_name else None
+
+        def convert(raw_value, frame_number=0):
+            if raw_value == "extra":
+                return [(None, raw_value, data_units, extra_info)]
+            try:
+                r = to_value(raw_value)
+            except ValueError as e:
+                log.info("Failed to eval format '%s' (setting r=0), error: %s", format_string, e)
+                r = 0
+            except TypeError as e:
+                log.warning("Failed to eval format: '%s', error: %s", format_string, e)
+                r = format_string
+            if apply_template is not None:
+                r = apply_template(r)
+            name = data_name
+            if build_name is not None:
+                name = build_name(frame_number)
+            return [(name, r, data_units, extra_info)]
+
+    return convert
+
+
+class FieldDecoder:
+    """
+    A single prebuilt field of a non DEFAULT plan
+    - run(raw_value, frame_number, msgs, command_value) adds the decoded value(s) to msgs
+    """
+
+    __slots__ = ("data_name", "data_type", "data_units", "extra_info", "names", "run")
+
+    def __init__(self, data_type, data_name, data_units, extra_info=None) -> None:
+        self.data_type = data_type
+        self.data_name = data_name
+        self.data_units = data_units
+        self.extra_info = extra_info
+        self.names = self._get_names()
+        if data_type.startswith("lookup"):
+            self.run = self._build_lookup()
+        elif data_type.startswith("info"):
+            self.run = self._build_info()
+        else:
+            self.run = self._build_convert()
+
+    def _get_names(self):
+        """
+        The names this field adds to the results, None if they are only known once decoded
+        """
+        data_type = self.data_type.split(":", 1)[0]
+        if data_type in ["exclude", "discard"]:
+            return ()
+        if data_type == "flags":
+            return tuple(self.data_units)
+        if self.data_name is None:
+            return ()
+        if "{" in self.data_name and not data_type.startswith(("lookup", "info")):
+            # eg "f'Frame Number {f:02d}'"
+            return None
+        return (self.data_name,)
+
+    def _build_lookup(self):
+        data_name = self.data_name
+        extra_info = self.extra_info
+        get_lookup = compile_expression(self.data_type.split(":", 1)[1], ("m",))
+
+        def run(raw_value, frame_number, msgs, command_value):
+            lookup = get_lookup(msgs)
+            log.debug(f"looking up values for: {lookup}")
+            value, data_units = msgs[lookup]
+            if data_name is not None:
+                msgs[data_name] = [value, data_units, extra_info]
+
+        return run
+
+    def _build_info(self):
+        data_name = self.data_name
+        data_units = self.data_units
+        extra_info = self.extra_info
+        get_info = compile_expression(self.data_type.split(":", 1)[1], ("cv",))
+
+        def run(raw_value, frame_number, msgs, command_value):
+            # Provide cv as shortcut to the value captured by a regex command for info fields
+            value = get_info(command_value)
+            if data_name is not None:
+                msgs[data_name] = [value, data_units, extra_info]
+
+        return run
+
+    def _build_convert(self):
+        convert = compile_converter(
+            data_name=self.data_name,
+            data_type=self.data_type,
+            data_units=self.data_units,
+            extra_info=self.extra_info,
+        )
+
+        def run(raw_value, frame_number, msgs, command_value):
+            for data_name, value, data_units, extra_info in convert(raw_value, frame_number):
+                if data_name is not None:
+                    if extra_info:
+                        msgs[data_name] = [value, data_units, extra_info]
+                    else:
+                        msgs[data_name] = [value, data_units]
+
+        return run
+
+
+def _default_field(command_defn, resp_format):
+    """
+    Build the decoder for a single DEFAULT response definition
+    - returns a callable(i, result, msgs, command)
+    """
+    kind = resp_format[0]
+    key = resp_format[1]
+    extra = resp_format[3] if len(resp_format) > 3 else None
+    # the names this field adds to the results, None if they are only known once decoded
+    names = (key,)
+
+    if kind == "float":
+
+        def decode(i, result, msgs):
+            try:
+                result = float(result)
+            except ValueError:
+                log.debug(f"Error resolving {result} as float")
+            msgs[key] = [result, resp_format[2]]
+
+    elif kind == "int":
+
+        def decode(i, result, msgs):
+            try:
+                result = int(result)
+            except ValueError:
+                log.debug(f"Error resolving {result} as int")
+            msgs[key] = [result, resp_format[2]]
+
+    elif kind == "string":
+
+        def decode(i, result, msgs):
+            msgs[key] = [result, resp_format[2]]
+
+    elif kind == "10int":
+
+        def decode(i, result, msgs):
+            if "--" in result:
+                result = 0
+            msgs[key] = [float(result) / 10, resp_format[2]]
+
+    # eg. ['option', 'Output source priority', ['Utility first', 'Solar first', 'SBU first']],
+    elif kind == "option":
+
+        def decode(i, result, msgs):
+            msgs[key] = [resp_format[2][int(result)], ""]
+
+    # eg. ['keyed', 'Machine type', {'00': 'Grid tie', '01': 'Off Grid', '10': 'Hybrid'}],
+    elif kind == "keyed":
+
+        def decode(i, result, msgs):
+            msgs[key] = [resp_format[2][result], ""]
+
+    # eg. ['flags', 'Device status', [ 'is_load_on', 'is_charging_on' ...
+    elif kind == "flags":
+        flag_names = resp_format[2]
+        names = tuple(flag_names)
+
+        def decode(i, result, msgs):
+            for j, flag in enumerate(result):
+                msgs[flag_names[j]] = [int(flag), "bool"]
+
+    # eg. ['stat_flags', 'Warning status', ['Reserved', 'Inver...
+    elif kind == "stat_flags":
+        flag_names = resp_format[2]
+        names = tuple(name for name in flag_names if name)
+
+        def decode(i, result, msgs):
+            # display all flags
+            for j, flag in enumerate(result):
+                # only add msg if key is something
+                if j < len(flag_names) and flag_names[j]:
+                    msgs[flag_names[j]] = [flag, ""]
+
+    # eg. ['enflags', 'Device Status', {'a': {'name': 'Buzzer', 'state': 'disabled'},
+    elif kind == "enflags":
+        flag_defns = resp_format[2]
+        # unknown flags are added as unknown_<flag>
+        names = None
+
+        def decode(i, result, msgs):
+            status = "unknown"
+            for item in result:
+                if item == "E":
+                    status = "enabled"
+                elif item == "D":
+                    status = "disabled"
+                else:
+                    if flag_defns.get(item, None):
+                        _key = flag_defns[item]["name"]
+                    else:
+                        _key = "unknown_{}".format(item)
+                    msgs[_key] = [status, ""]
+
+    elif kind == "multi":
+        item_formats = resp_format[1]
+        names = tuple(item_format[1] for item_format in item_formats)
+
+        def decode(i, result, msgs):
+            for x, item in enumerate(result):
+                item_value = int(item)
+                item_resp_format = item_formats[x]
+                item_type = item_resp_format[0]
+                if item_type == "option":
+                    msgs[item_resp_format[1]] = [item_resp_format[2][item_value], ""]
+                elif item_type == "string":
+                    msgs[item_resp_format[1]] = [item_value, ""]
+                else:
+                    log.info(f"item type {item_type} not defined")
+
+    elif command_defn["type"] in ["SETTER", "BLE_SETTER"]:
+        _key = command_defn["name"]
+        names = (_key,)
+
+        def decode(i, result, msgs):
+            msgs[_key] = [result, ""]
+
+    else:
+        names = None
+
+        def decode(i, result, msgs):
+            log.info(f"Processing unknown response format {result}")
+            msgs[i] = [result, ""]
+
+    def run(i, result, msgs, command):
+        if result == "NAK":
+            msgs[f"WARNING{i}"] = [f"Command {command} was rejected", ""]
+            return
+        decode(i, result, msgs)
+        # add extra info about the command
+        if extra is not None and key in msgs:
+            msgs[key].append(extra)
+
+    run.names = names
+    return run
+
+
+class DecodePlan:
+    """
+    The compiled form of a command definition
+    """
+
+    __slots__ = ("command_defn", "description", "response_type", "fields", "keyed_fields", "_unknown", "_layout", "_wanted")
+
+    def __init__(self, command_defn) -> None:
+        self.command_defn = command_defn
+        self.description = command_defn["description"]
+        self.response_type = command_defn.get("response_type", "DEFAULT")
+        self.fields = []
+        self.keyed_fields = {}
+        self._unknown = {}
+        self._layout = None
+        self._wanted = {}
+        log.debug(f"Compiling {self.response_type} decode plan for {command_defn.get('name')}")
+
+        response_defns = command_defn.get("response", [])
+        if self.response_type == "DEFAULT":
+            self.fields = [_default_field(command_defn, resp_format) for resp_format in response_defns]
+        elif self.response_type == "KEYED":
+            # example defn ["V", "Main or channel 1 (battery) voltage", "V", "float:r/1000"]
+            for defn in response_defns:
+                # first definition wins, as per get_resp_defn
+                if defn[0] not in self.keyed_fields:
+                    self.keyed_fields[defn[0]] = FieldDecoder(defn[3], defn[1], defn[2])
+        elif self.response_type == "SEQUENTIAL":
+            # example ["int", "Energy produced", "Wh"]
+            self.fields = [FieldDecoder(defn[0], defn[1], defn[2]) for defn in response_defns]
+        elif self.response_type == "INDEXED":
+            # [1, "AC Input Voltage", "float", "V", {icon: blah}]
+            self.fields = [
+                FieldDecoder(get_value(defn, 2), get_value(defn, 1), get_value(defn, 3), get_value(defn, 4)) for defn in response_defns
+            ]
+        elif self.response_type in ["POSITIONAL", "MULTIFRAME-POSITIONAL"]:
+            # ["BigHex2Short", 2, "Battery Bank Voltage", "V"],
+            for i, defn in enumerate(response_defns):
+                if defn is None:
+                    log.warning(f"No definition for response {i}")
+                    defn = ["str", 1, f"Undefined value in response {i}", ""]
+                self.fields.append(FieldDecoder(defn[0], defn[2], defn[3]))
+        elif self.response_type == "BLE_SETTER":
+            # ["ack", "Command execution", {"NAK": "Failed", "ACK": "Successful"}]
+            defn = response_defns[0]
+            self.fields = [FieldDecoder(defn[0], defn[1], defn[2])]
+        else:
+            log.warning(f"Unknown response type {self.response_type}")
+
+    @property
+    def layout(self) -> PositionalLayout:
+        """
+        The field layout of a (MULTIFRAME-)POSITIONAL response, built on first use
+        """
+        if self._layout is None:
+            self._layout = PositionalLayout(self.command_defn["response"])
+        return self._layout
+
+    def wanted(self, filter=None, excl_filter=None):
+        """
+        Work out (once per filter pair) which fields an output could keep
+        - returns None if all fields are wanted, else a list of flags per field (or dict per key for KEYED responses)
+        - fields whose names are only known once decoded, or that a lookup uses, are always wanted
+        """
+        if filter is None and excl_filter is None:
+            return None
+        cache_key = (getattr(filter, "pattern", None), getattr(excl_filter, "pattern", None))
+        if cache_key in self._wanted:
+            return self._wanted[cache_key]
+        # values used by lookups need to be decoded
+        lookups = " ".join(
+            field.data_type
+            for field in [*self.fields, *self.keyed_fields.values()]
+            if isinstance(field, FieldDecoder) and field.data_type.startswith("lookup")
+        )
+
+        def is_wanted(field):
+            if field.names is None:
+                return True
+            return any(name in lookups or field_wanted(name, filter, excl_filter) for name in field.names)
+
+        if self.response_type == "KEYED":
+            wanted = {field.data_name: is_wanted(field) for field in self.keyed_fields.values()}
+            count = sum(wanted.values())
+        else:
+            wanted = [is_wanted(field) for field in self.fields]
+            count = sum(wanted)
+        log.debug(f"Decoding {count} of {len(wanted)} fields for filters {cache_key}")
+        self._wanted[cache_key] = wanted
+        return wanted
+
+    def unknown_field(self, i):
+        """
+        Get (and keep) a decoder for a response past the end of the definition
+        """
+        field = self._unknown.get(i)
+        if field is None:
+            if self.response_type == "DEFAULT":
+                field = _default_field(self.command_defn, ["string", f"Unknown value in response {i}", ""])
+            elif self.response_type == "INDEXED":
+                field = FieldDecoder("str", f"Unknown value in response {i+1}", "")
+            else:
+                field = FieldDecoder("str", f"Unknown value in response {i}", "")
+            self._unknown[i] = field
+        return field
+
+    def keyed_field(self, lookup_key):
+        """
+        Find the decoder for a KEYED response
+        """
+        if type(lookup_key) is bytes:
+            try:
+                lookup_key = lookup_key.decode("utf-8")
+            except UnicodeDecodeError:
+                log.info(f"key decode error for {lookup_key}")
+        field = self.keyed_fields.get(lookup_key)
+        if field is None:
+            if not lookup_key:
+                return None
+            # did not find definition for this key, so the raw value is used with the key as its name
+            # (as get_resp_defn does)
+            log.info(f"No defn found for {lookup_key} key")
+            field = FieldDecoder("", lookup_key, "")
+        return field
+
+    def run(self, command, responses, msgs, command_value=None, wanted=None) -> dict:
+        """
+        Decode the split responses into msgs
+        - wanted (from DecodePlan.wanted) limits the fields that are decoded
+        """
+        if self.response_type == "DEFAULT":
+            fields = self.fields
+            count = len(fields)
+            for i, result in enumerate(responses):
+                # decode result
+                if result == b"":
+                    continue
+                if type(result) is bytes:
+                    result = result.decode("utf-8")
+                # skip unwanted fields, but still report a rejected command
+                if wanted is not None and i < count and not wanted[i] and result != "NAK":
+                    continue
+                field = fields[i] if i < count else self.unknown_field(i)
+                field(i, result, msgs, command)
+            return msgs
+
+        # Check for multiple frame type responses
+        if self.response_type == "MULTIFRAME-POSITIONAL":
+            # multiple frames of responses are not separated and are determined by the position in the response
+            # each frame has the same definition
+            log.debug(f"got {len(responses)} frames")
+            frames = responses
+        else:
+            frames = [responses]
+
+        if self.response_type == "KEYED":
+            # example response data [b'H1', b'-32914']
+            for frame_number, frame in enumerate(frames):
+                for response in frame:
+                    if len(response) <= 1:
+                        # Not enough data in response, so ignore
+                        continue
+                    field = self.keyed_field(response[0])
+                    if field is None:
+                        log.warning(f"No definition for {response}")
+                        continue
+                    if wanted is not None and not wanted.get(field.data_name, True):
+                        continue
+                    field.run(response[1], frame_number, msgs, command_value)
+            return msgs
+
+        if self.response_type == "BLE_SETTER":
+            field = self.fields[0]
+            for frame_number, frame in enumerate(frames):
+                for response in frame:
+                    field.run(response, frame_number, msgs, command_value)
+            return msgs
+
+        if self.response_type not in RESPONSE_TYPES:
+            return msgs
+
+        fields = self.fields
+        count = len(fields)
+        for frame_number, frame in enumerate(frames):
+            frame_length = len(frame)
+            if frame_length == 0:
+                continue
+            # responses missing from the frame are processed as 'extra'
+            for i in range(max(frame_length, count)):
+                response = frame[i] if i < frame_length else "extra"
+                if i < count:
+                    if wanted is not None and not wanted[i]:
+                        continue
+                    field = fields[i]
+                elif self.response_type == "INDEXED" and not response:
+                    continue
+                else:
+                    field = self.unknown_field(i)
+                field.run(response, frame_number, msgs, command_value)
+        return msgs
+
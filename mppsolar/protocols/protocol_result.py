@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Decode results
+
+The raw response is kept as received (bytes, bytearray or memoryview) and only converted to
+its printable str form if an output asks for it (most outputs just drop raw_response)
+The decoded fields are held compactly in a DecodedResult, with the field names and units interned per protocol
+"""
+import logging
+import threading
+from collections.abc import Mapping
+
+log = logging.getLogger("protocol_result")
+
+
+class RawResponse:
+    """
+    The raw response to a command, kept as received
+    - str(), format() and repr() give the printable form, where each byte is a character (as latin-1)
+    - bytes() gives the response bytes
+    """
+
+    __slots__ = ("raw", "_text")
+
+    def __init__(self, raw) -> None:
+        self.raw = raw
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        """
+        The printable form of the response, built on first use
+        """
+        if self._text is None:
+            if isinstance(self.raw, str):
+                self._text = self.raw
+            else:
+                self._text = bytes(self.raw).decode("latin-1")
+        return self._text
+
+    def __bytes__(self) -> bytes:
+        if isinstance(self.raw, str):
+            return self.raw.encode("latin-1")
+        return bytes(self.raw)
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return repr(self.text)
+
+    def __format__(self, format_spec) -> str:
+        return format(self.text, format_spec)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RawResponse):
+            return bytes(self) == bytes(other)
+        if isinstance(other, str):
+            return self.text == other
+        if isinstance(other, (bytes, bytearray, memoryview)):
+            return bytes(self) == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.text)
+
+
+class ResultSchema:
+    """
+    The interned field names and units of a protocol's decoded results
+    - each name and unit is stored once and referred to by its id from every result
+    - unhashable names and units (eg a list) are interned by their repr
+    - ids are added holding a lock, as results can be decoded on several threads (eg the Poller workers)
+    """
+
+    __slots__ = ("names", "units", "_name_ids", "_unit_ids", "_lock")
+
+    def __init__(self) -> None:
+        self.names = []
+        self.units = []
+        self._name_ids = {}
+        self._unit_ids = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(value):
+        try:
+            hash(value)
+        except TypeError:
+            return (type(value), repr(value))
+        return value
+
+    def _intern(self, value, values, ids) -> int:
+        key = self._key(value)
+        _id = ids.get(key)
+        if _id is None:
+            with self._lock:
+                _id = ids.get(key)
+                if _id is None:
+                    _id = len(values)
+                    values.append(value)
+                    ids[key] = _id
+        return _id
+
+    def name_id(self, name) -> int:
+        """
+        Get the id of name, adding it to the schema if needed
+        """
+        return self._intern(name, self.names, self._name_ids)
+
+    def find(self, name):
+        """
+        Get the id of name, None if it isnt in the schema
+        """
+        return self._name_ids.get(self._key(name))
+
+    def unit_id(self, unit) -> int:
+        """
+        Get the id of unit, adding it to the schema if needed
+        """
+        return self._intern(unit, self.units, self._unit_ids)
+
+
+class DecodedResult(Mapping):
+    """
+    The result of decoding a response
+    - the command, description and raw_response are attributes
+    - the fields are parallel tuples of name ids, values and unit ids into the protocol's ResultSchema
+    - reads as a (read-only) mapping of name: [value, unit] (or [value, unit, extra_info]) entries,
+      including the _command, _command_description and raw_response entries, as decode used to return
+    - copy() gives a plain (mutable) dict
+    """
+
+    __slots__ = ("schema", "command", "description", "raw_response", "field_ids", "values", "unit_ids", "extras", "_positions")
+
+    def __init__(self, schema, command=None, description=None, raw_response=None, field_ids=(), values=(), unit_ids=(), extras=None) -> None:
+        self.schema = schema
+        self.command = command
+        self.description = description
+        self.raw_response = raw_response
+        self.field_ids = field_ids
+        self.values = values
+        self.unit_ids = unit_ids
+        # position: extra_info, for the fields that have any
+        self.extras = extras
+        self._positions = None
+
+    @classmethod
+    def from_msgs(cls, schema, msgs) -> "DecodedResult":
+        """
+        Build a result from a dict of name: [value, unit(, extra_info)] messages, as built by decode
+        """
+        command = msgs.pop("_command", None)
+        description = msgs.pop("_command_description", None)
+        raw_response = msgs.pop("raw_response", None)
+        if raw_response is not None:
+            raw_response = raw_response[0]
+        field_ids = []
+        values = []
+        unit_ids = []
+        extras = None
+        for name, msg in msgs.items():
+            field_ids.append(schema.name_id(name))
+            if isinstance(msg, list) and len(msg) in (2, 3):
+                values.append(msg[0])
+                unit_ids.append(schema.unit_id(msg[1]))
+                if len(msg) == 3:
+                    if extras is None:
+                        extras = {}
+                    extras[len(values) - 1] = msg[2]
+            else:
+                # not a [value, unit] message, so kept as is
+                values.append(msg)
+                unit_ids.append(None)
+        return cls(schema, command, description, raw_response, tuple(field_ids), tuple(values), tuple(unit_ids), extras)
+
+    def _metadata(self):
+        yield "_command", self.command
+        if self.description is not None:
+            yield "_command_description", self.description
+        if self.raw_response is not None:
+            yield "raw_response", [self.raw_response, ""]
+
+    def _entry(self, position):
+        unit_id = self.unit_ids[position]
+        if unit_id is None:
+            return self.values[position]
+        if self.extras is not None and position in self.extras:
+            return [self.values[position], self.schema.units[unit_id], self.extras[position]]
+        return [self.values[position], self.schema.units[unit_id]]
+
+    def __getitem__(self, key):
+        if key == "_command":
+            return self.command
+        if key == "_command_description" and self.description is not None:
+            return self.description
+        if key == "raw_response" and self.raw_response is not None:
+            return [self.raw_response, ""]
+        if self._positions is None:
+            self._positions = {field_id: position for position, field_id in enumerate(self.field_ids)}
+        position = self._positions.get(self.schema.find(key))
+        if position is None:
+            raise KeyError(key)
+        return self._entry(position)
+
+    def __iter__(self):
+        for key, _ in self._metadata():
+            yield key
+        names = self.schema.names
+        for field_id in self.field_ids:
+            yield names[field_id]
+
+    def __len__(self) -> int:
+        return len(self.field_ids) + 1 + (self.description is not None) + (self.raw_response is not None)
+
+    def fields(self):
+        """
+        Iterate the (name, value, unit) of each decoded field
+        """
+        names = self.schema.names
+        units = self.schema.units
+        for field_id, value, unit_id in zip(self.field_ids, self.values, self.unit_ids):
+            yield names[field_id], value, units[unit_id] if unit_id is not None else None
+
+    def copy(self) -> dict:
+        """
+        A plain dict of the result, as decode used to return
+        """
+        result = dict(self._metadata())
+        names = self.schema.names
+        for position, field_id in enumerate(self.field_ids):
+            result[names[field_id]] = self._entry(position)
+        return result
+
+    def __repr__(self) -> str:
+        return repr(self.copy())
@@ -2,9 +2,10 @@ import logging
 from typing import Tuple
 
 from .abstractprotocol import AbstractProtocol
-from .protocol_helpers import vedHexChecksum
+from .protocol_checksums import get_checksum
 
 log = logging.getLogger("ved")
+vedHexChecksum = get_checksum("vedHexChecksum")
 
 # (AAA BBB CCC DDD EEE
 # (000 001 002 003 004
@@ -195,6 +196,34 @@ class ved(AbstractProtocol):
         log.warning("unable to generate full command - is the definition wrong?")
         return None
 
+    def frame_complete(self, buffer) -> bool:
+        """
+        Override the default frame_complete as its different for VEDirect
+        - HEX responses are a single line ending with \n
+        - Text blocks are streamed continuously and each ends with a Checksum field (and its single byte value),
+          the response is complete after 2 whole blocks (so a device that alternates blocks, eg a SmartShunt, sends all its fields)
+          the port is usually opened part way through a block, so only blocks whose bytes sum to 0 count
+        """
+        command_defn = getattr(self, "_command_defn", None)
+        if command_defn is not None and command_defn.get("type") != "VEDTEXT":
+            return b":" in buffer and buffer.endswith(b"\n")
+        blocks = 0
+        start = 0
+        while True:
+            checksum = buffer.find(b"Checksum\t", start)
+            if checksum == -1 or len(buffer) <= checksum + 9:
+                return False
+            end = checksum + 10
+            block = bytes(buffer[start:end])
+            if start == 0 and not block.startswith(b"\r\n"):
+                # a read that starts just after the \r\n that begins a block still has the whole block
+                block = b"\r\n" + block
+            if not sum(block) & 0xFF:
+                blocks += 1
+                if blocks == 2:
+                    return True
+            start = end
+
     def check_response_valid(self, response) -> Tuple[bool, dict]:
         """
         VED HEX protocol - sum of bytes should be 0x55
@@ -248,11 +277,7 @@ class ved(AbstractProtocol):
                 and self._command_defn["response_type"] == "POSITIONAL"
             ):
                 # Have a POSITIONAL type response, so need to break it up...
-                for defn in self._command_defn["response"]:
-                    size = defn[1]
-                    item = _r[:size]
-                    responses.append(item)
-                    _r = _r[size:]
+                responses = self.get_layout(self._command_defn).split(_r)
                 return responses
             else:
                 return bytearray(response)
@@ -1,57 +1,128 @@
-import threading
+""" mppsolar / timer.py """
+import heapq
+import itertools
+import logging
 import time
-from time import sleep
 
+log = logging.getLogger("timer")
 
-class RepeatedTimer(object):
-    def __init__(self, interval, function, *args, **kwargs):
-        self._timer = None
-        self.interval = interval
-        self.function = function
-        self.args = args
-        self.kwargs = kwargs
-        self.is_running = False
-        self.next_call = time.time()
-        self.start()
-
-    def _run(self):
-        self.is_running = False
-        self.start()
-        self.function(*self.args, **self.kwargs)
-
-    def start(self):
-        if not self.is_running:
-            self.next_call += self.interval
-            self._timer = threading.Timer(self.next_call - time.time(), self._run)
-            self._timer.start()
-            self.is_running = True
-
-    def stop(self):
-        self._timer.cancel()
-        self.is_running = False
-
-
-if __name__ == "__main__":
-    # main()
-    def hello(name):
-        global lock
-        print("Hello %s! lock=%s" % (name, lock))
-        lock = not lock
-    lock = False
-    # some_lock = threading.Lock()
-    # with some_lock:
-    #     # do something...
-    # is equivalent to:
-    # some_lock.acquire()
-    # try:
-    #     # do something...
-    # finally:
-    #     some_lock.release()
-    print("starting...")
-    rt = RepeatedTimer(2, hello, "World")  # it auto-starts, no need of rt.start()
-    rt2 = RepeatedTimer(3, hello, "Bob")
+
+def split_interval(command, default):
+    """
+    Split a command with an interval suffix, eg QPIRI@3600, into (command, interval)
+    - commands without a suffix get the default interval
+    """
+    name, sep, interval = command.rpartition("@")
+    if not sep:
+        return command, default
     try:
-        sleep(20)  # your long-running job goes here...
-    finally:
-        rt.stop()  # better in a try/finally block to make sure the program ends!
-        rt2.stop()
+        return name, float(interval)
+    except ValueError:
+        log.warning(f"Invalid interval '{interval}' for command {name}, using {default}")
+        return name, default
+
+
+class ScheduledJob:
+    """
+    Something to run every interval seconds, with its timing statistics
+    """
+
+    __slots__ = ("item", "name", "interval", "due", "runs", "skipped", "overruns", "total_jitter", "max_jitter")
+
+    def __init__(self, item, interval, due, name=None) -> None:
+        self.item = item
+        self.name = str(item) if name is None else name
+        self.interval = interval
+        self.due = due
+        self.runs = 0
+        # runs missed (coalesced into a later run) as the previous run overran
+        self.skipped = 0
+        self.overruns = 0
+        # seconds late each run started
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.name} every {self.interval}s: {self.runs} runs, {self.overruns} overruns, {self.skipped} skipped, "
+            f"jitter mean {self.mean_jitter:.3f}s, max {self.max_jitter:.3f}s"
+        )
+
+    @property
+    def mean_jitter(self) -> float:
+        return self.total_jitter / self.runs if self.runs else 0.0
+
+
+class DeadlineScheduler:
+    """
+    Run jobs at fixed intervals, using a min-heap of deadlines on the monotonic clock
+    - each job is rescheduled from its previous deadline (not from when it ran) so runs dont drift
+    - if a job is still late by a whole interval or more (the previous run overran), the missed runs are skipped,
+      so it runs once and then carries on from its next deadline
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep) -> None:
+        self._clock = clock
+        self._sleep = sleep
+        self._heap = []
+        # tie breaker, so jobs due at the same time run in the order they were added
+        self._sequence = itertools.count()
+        self.jobs = []
+
+    def __str__(self):
+        return "Scheduler stats:\n  " + "\n  ".join(str(job) for job in self.jobs)
+
+    def add(self, item, interval, due=None, name=None) -> ScheduledJob:
+        """
+        Schedule item every interval seconds, first due at due (default now)
+        """
+        job = ScheduledJob(item, interval, self._clock() if due is None else due, name)
+        self.jobs.append(job)
+        heapq.heappush(self._heap, (job.due, next(self._sequence), job))
+        return job
+
+    def next_due(self):
+        """
+        Monotonic time the next job is due, None if there are no jobs
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self) -> list:
+        """
+        Get the items of the jobs that are due (in deadline order), rescheduling the jobs
+        """
+        now = self._clock()
+        items = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, job = heapq.heappop(self._heap)
+            jitter = now - job.due
+            job.runs += 1
+            job.total_jitter += jitter
+            job.max_jitter = max(job.max_jitter, jitter)
+            job.due += job.interval
+            if job.interval <= 0:
+                # run every time round
+                job.due = now
+            elif job.due <= now:
+                missed = int((now - job.due) // job.interval) + 1
+                job.overruns += 1
+                job.skipped += missed
+                job.due += missed * job.interval
+                log.debug(f"{job.name} overran, skipping {missed} runs")
+            heapq.heappush(self._heap, (job.due, next(self._sequence), job))
+            items.append(job.item)
+        return items
+
+    def wait(self, max_wait=None) -> None:
+        """
+        Sleep until the next job is due (or for at most max_wait seconds)
+        """
+        due = self.next_due()
+        if due is None:
+            delay = max_wait or 0
+        else:
+            delay = due - self._clock()
+        if max_wait is not None:
+            delay = min(delay, max_wait)
+        if delay > 0:
+            self._sleep(delay)
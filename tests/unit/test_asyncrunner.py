@@ -0,0 +1,94 @@
+""" tests / unit / test_asyncrunner.py """
+import asyncio
+import threading
+import time
+import unittest
+
+from mppsolar.asyncrunner import AsyncRunner, group_by_port
+from mppsolar.devices.mppsolar import mppsolar
+from mppsolar.inout.serialio import get_port_lock
+from mppsolar.libs.simulator import SimulatedDevice, Simulator
+
+
+class TestAsyncRunner(unittest.TestCase):
+    """ test commands for devices on different ports run concurrently """
+
+    def setUp(self):
+        self.simulator = Simulator()
+        self.simulator.start()
+
+    def tearDown(self):
+        self.simulator.stop()
+
+    def tcp_device(self, latency=0.0):
+        _, port = self.simulator.add_tcp(SimulatedDevice("PI30", latency=latency))
+        return mppsolar(port=f"127.0.0.1:{port}", porttype="remotesocket", protocol="PI30")
+
+    def pty_device(self, latency=0.0):
+        path = self.simulator.add_pty(SimulatedDevice("PI30", latency=latency))
+        return mppsolar(port=path, porttype="serial", protocol="PI30")
+
+    def test_async_run_command(self):
+        """ test async_run_command decodes like run_command """
+        for device in (self.tcp_device(), self.pty_device()):
+            result = asyncio.run(device.async_run_command("QPI"))
+            self.assertEqual(result["Protocol ID"][0], "PI30")
+            self.assertEqual(dict(result), dict(device.run_command("QPI")))
+
+    def test_group_by_port(self):
+        """ test commands are grouped by their device's port """
+        first, second = self.tcp_device(), self.pty_device()
+        commands = [(first, "QPI"), (second, "QPI"), (first, "QMOD")]
+        self.assertEqual(group_by_port(commands), [[(first, "QPI"), (first, "QMOD")], [(second, "QPI")]])
+
+    def test_run_cycle(self):
+        """ test a cycle takes as long as the slowest port, not the sum of the ports """
+        devices = [self.tcp_device(latency=0.3) for _ in range(3)] + [self.pty_device(latency=0.3)]
+        commands = [(device, command, None, "screen", None, None, None) for device in devices for command in ("QPI", "QMOD")]
+        results = []
+        runner = AsyncRunner(commands, lambda item, result: results.append((item[1], result)))
+        try:
+            start = time.monotonic()
+            runner.run_cycle()
+            elapsed = time.monotonic() - start
+        finally:
+            runner.close()
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all("ERROR" not in result for _, result in results))
+        # 2 commands per port at 0.3s each, sequentially would be 8 * 0.3s
+        self.assertLess(elapsed, 1.2)
+
+    def test_failing_port(self):
+        """ test an exception on one port is logged and returned, and the other ports carry on """
+        failing, working = self.tcp_device(), self.pty_device()
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError("port on fire")
+
+        failing.async_run_command = fail
+        commands = [(device, "QPI", None, "screen", None, None, None) for device in (failing, working)]
+        results = []
+        runner = AsyncRunner(commands, lambda item, result: results.append(item[0]))
+        try:
+            with self.assertLogs("asyncrunner", level="ERROR"):
+                errors = runner.run_cycle()
+        finally:
+            runner.close()
+        self.assertEqual(list(errors.values())[0].args, ("port on fire",))
+        self.assertEqual(results, [working])
+
+    def test_port_lock(self):
+        """ test an async command waits for a command from another thread holding the port lock """
+        device = self.pty_device()
+        lock = get_port_lock(device._port._serial_port)
+        lock.acquire()
+        threading.Timer(0.3, lock.release).start()
+        start = time.monotonic()
+        result = asyncio.run(device.async_run_command("QPI"))
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        self.assertEqual(result["Protocol ID"][0], "PI30")
+        self.assertFalse(lock.locked())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+""" tests / unit / test_dispatcher.py """
+import threading
+import time
+import unittest
+
+from mppsolar.dispatcher import BLOCK, DROP_NEWEST, DROP_OLDEST, OutputSink
+from mppsolar.outputs import OutputPipeline
+
+
+class SlowOutput:
+    """ an output processor that waits until released """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.results = []
+        self.closed = False
+
+    def output(self, **kwargs):
+        self.release.wait(5)
+        self.results.append(kwargs["data"])
+
+    def close(self):
+        self.closed = True
+
+
+class TestOutputSink(unittest.TestCase):
+    """ test output sinks queue results for their output processor """
+
+    def fill(self, sink, count):
+        # the first result is taken by the worker (which then waits), the rest stay queued
+        sink.output(data=0)
+        while sink.depth:
+            time.sleep(0.01)
+        for i in range(1, count):
+            sink.output(data=i)
+
+    def test_drop_oldest(self):
+        """ test a full queue drops the oldest result """
+        op = SlowOutput()
+        sink = OutputSink(op, maxsize=2, overflow=DROP_OLDEST)
+        self.fill(sink, 5)
+        self.assertEqual(sink.depth, 2)
+        op.release.set()
+        sink.close()
+        self.assertEqual(op.results, [0, 3, 4])
+        self.assertEqual(sink.stats.dropped, 2)
+        self.assertEqual(sink.stats.delivered, 3)
+        self.assertTrue(op.closed)
+
+    def test_drop_newest(self):
+        """ test a full queue drops the new result """
+        op = SlowOutput()
+        sink = OutputSink(op, maxsize=2, overflow=DROP_NEWEST)
+        self.fill(sink, 5)
+        op.release.set()
+        sink.close()
+        self.assertEqual(op.results, [0, 1, 2])
+        self.assertEqual(sink.stats.dropped, 2)
+        self.assertEqual(sink.stats.max_depth, 2)
+
+    def test_block(self):
+        """ test a full queue waits for the output to catch up """
+        op = SlowOutput()
+        sink = OutputSink(op, maxsize=1, overflow=BLOCK)
+        self.fill(sink, 2)
+        threading.Timer(0.2, op.release.set).start()
+        start = time.monotonic()
+        sink.output(data=2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        sink.close()
+        self.assertEqual(op.results, [0, 1, 2])
+        self.assertEqual(sink.stats.dropped, 0)
+        self.assertGreater(sink.stats.max_lag, 0.1)
+
+    def test_errors(self):
+        """ test an output error is counted and the sink carries on """
+        op = SlowOutput()
+        op.release.set()
+        sink = OutputSink(op, maxsize=5)
+        sink.output(data=1)
+        sink.output()
+        sink.output(data=3)
+        sink.close()
+        self.assertEqual(op.results, [1, 3])
+        self.assertEqual(sink.stats.errors, 1)
+        self.assertEqual(sink.stats.delivered, 3)
+
+    def test_invalid(self):
+        """ test invalid overflow policies and queue sizes """
+        self.assertRaises(ValueError, OutputSink, SlowOutput(), overflow="explode")
+        self.assertRaises(ValueError, OutputSink, SlowOutput(), maxsize=0)
+
+
+class TestQueuedPipeline(unittest.TestCase):
+    """ test a pipeline with a queue_size runs its outputs on sinks """
+
+    def test_slow_output(self):
+        """ test a slow output doesnt hold up the pipeline or the other outputs """
+        pipeline = OutputPipeline("raw,raw", queue_size=10)
+        slow, fast = SlowOutput(), SlowOutput()
+        fast.release.set()
+        pipeline.sinks[0].op = slow
+        pipeline.sinks[1].op = fast
+        start = time.monotonic()
+        for i in range(3):
+            pipeline.output({"value": i})
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertTrue(pipeline.sinks[1].join(2))
+        self.assertEqual(len(fast.results), 3)
+        self.assertEqual(slow.results, [])
+        slow.release.set()
+        pipeline.close()
+        self.assertEqual(slow.results, [{"value": i} for i in range(3)])
+        self.assertTrue(slow.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
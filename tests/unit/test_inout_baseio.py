@@ -0,0 +1,72 @@
+""" tests / unit / test_inout_baseio.py """
+import os
+import threading
+import time
+import unittest
+
+import serial
+
+from mppsolar.inout.baseio import BaseIO
+
+
+class DummyIO(BaseIO):
+    def send_and_receive(self, *args, **kwargs) -> dict:
+        return {}
+
+
+@unittest.skipUnless(hasattr(os, "openpty"), "needs a pty")
+class TestReadFrame(unittest.TestCase):
+    """ exercise read_frame against a pty, with the test writing the device end """
+
+    def setUp(self):
+        self.device, port = os.openpty()
+        self.port = serial.Serial(os.ttyname(port), 9600, timeout=1)
+        os.close(port)
+
+    def tearDown(self):
+        self.port.close()
+        os.close(self.device)
+
+    def test_cr_terminated(self):
+        """ test the default read completes at the \\r without waiting for the timeout """
+        os.write(self.device, b"(PI30\x9a\x0b\r")
+        start = time.monotonic()
+        self.assertEqual(DummyIO().read_frame(self.port, timeout=2), b"(PI30\x9a\x0b\r")
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_frame_complete(self):
+        """ test a response split over several writes is read until frame_complete """
+
+        def device():
+            for chunk in (b"^D005", b"18;", b"\x03\r"):
+                os.write(self.device, chunk)
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=device)
+        thread.start()
+        response = DummyIO().read_frame(self.port, lambda buffer: len(buffer) >= 10, timeout=2)
+        thread.join()
+        self.assertEqual(response, b"^D00518;\x03\r")
+
+    def test_idle_timeout(self):
+        """ test a read with no frame_complete ends once the line goes quiet """
+        os.write(self.device, b"\xa5\x01\x90\x08")
+        start = time.monotonic()
+        response = DummyIO().read_frame(self.port, lambda buffer: False, timeout=5, idle_timeout=0.1)
+        self.assertEqual(response, b"\xa5\x01\x90\x08")
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_timeout(self):
+        """ test an incomplete response is returned at the timeout """
+        os.write(self.device, b"(PI3")
+        self.assertEqual(DummyIO().read_frame(self.port, timeout=0.2), b"(PI3")
+
+
+class TestReadFrameNoFileno(unittest.TestCase):
+    """ exercise read_frame against a port without a file descriptor """
+
+    def test_loop(self):
+        """ test a pyserial loop:// port """
+        with serial.serial_for_url("loop://", timeout=0.2) as port:
+            port.write(b"(PI30\x9a\x0b\rextra")
+            self.assertEqual(DummyIO().read_frame(port)[:8], b"(PI30\x9a\x0b\r")
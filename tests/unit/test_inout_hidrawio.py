@@ -0,0 +1,94 @@
+""" tests / unit / test_inout_hidrawio.py """
+import asyncio
+import os
+import threading
+import time
+import tty
+import unittest
+
+from mppsolar.inout.hidrawio import HIDRawIO
+from mppsolar.protocols.pi18 import pi18
+
+
+@unittest.skipUnless(hasattr(os, "openpty"), "needs a pty")
+class TestHIDRawIO(unittest.TestCase):
+    """ exercise HIDRawIO against a (raw mode) pty standing in for /dev/hidraw0 """
+
+    def setUp(self):
+        self.device, port = os.openpty()
+        tty.setraw(port)
+        self.path = os.ttyname(port)
+        # keep the port end open so the pty stays up between opens
+        self.port = port
+
+    def tearDown(self):
+        os.close(self.port)
+        os.close(self.device)
+
+    def respond(self, response, reports=True):
+        """ read the command from the pty and reply with response, in 8 byte reports """
+
+        def device():
+            self.command = b""
+            while not self.command.endswith(b"\r") and not self.command.endswith(b"\x00"):
+                self.command += os.read(self.device, 64)
+            padded = response + bytes(-len(response) % 8)
+            for i in range(0, len(padded), 8):
+                os.write(self.device, padded[i:i + 8])
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=device)
+        thread.start()
+        return thread
+
+    def test_send_and_receive(self):
+        """ test a command and response, with the report padding removed """
+        port = HIDRawIO(device_path=self.path)
+        thread = self.respond(b"(PI30\x9a\x0b\r")
+        start = time.monotonic()
+        self.assertEqual(port.send_and_receive(full_command=b"QPI\xbe\xac\r"), b"(PI30\x9a\x0b\r")
+        thread.join()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.command, b"QPI\xbe\xac\r")
+        # the device is kept open
+        fd = port._fd
+        thread = self.respond(b"(PI30\x9a\x0b\r")
+        port.send_and_receive(full_command=b"QPI\xbe\xac\r")
+        thread.join()
+        self.assertEqual(port._fd, fd)
+        port.disconnect()
+        self.assertIsNone(port._fd)
+
+    def test_async_send_and_receive(self):
+        """ test a command and response on the event loop """
+        port = HIDRawIO(device_path=self.path)
+        thread = self.respond(b"(PI30\x9a\x0b\r")
+        response = asyncio.run(port.async_send_and_receive(full_command=b"QPI\xbe\xac\r"))
+        thread.join()
+        port.disconnect()
+        self.assertEqual(response, b"(PI30\x9a\x0b\r")
+        self.assertEqual(self.command, b"QPI\xbe\xac\r")
+
+    def test_chunked_command(self):
+        """ test a long command is sent in padded 8 byte reports and the response read to the protocol's frame_complete """
+        proto = pi18()
+        full_command = proto.get_full_command("PI")
+        port = HIDRawIO(device_path=self.path)
+        thread = self.respond(b"^D00518;\x03\r")
+        self.assertEqual(port.send_and_receive(full_command=full_command, protocol=proto), b"^D00518;\x03\r")
+        thread.join()
+        self.assertEqual(len(self.command) % 8, 0)
+        self.assertEqual(self.command.rstrip(b"\x00"), full_command)
+
+    def test_timeout(self):
+        """ test a device that doesnt respond gives an ERROR after the retries """
+        port = HIDRawIO(device_path=self.path, timeout=0.1, max_retries=2)
+        result = port.send_and_receive(full_command=b"QPI\xbe\xac\r")
+        self.assertIn("ERROR", result)
+        self.assertIsNone(port._fd)
+
+    def test_no_device(self):
+        """ test a missing device gives an ERROR """
+        port = HIDRawIO(device_path="/dev/does_not_exist", max_retries=1)
+        result = port.send_and_receive(full_command=b"QPI\xbe\xac\r")
+        self.assertIn("Device not found", result["ERROR"][0])
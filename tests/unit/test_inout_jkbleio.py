@@ -0,0 +1,146 @@
+""" tests / unit / test_inout_jkbleio.py """
+import unittest
+
+from mppsolar.inout.jkblerecords import FrameAssembler, RecordCache
+from mppsolar.protocols.jk02 import jk02
+
+try:
+    from mppsolar.inout.jkbleio import JkBleIO
+except ImportError:
+    JkBleIO = None
+
+INFO = jk02().COMMANDS["getInfo"]["test_responses"][0]
+CELLS = jk02().COMMANDS["getCellData"]["test_responses"][0]
+
+
+class TestFrameAssembler(unittest.TestCase):
+    """ test assembling records from notifications """
+
+    def feed(self, assembler, data, size):
+        for i in range(0, len(data), size):
+            assembler.feed(data[i:i + size])
+
+    def test_chunks(self):
+        """ test records split over notifications of various sizes, with leading junk """
+        for size in (1, 3, 20, 128, 700):
+            assembler = FrameAssembler()
+            self.feed(assembler, b"\x01\x02\x55\xaa" + CELLS + INFO + b"\x55\xaa\xeb", size)
+            self.assertEqual(list(assembler.records), [CELLS[:300], INFO[:300]], size)
+
+    def test_record_type(self):
+        """ test only records of record_type are kept """
+        assembler = FrameAssembler(record_type="3")
+        self.assertEqual(assembler.feed(CELLS[:300] + INFO[:300]), 1)
+        self.assertEqual(list(assembler.records), [INFO[:300]])
+
+    def test_resync(self):
+        """ test a corrupt record is dropped and the next record found """
+        corrupt = bytearray(CELLS[:300])
+        corrupt[100] ^= 0xFF
+        assembler = FrameAssembler()
+        self.feed(assembler, bytes(corrupt) + INFO[:300], 20)
+        self.assertEqual(list(assembler.records), [INFO[:300]])
+
+    def test_checksum_collision(self):
+        """ test a record whose byte 19 looks like the checksum of a short record is read in full """
+        record = bytearray(CELLS[:300])
+        record[19] = sum(record[:19]) & 0xFF
+        record[-1] = sum(record[:-1]) & 0xFF
+        for size in (1, 20, 300):
+            assembler = FrameAssembler()
+            self.feed(assembler, bytes(record) + INFO[:300], size)
+            self.assertEqual(list(assembler.records), [bytes(record), INFO[:300]], size)
+
+    def test_wraps(self):
+        """ test the ring buffer wraps around, and long runs of junk dont fill it """
+        assembler = FrameAssembler(capacity=400)
+        self.feed(assembler, b"\x00" * 1000 + (CELLS[:300] + INFO[:300]) * 3, 128)
+        self.assertEqual(list(assembler.records), [CELLS[:300], INFO[:300]] * 3)
+
+    def test_ack(self):
+        """ test the short setter acknowledgement """
+        ack = b"\xaaU\x90\xeb\xc8\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00D"
+        assembler = FrameAssembler()
+        self.assertEqual(assembler.feed(ack), 1)
+        self.assertEqual(assembler.records.popleft(), ack)
+
+
+class TestRecordCache(unittest.TestCase):
+    """ test the latest record cache """
+
+    def test_put_get(self):
+        """ test records are kept by type, with newer sequence numbers """
+        cache = RecordCache()
+        self.assertIsNone(cache.get(2))
+        first = cache.put(CELLS)
+        cache.put(INFO)
+        self.assertEqual(cache.get("2"), (first, CELLS))
+        self.assertIsNone(cache.get(2, after=first))
+        second = cache.put(CELLS)
+        self.assertEqual(cache.get(2, after=first), (second, CELLS))
+        self.assertEqual(len(cache), 2)
+
+
+class FakePeripheral:
+    """ stands in for a btle.Peripheral, notifying a cell data record in 2 parts after each write """
+
+    def __init__(self):
+        self.connects = 0
+        self.notifications = []
+
+    def withDelegate(self, delegate):
+        self.delegate = delegate
+
+    def connect(self, mac):
+        self.connects += 1
+
+    def setMTU(self, mtu):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def getServiceByUUID(self, uuid):
+        return self
+
+    def getCharacteristics(self, uuid):
+        return [self]
+
+    def getHandle(self):
+        return 0x03
+
+    def read(self):
+        return b"JK_B2A24S"
+
+    def writeCharacteristic(self, handle, data, *args):
+        if data not in (b"\x01\x00",):
+            self.notifications.extend([CELLS[:150], CELLS[150:]])
+
+    def waitForNotifications(self, timeout):
+        if not self.notifications:
+            return False
+        self.delegate.handleNotification(0x03, self.notifications.pop(0))
+        return True
+
+
+@unittest.skipIf(JkBleIO is None, "needs bluepy")
+class TestJkBleIOSession(unittest.TestCase):
+    """ exercise the kept open BLE session against a fake peripheral """
+
+    def test_session(self):
+        """ test the peripheral is connected once and polls use the latest record """
+        from mppsolar.inout import jkbleio
+
+        peripheral = FakePeripheral()
+        Peripheral = jkbleio.btle.Peripheral
+        jkbleio.btle.Peripheral = lambda *args: peripheral
+        try:
+            port = JkBleIO("aa:bb:cc:dd:ee:ff", keep_open=True)
+            proto = jk02()
+            for _ in range(3):
+                self.assertEqual(port.send_and_receive(command="getCellData", protocol=proto), CELLS[:300])
+            self.assertEqual(peripheral.connects, 1)
+            port.disconnect()
+            self.assertIsNone(port._device)
+        finally:
+            jkbleio.btle.Peripheral = Peripheral
@@ -0,0 +1,139 @@
+""" tests / unit / test_inout_mqttio.py """
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+from mppsolar.inout import get_port
+from mppsolar.inout.mqttio import MqttIO
+
+
+class Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class BridgeClient:
+    """ stands in for the broker and a remote bridge, answering each command (slowest first) on the result topic """
+
+    def __init__(self, echo_id=True):
+        self.echo_id = echo_id
+        self.connects = 0
+        self.published = []
+        self.on_connect = self.on_subscribe = self.on_message = None
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect(self, host, port=1883):
+        self.connects += 1
+        self.on_connect(self, None, {}, 0)
+
+    def subscribe(self, topic):
+        self.result_topic = topic
+        self.on_subscribe(self, None, 1, (0,))
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload=None):
+        command = json.loads(payload)
+        self.published.append(command)
+        result = {"command": command["command"], "command_hex": command["command_hex"], "result": command["command_hex"]}
+        if self.echo_id:
+            result["id"] = command["id"]
+        delay = 0.1 if command["command"] == "SLOW" else 0.01
+        threading.Timer(delay, self.on_message, args=(self, None, Message(self.result_topic, json.dumps(result).encode()))).start()
+
+
+class TestMqttIO(unittest.TestCase):
+    """ exercise MqttIO request / response matching """
+
+    def get_port(self, client, timeout=1):
+        port = MqttIO(client_id="test", mqtt_timeout=timeout)
+        port._new_client = lambda: client
+        return port
+
+    def test_send_and_receive(self):
+        """ test the result is returned as soon as it arrives, over a single client """
+        client = BridgeClient()
+        port = self.get_port(client)
+        start = time.monotonic()
+        for _ in range(3):
+            self.assertEqual(port.send_and_receive(command="QPI", full_command=b"QPI\xbe\xac\r"), b"QPI\xbe\xac\r")
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(client.connects, 1)
+        self.assertEqual(len({command["id"] for command in client.published}), 3)
+
+    def test_outstanding_requests(self):
+        """ test concurrent requests get their own results, even if they arrive out of order """
+        port = self.get_port(BridgeClient())
+        results = {}
+
+        def run(command):
+            results[command] = port.send_and_receive(command=command, full_command=command.encode())
+
+        threads = [threading.Thread(target=run, args=(command,)) for command in ("SLOW", "FAST")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {"SLOW": b"SLOW", "FAST": b"FAST"})
+
+    def test_no_id(self):
+        """ test a bridge that doesnt echo the correlation id """
+        port = self.get_port(BridgeClient(echo_id=False))
+        self.assertEqual(port.send_and_receive(command="QPI", full_command=b"QPI"), b"QPI")
+
+    def test_timeout(self):
+        """ test an ERROR is returned if no result arrives """
+        client = BridgeClient()
+        client.publish = lambda topic, payload=None: None
+        port = self.get_port(client, timeout=0.1)
+        self.assertIn("ERROR", port.send_and_receive(command="QPI", full_command=b"QPI"))
+        self.assertEqual(len(port._pending), 0)
+
+    def test_get_port_timeout(self):
+        """ test the mqtt timeout is passed through get_port """
+        self.assertEqual(get_port(port="mqtt", name="test", mqtt_timeout=2.5).timeout, 2.5)
+        self.assertEqual(get_port(port="mqtt", name="test").timeout, 5)
+
+    def test_late_result_no_id(self):
+        """ test a late result (without an id) for a request that timed out isnt taken as the next request's """
+        client = BridgeClient(echo_id=False)
+        port = self.get_port(client, timeout=0.2)
+        # the first result is late, the second arrives after it (the bridge answers in order)
+        delays = iter([0.3, 0.15])
+
+        def publish(topic, payload=None):
+            command = json.loads(payload)
+            result = {"command": command["command"], "result": str(len(client.published)).encode().hex()}
+            client.published.append(command)
+            message = Message(client.result_topic, json.dumps(result).encode())
+            threading.Timer(next(delays), lambda: client.on_message(client, None, message)).start()
+
+        client.publish = publish
+        self.assertIn("ERROR", port.send_and_receive(command="QPI", full_command=b"QPI"))
+        self.assertEqual(port.send_and_receive(command="QPI", full_command=b"QPI"), b"1")
+        self.assertEqual(len(port._expired), 0)
+
+    def test_async_send_and_receive(self):
+        """ test concurrent async requests get their own results """
+        port = self.get_port(BridgeClient())
+
+        async def run():
+            return await asyncio.gather(
+                port.async_send_and_receive(command="SLOW", full_command=b"SLOW"),
+                port.async_send_and_receive(command="FAST", full_command=b"FAST"),
+            )
+
+        self.assertEqual(asyncio.run(run()), [b"SLOW", b"FAST"])
+        self.assertEqual(len(port._pending), 0)
@@ -0,0 +1,133 @@
+""" tests / unit / test_inout_remotesocketio.py """
+import asyncio
+import socket
+import threading
+import time
+import unittest
+
+from mppsolar.inout import remotesocketio
+from mppsolar.inout.remotesocketio import remoteSocketIO
+from mppsolar.protocols.jkpb import jkpb
+from mppsolar.protocols.pi30 import pi30
+
+
+class Gateway:
+    """ a minimal ser2net style gateway, replying to each \\r terminated command (or each write) in 2 parts """
+
+    def __init__(self, response, split=None, terminator=b"\r"):
+        self.response = response
+        self.split = len(response) // 2 if split is None else split
+        self.terminator = terminator
+        self.connections = 0
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self.clients = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            self.clients.append(client)
+            threading.Thread(target=self.handle, args=(client,), daemon=True).start()
+
+    def handle(self, client):
+        command = b""
+        while True:
+            try:
+                data = client.recv(64)
+            except OSError:
+                return
+            if not data:
+                return
+            command += data
+            if self.terminator is None or command.endswith(self.terminator):
+                command = b""
+                client.sendall(self.response[: self.split])
+                time.sleep(0.05)
+                client.sendall(self.response[self.split:])
+
+    def drop_clients(self):
+        for client in self.clients:
+            client.shutdown(socket.SHUT_RDWR)
+            client.close()
+        self.clients = []
+
+    def close(self):
+        self.drop_clients()
+        # closing the socket doesnt wake up the accept in serve, so it would still take connections
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+
+
+class TestRemoteSocketIO(unittest.TestCase):
+    """ exercise remoteSocketIO against a local gateway """
+
+    def setUp(self):
+        self.gateway = Gateway(b"(PI30\x9a\x0b\r")
+        self.port = remoteSocketIO(remote_ip="127.0.0.1", remote_port=self.gateway.port)
+
+    def tearDown(self):
+        self.port.disconnect()
+        self.gateway.close()
+
+    def test_persistent_connection(self):
+        """ test commands share one connection and split responses are read in full """
+        for _ in range(3):
+            self.assertEqual(self.port.send_and_receive(full_command=b"QPI\xbe\xac\r", protocol=pi30()), b"(PI30\x9a\x0b\r")
+        self.assertEqual(self.gateway.connections, 1)
+        # another device on the same gateway port uses the same connection
+        other = remoteSocketIO(remote_ip="127.0.0.1", remote_port=self.gateway.port)
+        self.assertEqual(other.send_and_receive(full_command=b"QPI\xbe\xac\r"), b"(PI30\x9a\x0b\r")
+        self.assertEqual(self.gateway.connections, 1)
+
+    def test_async(self):
+        """ test async commands use the same connection, and wait for a command from another thread """
+        self.port.send_and_receive(full_command=b"QPI\xbe\xac\r", protocol=pi30())
+        lock = remotesocketio.get_connection_lock(("127.0.0.1", self.gateway.port))
+        lock.acquire()
+        threading.Timer(0.2, lock.release).start()
+        start = time.monotonic()
+        result = asyncio.run(self.port.async_send_and_receive(full_command=b"QPI\xbe\xac\r", protocol=pi30()))
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        self.assertEqual(result, b"(PI30\x9a\x0b\r")
+        self.assertEqual(self.gateway.connections, 1)
+
+    def test_reconnect(self):
+        """ test a dropped connection is reconnected """
+        self.port.send_and_receive(full_command=b"QPI\xbe\xac\r", protocol=pi30())
+        self.gateway.drop_clients()
+        self.assertEqual(self.port.send_and_receive(full_command=b"QPI\xbe\xac\r", protocol=pi30()), b"(PI30\x9a\x0b\r")
+        self.assertEqual(self.gateway.connections, 2)
+
+    def test_no_gateway(self):
+        """ test an ERROR is returned if the gateway isnt there """
+        self.gateway.close()
+        self.port.disconnect()
+        self.assertIn("ERROR", self.port.send_and_receive(full_command=b"QPI\xbe\xac\r"))
+        self.assertNotIn(("127.0.0.1", self.gateway.port), remotesocketio._connections)
+
+
+class TestRemoteSocketIOBinary(unittest.TestCase):
+    """ exercise remoteSocketIO with binary (JK) frames """
+
+    def test_split_binary_frame(self):
+        """ test a JK record containing \\r, arriving in 2 parts, is read in full """
+        protocol = jkpb()
+        response = protocol.get_command_defn("getCellData")["test_responses"][0][:300]
+        self.assertIn(b"\r", response[:100])
+        gateway = Gateway(response, split=100, terminator=None)
+        port = remoteSocketIO(remote_ip="127.0.0.1", remote_port=gateway.port)
+        try:
+            result = port.send_and_receive(full_command=protocol.get_full_command("getCellData"), protocol=protocol)
+            self.assertEqual(result, response)
+        finally:
+            port.disconnect()
+            gateway.close()
+
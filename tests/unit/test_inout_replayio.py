@@ -0,0 +1,80 @@
+""" tests / unit / test_inout_replayio.py """
+import os
+import tempfile
+import time
+import unittest
+
+from mppsolar.inout import captureio, get_port
+from mppsolar.inout.captureio import CaptureWriter, read_capture
+from mppsolar.inout.replayio import ReplayIO
+
+
+class TestCaptureReplay(unittest.TestCase):
+    """ test capturing commands to a log and replaying them """
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".cap")
+        os.close(fd)
+        os.unlink(self.path)
+
+    def tearDown(self):
+        writer = captureio._writers.pop(self.path, None)
+        if writer is not None:
+            writer.close()
+        os.unlink(self.path)
+
+    def test_round_trip(self):
+        """ test each kind of record is read back as written """
+        writer = CaptureWriter(self.path)
+        writer.write("/dev/hidraw0", "QPI", b"QPI\xbe\xac\r", b"(PI30\x9a\x0b\r", 0.25, timestamp=1.5)
+        writer.write("/dev/ttyUSB0", "vedtext", "VEDTEXT", {"ERROR": ["no data", ""]}, 3.0)
+        writer.write("/dev/ttyUSB0", "QMOD", b"QMOD\x49\xc1\r", None, 1.0)
+        writer.close()
+        records = list(read_capture(self.path))
+        self.assertEqual(records[0], captureio.CaptureRecord(1.5, "/dev/hidraw0", "QPI", b"QPI\xbe\xac\r", b"(PI30\x9a\x0b\r", 0.25))
+        self.assertEqual(records[1].full_command, "VEDTEXT")
+        self.assertEqual(records[1].response, {"ERROR": ["no data", ""]})
+        self.assertIsNone(records[2].response)
+
+    def test_capture_and_replay(self):
+        """ test a port captured with get_port is replayed """
+        port = get_port(port="test0", capture=self.path)
+        command_defn = {"test_responses": [b"(PI30\x9a\x0b\r"]}
+        port.send_and_receive(command="QPI", full_command=b"QPI\xbe\xac\r", command_defn=command_defn)
+        command_defn = {"test_responses": [b"(B\xe7\xc9\r"]}
+        port.send_and_receive(command="QMOD", full_command=b"QMOD\x49\xc1\r", command_defn=command_defn)
+        captureio._writers[self.path]._file.flush()
+
+        replay = get_port(port=f"replay:{self.path}")
+        self.assertIsInstance(replay, ReplayIO)
+        for _ in range(2):
+            self.assertEqual(replay.send_and_receive(command="QMOD"), b"(B\xe7\xc9\r")
+            self.assertEqual(replay.send_and_receive(command="QPI"), b"(PI30\x9a\x0b\r")
+        self.assertIn("ERROR", replay.send_and_receive(command="QPIGS"))
+        # only the records of another port
+        replay = get_port(port=f"replay:{self.path}#/dev/hidraw0")
+        self.assertIn("ERROR", replay.send_and_receive(command="QPI"))
+
+    def test_realtime(self):
+        """ test a realtime replay keeps the recorded time between responses """
+        writer = CaptureWriter(self.path)
+        writer.write("/dev/hidraw0", "QPI", b"QPI\xbe\xac\r", b"(PI30\x9a\x0b\r", 0.05, timestamp=100.05)
+        writer.write("/dev/hidraw0", "QMOD", b"QMOD\x49\xc1\r", b"(B\xe7\xc9\r", 0.05, timestamp=100.4)
+        writer.close()
+        replay = ReplayIO(device_path=self.path, realtime=True)
+        start = time.monotonic()
+        replay.send_and_receive(command="QPI")
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(replay.send_and_receive(command="QMOD"), b"(B\xe7\xc9\r")
+        self.assertGreaterEqual(time.monotonic() - start, 0.35)
+        # the responses start again, with their recorded latency
+        start = time.monotonic()
+        replay.send_and_receive(command="QPI")
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_not_capture_log(self):
+        """ test a file that isnt a capture log is rejected """
+        with open(self.path, "wb") as f:
+            f.write(b"not a capture")
+        with self.assertRaises(ValueError):
+            list(read_capture(self.path))
@@ -0,0 +1,54 @@
+""" tests / unit / test_inout_serialio.py """
+import threading
+import unittest
+
+from mppsolar.inout import serialio
+from mppsolar.inout.serialio import SerialIO
+
+
+class TestSerialIO(unittest.TestCase):
+    """ exercise the serial port using a pyserial loop:// port (which echoes what is written) """
+
+    def tearDown(self):
+        for port in list(serialio._open_ports.values()):
+            port.close()
+        serialio._open_ports.clear()
+
+    def test_send_and_receive(self):
+        """ test a port opened per command """
+        port = SerialIO(device_path="loop://", serial_baud=2400)
+        self.assertEqual(port.send_and_receive(full_command=b"QPI\xbe\xac\r"), b"QPI\xbe\xac\r")
+        self.assertNotIn("loop://", serialio._open_ports)
+
+    def test_keep_open(self):
+        """ test a kept open port is reused between commands """
+        port = SerialIO(device_path="loop://", serial_baud=2400, keep_open=True)
+        self.assertEqual(port.send_and_receive(full_command=b"QPI\xbe\xac\r"), b"QPI\xbe\xac\r")
+        s = serialio._open_ports["loop://"]
+        self.assertEqual(port.send_and_receive(full_command=b"QMOD\x49\xc1\r"), b"QMOD\x49\xc1\r")
+        self.assertIs(serialio._open_ports["loop://"], s)
+        port.disconnect()
+        self.assertFalse(s.is_open)
+
+    def test_keep_open_reopens(self):
+        """ test a kept open port that has been closed is reopened """
+        port = SerialIO(device_path="loop://", serial_baud=2400, keep_open=True)
+        port.send_and_receive(full_command=b"QPI\xbe\xac\r")
+        serialio._open_ports["loop://"].close()
+        self.assertEqual(port.send_and_receive(full_command=b"QPI\xbe\xac\r"), b"QPI\xbe\xac\r")
+
+    def test_concurrent_callers(self):
+        """ test concurrent callers take turns on a kept open port """
+        port = SerialIO(device_path="loop://", serial_baud=2400, keep_open=True)
+        results = []
+
+        def run(command):
+            results.append((command, port.send_and_receive(full_command=command)))
+
+        threads = [threading.Thread(target=run, args=(f"Q{i}\r".encode(),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for command, response in results:
+            self.assertEqual(command, response)
@@ -0,0 +1,69 @@
+""" tests / unit / test_inout_vserialio.py """
+import time
+import unittest
+
+from mppsolar.inout import vserialio
+from mppsolar.inout.vserialio import VEDTextStream, VSerialIO
+from mppsolar.protocols.ved import ved
+
+# the 2 blocks a SmartShunt alternates between, each starting with \r\n
+STREAM = b"\r\n" + ved().COMMANDS["vedtext"]["test_responses"][0][:-2]
+HISTORY = STREAM[: STREAM.index(b"\r\nPID")]
+MAIN = STREAM[STREAM.index(b"\r\nPID"):]
+
+
+class TestVEDTextStream(unittest.TestCase):
+    """ test framing text blocks """
+
+    def test_blocks(self):
+        """ test blocks split over reads are framed and checked """
+        stream = VEDTextStream(history=3)
+        # start part way through a block
+        data = MAIN[20:] + HISTORY + MAIN
+        for i in range(0, len(data), 7):
+            stream.feed(data[i:i + 7])
+        self.assertEqual(stream.latest(), HISTORY + MAIN)
+        self.assertEqual((stream.valid_blocks, stream.invalid_blocks), (2, 1))
+        self.assertEqual(list(stream.history), [HISTORY, MAIN])
+
+    def test_stale(self):
+        """ test blocks older than max_age arent returned """
+        stream = VEDTextStream(max_age=0.1)
+        stream.feed(HISTORY + MAIN)
+        self.assertEqual(stream.latest(), HISTORY + MAIN)
+        time.sleep(0.15)
+        stream.feed(HISTORY)
+        self.assertEqual(stream.latest(), HISTORY)
+        time.sleep(0.15)
+        self.assertIsNone(stream.latest())
+
+    def test_invalid_checksum(self):
+        """ test a corrupted block is dropped """
+        stream = VEDTextStream()
+        stream.feed(MAIN.replace(b"12865", b"12866"))
+        self.assertIsNone(stream.latest())
+
+    def test_hex_messages(self):
+        """ test HEX messages are separated from the text blocks """
+        stream = VEDTextStream()
+        stream.feed(HISTORY[:50] + b":70010007800C6\n" + HISTORY[50:])
+        self.assertEqual(stream.latest(), HISTORY)
+        self.assertEqual(stream.hex_messages.get_nowait(), b":70010007800C6\n")
+
+
+class TestVSerialIOStream(unittest.TestCase):
+    """ exercise keep_open streaming with a pyserial loop:// port """
+
+    def test_vedtext(self):
+        """ test vedtext polls are answered from the stream """
+        port = VSerialIO(device_path="loop://", serial_baud=19200, keep_open=True)
+        try:
+            stream = port._get_stream()
+            stream.write(HISTORY + MAIN)
+            self.assertEqual(port.send_and_receive(full_command="VEDTEXT"), HISTORY + MAIN)
+            self.assertIs(port._get_stream(), stream)
+            result = ved().decode(port.send_and_receive(full_command="VEDTEXT"), "vedtext")
+            self.assertEqual(result["Main or channel 1 battery voltage"], [12.865, "V"])
+        finally:
+            port.disconnect()
+        self.assertNotIn("loop://", vserialio._streams)
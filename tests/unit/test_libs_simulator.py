@@ -0,0 +1,104 @@
+""" tests / unit / test_libs_simulator.py """
+import os
+import tempfile
+import unittest
+
+from mppsolar.inout.remotesocketio import remoteSocketIO
+from mppsolar.inout.serialio import SerialIO
+from mppsolar.libs.simulator import SimulatedDevice, Simulator, parse_faults, write_config
+from mppsolar.protocols import get_protocol
+
+
+class TestSimulatedDevice(unittest.TestCase):
+    """ test a simulated device answers from the test_responses """
+
+    def respond(self, device, command):
+        return device.respond(device.next_request(device.protocol.get_full_command(command)))
+
+    def test_pi30(self):
+        """ test a PI30 device answers QPI """
+        device = SimulatedDevice("PI30")
+        self.assertEqual(self.respond(device, "QPI"), b"(PI30\x9a\x0b\r")
+
+    def test_crc_corrected(self):
+        """ test PI30 test_responses without a valid CRC get one """
+        device = SimulatedDevice("PI30")
+        protocol = get_protocol("PI30")
+        response = self.respond(device, "QMOD")
+        self.assertTrue(protocol.check_response_valid(response)[0])
+
+    def test_parallel(self):
+        """ test QPGSn is answered for each inverter in the parallel set """
+        device = SimulatedDevice("PI30MAX", parallel=2)
+        self.assertTrue(self.respond(device, "QPGS1").startswith(b"(0 "))
+        self.assertIn(b"NAK", self.respond(device, "QPGS2"))
+
+    def test_binary_protocols(self):
+        """ test JK and Daly requests, which have no terminator, are recognised """
+        for protocol_id, command in (("JK232", "getBalancerData"), ("JKPB", "getCellData"), ("DALY", "SOC")):
+            device = SimulatedDevice(protocol_id)
+            protocol = get_protocol(protocol_id)
+            request = protocol.get_full_command(command)
+            self.assertEqual(device.next_request(bytearray(request) + b"\x00"), bytes(request))
+            self.assertTrue(protocol.check_response_valid(device.respond(bytes(request)))[0], protocol_id)
+
+    def test_bad_crc(self):
+        """ test a request with a bad CRC isnt answered as a command """
+        device = SimulatedDevice("PI30")
+        self.assertIn(b"NAK", device.respond(b"QPIxx\r"))
+        self.assertEqual(device.stats["unrecognised"], 1)
+
+    def test_faults(self):
+        """ test injected faults """
+        self.assertEqual(parse_faults("drop=0.1, corrupt=0.2"), {"drop": 0.1, "corrupt": 0.2})
+        self.assertRaises(ValueError, parse_faults, "explode=0.1")
+        device = SimulatedDevice("PI30", faults={"drop": 1})
+        self.assertIsNone(self.respond(device, "QPI"))
+        device = SimulatedDevice("PI30", faults={"corrupt": 1}, seed=1)
+        self.assertNotEqual(self.respond(device, "QPI"), b"(PI30\x9a\x0b\r")
+        self.assertEqual(device.stats["corrupt"], 1)
+
+
+class TestSimulator(unittest.TestCase):
+    """ test devices served by the simulator """
+
+    def setUp(self):
+        self.simulator = Simulator()
+        self.simulator.start()
+
+    def tearDown(self):
+        self.simulator.stop()
+
+    def test_tcp(self):
+        """ test a device on a tcp port, with latency """
+        _, port = self.simulator.add_tcp(SimulatedDevice("PI18", latency=0.05, jitter=0.05))
+        protocol = get_protocol("PI18")
+        port = remoteSocketIO(remote_ip="127.0.0.1", remote_port=port)
+        try:
+            for _ in range(2):
+                response = port.send_and_receive(full_command=protocol.get_full_command("PI"), protocol=protocol)
+                self.assertEqual(response, b"^D00518;\x03\r")
+        finally:
+            port.disconnect()
+
+    def test_pty(self):
+        """ test a device on a pty """
+        path = self.simulator.add_pty(SimulatedDevice("PI30"))
+        protocol = get_protocol("PI30")
+        port = SerialIO(device_path=path, serial_baud=2400)
+        response = port.send_and_receive(full_command=protocol.get_full_command("QPI"), protocol=protocol)
+        self.assertEqual(response, b"(PI30\x9a\x0b\r")
+
+    def test_write_config(self):
+        """ test the config file for the simulated devices """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sim.conf")
+            write_config(path, [("SIM000", "PI30", "127.0.0.1:9000", "remotesocket", "QPI")], pause=5)
+            with open(path) as f:
+                config = f.read()
+        self.assertIn("[SETUP]\npause=5\n", config)
+        self.assertIn("[SIM000]\nprotocol=PI30\nport=127.0.0.1:9000\nporttype=remotesocket\ncommand=QPI\n", config)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+""" tests / unit / test_output_pipeline.py """
+import json
+import socket
+import unittest
+
+from mppsolar.outputs import OutputPipeline
+
+
+class TestOutputPipeline(unittest.TestCase):
+    """ test the output pipeline reuses its output processors """
+
+    data = {
+        "_command": "QPIGS",
+        "_command_description": "General Status Parameters inquiry",
+        "raw_response": ["(000.0 00.0 230.0 49.9\r", ""],
+        "AC Input Voltage": [0.0, "V"],
+        "AC Output Voltage": [230.0, "V"],
+    }
+
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(("localhost", 0))
+        self.server.settimeout(2)
+        self.udp_port = self.server.getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_reused(self):
+        """ test the processors, filters and socket are created once """
+        pipeline = OutputPipeline("json_udp", filter="output", udp_port=self.udp_port)
+        op = pipeline.outputs[0]
+        try:
+            for _ in range(2):
+                pipeline.output(self.data, tag="QPIGS")
+                payload = json.loads(self.server.recv(1024))
+                self.assertEqual(payload, {"ac_output_voltage": 230.0})
+            self.assertIs(pipeline.outputs[0], op)
+            self.assertIsNotNone(op._sock)
+            sock = op._sock
+            pipeline.output(self.data, tag="QPIGS")
+            self.assertIs(op._sock, sock)
+        finally:
+            pipeline.close()
+        self.assertIsNone(op._sock)
+        self.assertEqual(pipeline.outputs, [])
+
+    def test_data_not_changed(self):
+        """ test each processor gets its own copy of the data """
+        pipeline = OutputPipeline("json_udp,json_udp", udp_port=self.udp_port)
+        try:
+            pipeline.output(self.data)
+            for _ in range(2):
+                self.assertIn("ac_input_voltage", json.loads(self.server.recv(1024)))
+        finally:
+            pipeline.close()
+        self.assertIn("_command", self.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
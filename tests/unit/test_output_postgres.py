@@ -0,0 +1,225 @@
+""" tests / unit / test_output_postgres.py """
+import time
+import unittest
+from unittest import mock
+
+from mppsolar.outputs import postgres as postgres_module
+from mppsolar.outputs.postgres import postgres as op
+
+
+class OperationalError(Exception):
+    pass
+
+
+class FakeCursor:
+    """ a cursor that records the statements run """
+
+    def __init__(self, statements, fail):
+        self.statements = statements
+        self.fail = fail
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, sql, values=None):
+        if isinstance(self.fail, Exception):
+            raise self.fail
+        if self.fail:
+            raise Exception("server closed the connection")
+        self.statements.append((sql, values))
+
+
+class FakeConnection:
+    def __init__(self, statements, fail):
+        self.statements = statements
+        self.fail = fail
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self.statements, self.fail)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakePool:
+    """ a connection pool that records the connections taken and returned """
+
+    def __init__(self, minconn, maxconn, dsn):
+        self.dsn = dsn
+        self.statements = []
+        self.fail = False
+        self.connections = 0
+        self.closed = []
+        self.closed_all = False
+
+    def getconn(self):
+        self.connections += 1
+        return FakeConnection(self.statements, self.fail)
+
+    def putconn(self, conn, close=False):
+        self.closed.append(close)
+
+    def closeall(self):
+        self.closed_all = True
+
+
+def fake_execute_values(cursor, sql, values, page_size=100):
+    cursor.execute(sql, values)
+
+
+class TestPostgresOutput(unittest.TestCase):
+    """ test the postgres output buffers and batches its rows """
+
+    def setUp(self):
+        self.pools = []
+        self.refuse = False
+
+        def make_pool(*args):
+            if self.refuse:
+                raise Exception("connection refused")
+            pool = FakePool(*args)
+            self.pools.append(pool)
+            return pool
+
+        psycopg2 = mock.Mock()
+        psycopg2.pool.ThreadedConnectionPool.side_effect = make_pool
+        psycopg2.OperationalError = OperationalError
+        psycopg2.InterfaceError = OperationalError
+        patches = [
+            mock.patch.object(postgres_module, "psycopg2", psycopg2),
+            mock.patch.object(postgres_module, "execute_values", fake_execute_values),
+            mock.patch.object(postgres_module, "register_adapter", mock.Mock(), create=True),
+            mock.patch.object(postgres_module, "Json", mock.Mock(), create=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def result(self, command="QPIGS", **values):
+        data = {"_command": command, "_command_description": "test", "raw_response": ["", ""]}
+        data.update({key: [value, ""] for key, value in values.items()})
+        return data
+
+    def test_batch(self):
+        """ test rows are written a batch at a time on one pooled connection """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test", "postgres_batch": 3}
+        for voltage in (230.0, 231.0):
+            output.output(data=self.result(AC_Output_Voltage=voltage), **kwargs)
+        # the pool is only created when the first batch is written
+        self.assertEqual(self.pools, [])
+        output.output(data=self.result(AC_Output_Voltage=232.0), **kwargs)
+        self.assertEqual(len(self.pools), 1)
+        [(sql, values)] = self.pools[0].statements
+        self.assertEqual(sql, 'insert into "mppsolar" ("command","data","updated") values %s')
+        self.assertEqual([row[0] for row in values], ["QPIGS"] * 3)
+        self.assertEqual([row[1]["ac_output_voltage"] for row in values], [230.0, 231.0, 232.0])
+        # the rest are written on close
+        output.output(data=self.result(AC_Output_Voltage=233.0), **kwargs)
+        output.close()
+        self.assertEqual(len(self.pools[0].statements), 2)
+        self.assertTrue(self.pools[0].closed_all)
+        self.assertEqual(self.pools[0].closed, [False, False])
+
+    def test_filter(self):
+        """ test rows are written with their command when the filter doesnt keep _command """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test", "filter": "^battery"}
+        output.output(data=self.result(Battery_Voltage=52.1, AC_Output_Voltage=230.0), **kwargs)
+        [(sql, values)] = self.pools[0].statements
+        self.assertEqual(values, [("QPIGS", {"battery_voltage": 52.1, "updated": values[0][2]}, values[0][2])])
+
+    def test_flush_interval(self):
+        """ test rows are written once the oldest has waited postgres_flush seconds """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test", "postgres_batch": 100, "postgres_flush": 0}
+        output.output(data=self.result(AC_Output_Voltage=230.0), **kwargs)
+        self.assertEqual(len(self.pools[0].statements), 1)
+
+    def test_flush_timer(self):
+        """ test rows are written when due without waiting for the next result """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test", "postgres_batch": 100, "postgres_flush": 0.1}
+        output.output(data=self.result(AC_Output_Voltage=230.0), **kwargs)
+        self.assertEqual(self.pools, [])
+        time.sleep(0.3)
+        self.assertEqual(len(self.pools[0].statements), 1)
+        output.close()
+        self.assertIsNone(output._timer)
+
+    def test_wide_reserved_columns(self):
+        """ test decoded fields named like the wide table's own columns get a prefix """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test", "postgres_wide": True, "name": "inverter"}
+        output.output(data=self.result(Name="JK", Updated=1), **kwargs)
+        sql, values = self.pools[0].statements[-1]
+        self.assertEqual(sql, 'insert into "mppsolar_qpigs" ("name","updated","field_name","field_updated") values %s')
+        self.assertEqual(values[0][0], "inverter")
+        self.assertEqual(values[0][2:], ("JK", 1))
+
+    def test_wide(self):
+        """ test wide tables and columns are created with the types of the values """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test", "postgres_wide": True, "name": "inverter"}
+        output.output(data=self.result(AC_Output_Voltage=230.0, Load_Percentage=5, Mode="Line"), **kwargs)
+        statements = self.pools[0].statements
+        self.assertEqual(
+            [sql for sql, _ in statements[:4]],
+            [
+                'create table if not exists "mppsolar_qpigs" (id bigserial primary key, name text, updated timestamptz)',
+                'alter table "mppsolar_qpigs" add column if not exists "ac_output_voltage" double precision',
+                'alter table "mppsolar_qpigs" add column if not exists "load_percentage" bigint',
+                'alter table "mppsolar_qpigs" add column if not exists "mode" text',
+            ],
+        )
+        sql, values = statements[4]
+        self.assertEqual(
+            sql,
+            'insert into "mppsolar_qpigs" ("name","updated","ac_output_voltage","load_percentage","mode") values %s',
+        )
+        self.assertEqual(values[0][0], "inverter")
+        self.assertEqual(values[0][2:], (230.0, 5, "Line"))
+        # values that dont fit the column are converted or null, and the columns arent created again
+        output.output(data=self.result(AC_Output_Voltage=231, Load_Percentage="", Mode=1), **kwargs)
+        self.assertEqual(len(statements), 6)
+        self.assertEqual(statements[5][1][0][2:], (231.0, None, "1"))
+
+    def test_connection_failure(self):
+        """ test rows are kept when there is no connection and a failed insert gets a new connection """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test"}
+        self.refuse = True
+        output.output(data=self.result(AC_Output_Voltage=230.0), **kwargs)
+        self.assertEqual(len(output._buffer), 1)
+        self.refuse = False
+        output.output(data=self.result(AC_Output_Voltage=231.0), **kwargs)
+        [(sql, values)] = self.pools[0].statements
+        self.assertEqual(len(values), 2)
+        self.pools[0].fail = True
+        output.output(data=self.result(AC_Output_Voltage=232.0), **kwargs)
+        self.assertEqual(self.pools[0].closed, [False, True])
+        self.assertEqual(output._buffer, [])
+
+    def test_broken_connection(self):
+        """ test rows are kept and written on a new connection when the connection is broken """
+        output = op()
+        kwargs = {"postgres_url": "postgresql://test", "postgres_flush": 0.1}
+        output.output(data=self.result(AC_Output_Voltage=230.0), **kwargs)
+        pool = self.pools[0]
+        pool.fail = OperationalError("server closed the connection unexpectedly")
+        output.output(data=self.result(AC_Output_Voltage=231.0), **kwargs)
+        self.assertEqual(pool.closed, [False, True])
+        self.assertEqual(len(output._buffer), 1)
+        pool.fail = False
+        time.sleep(0.3)
+        self.assertEqual(output._buffer, [])
+        self.assertEqual([values[0][1]["ac_output_voltage"] for _, values in pool.statements], [230.0, 231.0])
+        output.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+""" tests / unit / test_poller.py """
+import time
+import unittest
+
+from mppsolar.devices.mppsolar import mppsolar
+from mppsolar.libs.simulator import SimulatedDevice, Simulator
+from mppsolar.poller import Poller
+
+
+class TestPoller(unittest.TestCase):
+    """ test commands for devices on different ports run in parallel, and in turn on the same port """
+
+    def setUp(self):
+        self.simulator = Simulator()
+        self.simulator.start()
+
+    def tearDown(self):
+        self.simulator.stop()
+
+    def device(self, latency=0.0, faults=None):
+        _, port = self.simulator.add_tcp(SimulatedDevice("PI30", latency=latency, faults=faults))
+        return mppsolar(port=f"127.0.0.1:{port}", porttype="remotesocket", protocol="PI30")
+
+    def commands(self, devices):
+        return [(device, command, None, "screen", None, None, None) for device in devices for command in ("QPI", "QMOD")]
+
+    def test_run_cycle(self):
+        """ test a cycle takes as long as the slowest port, with stats for each port """
+        devices = [self.device(latency=0.2) for _ in range(4)]
+        results = []
+        poller = Poller(self.commands(devices), lambda item, result: results.append((item[0], item[1])))
+        try:
+            start = time.monotonic()
+            poller.run_cycle()
+            elapsed = time.monotonic() - start
+        finally:
+            poller.close()
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(len(results), 8)
+        # each port's commands are run in order
+        for device in devices:
+            self.assertEqual([command for d, command in results if d is device], ["QPI", "QMOD"])
+        for stats in poller.stats.values():
+            self.assertEqual((stats.cycles, stats.commands, stats.errors), (1, 2, 0))
+            self.assertGreaterEqual(stats.last_duration, 0.4)
+
+    def test_max_workers(self):
+        """ test the number of ports polled at once is limited to max_workers """
+        devices = [self.device(latency=0.2) for _ in range(4)]
+        poller = Poller(self.commands(devices), lambda item, result: None, max_workers=2)
+        try:
+            start = time.monotonic()
+            poller.run_cycle()
+            elapsed = time.monotonic() - start
+        finally:
+            poller.close()
+        self.assertGreaterEqual(elapsed, 0.8)
+
+    def test_no_barrier(self):
+        """ test without the barrier a slow port doesnt hold up a fast one, and skips commands while it is busy """
+        fast, slow = self.device(), self.device(latency=0.5)
+        polled = {fast: 0, slow: 0}
+        commands = self.commands([fast, slow])
+        poller = Poller(commands, lambda item, result: polled.__setitem__(item[0], polled[item[0]] + 1), barrier=False)
+        try:
+            for _ in range(5):
+                poller.dispatch(commands)
+                time.sleep(0.05)
+            # let the slow port finish
+            time.sleep(1)
+        finally:
+            poller.close()
+        self.assertEqual(polled, {fast: 10, slow: 2})
+        stats = poller.stats[("127.0.0.1", slow._port._remote_port)]
+        self.assertEqual(stats.skipped, 8)
+
+    def test_errors(self):
+        """ test commands that fail are counted as errors for their port """
+        working, failing = self.device(), self.device(faults={"nak": 1})
+        poller = Poller(self.commands([working, failing]), lambda item, result: None)
+        try:
+            poller.run_cycle()
+        finally:
+            poller.close()
+        self.assertEqual(poller.stats[("127.0.0.1", working._port._remote_port)].errors, 0)
+        self.assertEqual(poller.stats[("127.0.0.1", failing._port._remote_port)].errors, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
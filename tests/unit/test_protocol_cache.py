@@ -0,0 +1,44 @@
+""" tests / unit / test_protocol_cache.py """
+import unittest
+
+from mppsolar.protocols.pi30 import pi30
+from mppsolar.protocols.protocol_cache import DecodeCache
+
+RESPONSE = b"(PI30\x9a\x0b\r"
+
+
+class TestProtocolCache(unittest.TestCase):
+    """ exercise the decode result cache """
+
+    def test_cache_hit(self):
+        """ test an unchanged response returns the shared cached result """
+        proto = pi30()
+        proto.decode_cache = DecodeCache(4)
+        result = proto.decode(RESPONSE, "QPI")
+        self.assertIs(proto.decode(bytearray(RESPONSE), "QPI"), result)
+        self.assertEqual(proto.decode_cache.stats(), {"hits": 1, "misses": 1, "size": 1, "maxsize": 4})
+
+    def test_cache_key(self):
+        """ test a different command, response or filter is not a hit """
+        proto = pi30()
+        proto.decode_cache = DecodeCache(4)
+        result = proto.decode(RESPONSE, "QPI")
+        self.assertIsNot(proto.decode(RESPONSE, "QPI", filter="protocol"), result)
+        self.assertIsNot(proto.decode(b"(PI31\x8a\x2a\r", "QPI"), result)
+        self.assertEqual(proto.decode_cache.hits, 0)
+
+    def test_cache_bounded(self):
+        """ test the least recently used result is dropped when full """
+        cache = DecodeCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_no_cache(self):
+        """ test decode doesnt cache by default """
+        proto = pi30()
+        self.assertIsNone(proto.decode_cache)
+        self.assertIsNot(proto.decode(RESPONSE, "QPI"), proto.decode(RESPONSE, "QPI"))
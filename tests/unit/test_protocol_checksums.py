@@ -0,0 +1,39 @@
+""" tests / unit / test_protocol_checksums.py """
+import unittest
+
+from mppsolar.helpers import CRC_XModem
+from mppsolar.protocols.protocol_checksums import get_checksum
+
+
+class TestProtocolChecksums(unittest.TestCase):
+    """ exercise the checksum registry """
+
+    def test_crc_pi(self):
+        """ test the PI CRC of a known command """
+        crc = get_checksum("crcPI")
+        self.assertEqual(crc(b"QPIGS"), [0xB7, 0xA9])
+        self.assertEqual(crc("QPIGS"), [0xB7, 0xA9])
+
+    def test_crc_pi_reserved(self):
+        """ test reserved bytes are incremented in the PI CRC """
+        # the CRC of QGMN is 0x4928, 0x28 ( is reserved so is sent as 0x29
+        self.assertEqual(get_checksum("crcPI")(b"QGMN"), [0x49, 0x29])
+        # the CRC of QBOOT is 0x0a88, 0x0a \n is reserved so is sent as 0x0b
+        self.assertEqual(get_checksum("crcPI")(b"QBOOT"), [0x0B, 0x88])
+
+    def test_crc_xmodem(self):
+        """ test the XModem CRC matches the helpers class """
+        self.assertEqual(get_checksum("crcXModem")(b"123456789"), 0x31C3)
+        self.assertEqual(CRC_XModem().crc_hex(b"123456789"), "31C3")
+
+    def test_sums(self):
+        """ test the 8 and 16 bit sum checksums """
+        data = b"\xdd\xa5\x03\x00\xff\xfd\x77"
+        self.assertEqual(get_checksum("crc8")(data), sum(data) & 0xFF)
+        self.assertEqual(get_checksum("crc8P1")(b"\xff"), 0x00)
+        self.assertEqual(get_checksum("crcJK232")([0x01, 0x02, 0xFF]), [0x01, 0x02])
+        self.assertEqual(get_checksum("vedHexChecksum")(b"\x07\x00\x01"), 0x4D)
+
+    def test_unknown(self):
+        """ test an unknown checksum name is rejected """
+        self.assertRaises(ValueError, get_checksum, "crc32")
@@ -0,0 +1,52 @@
+""" tests / unit / test_protocol_commands.py """
+import unittest
+
+from mppsolar.protocols.pi30max import pi30max
+from mppsolar.protocols.protocol_commands import CommandIndex
+
+
+class TestProtocolCommands(unittest.TestCase):
+    """ exercise the command resolution index """
+
+    def test_exact(self):
+        """ test an exact command resolves without a value """
+        proto = pi30max()
+        resolved = proto.resolve_command("QPIRI")
+        self.assertEqual(resolved.command_defn["name"], "QPIRI")
+        self.assertIsNone(resolved.value)
+
+    def test_regex(self):
+        """ test regex commands resolve and carry the captured value """
+        proto = pi30max()
+        self.assertEqual(proto.resolve_command("QPGS3").value, "3")
+        resolved = proto.resolve_command("QED20230105")
+        self.assertEqual(resolved.command_defn["name"], "QED")
+        self.assertEqual(resolved.value, "20230105")
+        self.assertEqual(proto.resolve_command("PLEDE1").command_defn["name"], "PLEDE")
+
+    def test_unknown(self):
+        """ test an unknown command resolves to None """
+        proto = pi30max()
+        self.assertIsNone(proto.resolve_command("QXYZ"))
+        self.assertIsNone(proto.get_command_defn("QPGS"))
+        self.assertIsNone(proto.get_command_defn(None))
+
+    def test_first_regex_wins(self):
+        """ test the first matching regex command is used, as per COMMANDS order """
+        commands = {
+            "PE": {"name": "PE", "regex": "PE(.+)$"},
+            "PEI": {"name": "PEI", "regex": "PEI(\\d)$"},
+            "QPI": {"name": "QPI"},
+        }
+        index = CommandIndex(commands)
+        self.assertEqual(index.resolve("PEI1").command_defn["name"], "PE")
+        self.assertEqual(index.resolve("PEI1").value, "I1")
+        self.assertEqual(index.resolve("QPI").command_defn["name"], "QPI")
+
+    def test_index_rebuilt(self):
+        """ test the index is rebuilt when COMMANDS changes """
+        proto = pi30max()
+        index = proto.get_command_index()
+        self.assertIs(proto.get_command_index(), index)
+        proto.COMMANDS = dict(proto.COMMANDS)
+        self.assertIsNot(proto.get_command_index(), index)
@@ -0,0 +1,56 @@
+""" tests / unit / test_protocol_expressions.py """
+import unittest
+
+from mppsolar.protocols.protocol_expressions import compile_data_type, compile_expression
+from mppsolar.protocols.protocol_helpers import LittleHex2Short
+
+
+class TestProtocolExpressions(unittest.TestCase):
+    """ exercise the template expression compiler """
+
+    def test_template(self):
+        """ test a simple r template """
+        self.assertEqual(compile_expression("(r-30000)/10")(30123), 12.3)
+
+    def test_template_cached(self):
+        """ test the same template gives the same compiled function """
+        self.assertIs(compile_expression("r/1000"), compile_expression("r/1000"))
+
+    def test_data_name(self):
+        """ test an f-string data name """
+        self.assertEqual(compile_expression("f'Frame Number {f:02d}'", ("f",))(3), "Frame Number 03")
+
+    def test_lookup(self):
+        """ test a lookup template """
+        m = {"Highest Cell": [4, ""]}
+        result = compile_expression("'Voltage Cell{:02d}'.format(m['Highest Cell'][0])", ("m",))(m)
+        self.assertEqual(result, "Voltage Cell04")
+
+    def test_info(self):
+        """ test an info template using calendar """
+        self.assertEqual(compile_expression("calendar.month_name[int(cv[4:6])]", ("cv",))("20230501"), "May")
+
+    def test_data_type(self):
+        """ test data_types resolve to the helper functions """
+        self.assertIs(compile_data_type("int"), int)
+        self.assertIs(compile_data_type("LittleHex2Short"), LittleHex2Short)
+        self.assertEqual(compile_data_type("bytes.decode")(b"PI30"), "PI30")
+
+    def test_rejected(self):
+        """ test names and attributes outside the whitelist are rejected """
+        self.assertRaises(ValueError, compile_expression, "__import__('os')")
+        self.assertRaises(ValueError, compile_expression, "open('/etc/passwd')")
+        self.assertRaises(ValueError, compile_expression, "r.__class__")
+        self.assertRaises(ValueError, compile_expression, "[x for x in r]")
+        self.assertRaises(ValueError, compile_expression, "'{0.__class__}'.format(r)")
+
+    def test_attributes(self):
+        """ test only the whitelisted module attributes and methods can be used """
+        template = "datetime.strptime(r, '%Y%m%d%H%M%S').strftime('%Y-%m-%d %H:%M:%S')"
+        self.assertEqual(compile_expression(template)("20230501120000"), "2023-05-01 12:00:00")
+        self.assertRaises(ValueError, compile_expression, "calendar.sys.modules.get('os').getpid()")
+        self.assertRaises(ValueError, compile_expression, "calendar.month_name.sys")
+        self.assertRaises(ValueError, compile_expression, "calendar")
+        self.assertRaises(ValueError, compile_expression, "r.decode")
+        self.assertRaises(ValueError, compile_expression, "r.hex()")
+        self.assertRaises(ValueError, compile_expression, "'{0.decode}'.format(r)")
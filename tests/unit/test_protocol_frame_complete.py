@@ -0,0 +1,86 @@
+""" tests / unit / test_protocol_frame_complete.py """
+import unittest
+
+from mppsolar.protocols.daly import daly
+from mppsolar.protocols.jk02 import jk02
+from mppsolar.protocols.jk232 import jk232
+from mppsolar.protocols.jkserial import jkserial
+from mppsolar.protocols.pi17 import pi17
+from mppsolar.protocols.pi18 import pi18
+from mppsolar.protocols.pi30 import pi30
+from mppsolar.protocols.ved import ved
+
+
+class TestFrameComplete(unittest.TestCase):
+    """ check each protocol's frame_complete against its test responses """
+
+    def check(self, proto, command):
+        proto.get_full_command(command)
+        for response in proto.COMMANDS[command]["test_responses"]:
+            if not response:
+                continue
+            self.assertTrue(proto.frame_complete(bytearray(response)), response)
+            self.assertFalse(proto.frame_complete(bytearray(response[:-1])), response)
+
+    def test_pi30(self):
+        """ test the default \\r terminator """
+        self.check(pi30(), "QPI")
+
+    def test_pi18(self):
+        """ test the ^Dxxx length field """
+        proto = pi18()
+        self.check(proto, "PI")
+        # a \r in the data doesnt complete the frame
+        self.assertFalse(proto.frame_complete(b"^D00518\r"))
+        self.assertTrue(proto.frame_complete(b"^1\x0b\xc2\r"))
+
+    def test_pi17(self):
+        """ test the ^Dxxx length field, shared with PI18 """
+        self.check(pi17(), "ID")
+
+    def test_jk232(self):
+        """ test the length byte """
+        self.check(jk232(), "getBalancerData")
+
+    def test_jk(self):
+        """ test the length of JK records comes from the record type """
+        proto = jk02()
+        proto.get_full_command("getCellData")
+        record = bytearray(proto.COMMANDS["getCellData"]["test_responses"][0][:300])
+        # byte 19 looks like the crc of a 20 byte record
+        record[19] = sum(record[:19]) & 0xFF
+        record[-1] = sum(record[:-1]) & 0xFF
+        self.assertFalse(proto.frame_complete(record[:25]))
+        self.assertFalse(proto.frame_complete(record[:-1]))
+        self.assertTrue(proto.frame_complete(b"\x01" + record))
+        ack = b"\xaaU\x90\xeb\xc8\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00D"
+        self.assertTrue(proto.frame_complete(ack))
+
+    def test_jkserial(self):
+        """ test the 0x68 0x00 0x00 trailer """
+        proto = jkserial()
+        proto.get_full_command("getBalancerData")
+        response = proto.COMMANDS["getBalancerData"]["test_responses"][-1]
+        self.assertTrue(proto.frame_complete(response))
+        self.assertFalse(proto.frame_complete(response[:-1]))
+
+    def test_daly(self):
+        """ test fixed length frames """
+        self.check(daly(), "SOC")
+        proto = daly()
+        proto.get_full_command("cellVoltages")
+        # multiframe responses are read until the line goes quiet
+        self.assertFalse(proto.frame_complete(b"\x00" * 26))
+
+    def test_ved(self):
+        """ test VE.Direct hex and text responses """
+        self.check(ved(), "batteryCapacity")
+        proto = ved()
+        proto.get_full_command("vedtext")
+        response = proto.COMMANDS["vedtext"]["test_responses"][0]
+        self.assertTrue(proto.frame_complete(response))
+        self.assertFalse(proto.frame_complete(response[: response.index(b"PID")]))
+        # a partly read first block doesnt count
+        first = response.index(b"Checksum\t") + 10
+        self.assertFalse(proto.frame_complete(response[20:]))
+        self.assertTrue(proto.frame_complete(response[20:] + response[:first]))
@@ -0,0 +1,41 @@
+""" tests / unit / test_protocol_layout.py """
+import unittest
+
+from mppsolar.protocols.protocol_layout import LOOKUP, PositionalLayout
+
+RESPONSE = [
+    ["Hex2Str", 2, "Header", ""],
+    ["LittleHex2Short", 2, "Voltage", "mV"],
+    ["lookup:'Cell{:02d}'.format(m['Voltage'][0])", "", "Lookup", ""],
+    ["discard", 1, "checksum", ""],
+]
+
+
+class TestProtocolLayout(unittest.TestCase):
+    """ exercise the POSITIONAL field layouts """
+
+    def test_split(self):
+        """ test a record is split into its fields """
+        layout = PositionalLayout(RESPONSE)
+        self.assertEqual(layout.size, 5)
+        self.assertEqual(layout.split(b"\xaaU\x10\x0e\x01"), [b"\xaaU", b"\x10\x0e", LOOKUP, b"\x01"])
+
+    def test_split_remainder(self):
+        """ test trailing data is only kept if asked for """
+        layout = PositionalLayout(RESPONSE)
+        self.assertEqual(layout.split(b"\xaaU\x10\x0e\x01\x02\x03"), [b"\xaaU", b"\x10\x0e", LOOKUP, b"\x01"])
+        self.assertEqual(layout.split(b"\xaaU\x10\x0e\x01\x02\x03", remainder=True)[-1], b"\x02\x03")
+
+    def test_split_short(self):
+        """ test a short record gives short and empty fields """
+        layout = PositionalLayout(RESPONSE)
+        self.assertEqual(layout.split(b"\xaaU\x10"), [b"\xaaU", b"\x10", LOOKUP, b""])
+
+    def test_split_frames(self):
+        """ test a multiframe response is split into frames of fields """
+        layout = PositionalLayout([["Hex2Int", 1, "Frame", ""], ["Hex2Int", 1, "Value", ""]])
+        self.assertEqual(layout.split_frames(b"\x01\x02\x03\x04\x05", 2), [[b"\x01", b"\x02"], [b"\x03", b"\x04"], [b"\x05", b""]])
+
+    def test_invalid_size(self):
+        """ test a non integer field size is rejected """
+        self.assertRaises(TypeError, PositionalLayout, [["ack", "R", "Response", ["OK", "FAIL"]]])
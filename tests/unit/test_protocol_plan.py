@@ -0,0 +1,126 @@
+""" tests / unit / test_protocol_plan.py """
+import re
+import threading
+import unittest
+
+from mppsolar.protocols.pi30 import pi30
+from mppsolar.protocols.ved import ved
+from mppsolar.protocols.protocol_plan import DecodePlan
+from mppsolar.protocols.protocol_result import DecodedResult, ResultSchema
+
+
+class TestProtocolPlan(unittest.TestCase):
+    """ exercise the compiled decode plans """
+
+    maxDiff = None
+
+    def test_plan_is_cached(self):
+        """ test the decode plan is compiled once per command """
+        proto = pi30()
+        command_defn = proto.get_command_defn("QPIGS")
+        plan = proto.get_decode_plan(command_defn)
+        self.assertIsInstance(plan, DecodePlan)
+        self.assertIs(proto.get_decode_plan(command_defn), plan)
+        self.assertEqual(plan.response_type, command_defn.get("response_type", "DEFAULT"))
+        self.assertEqual(len(plan.fields), len(command_defn["response"]))
+
+    def test_plan_recompiled_on_new_defn(self):
+        """ test a changed command definition gets a new plan """
+        proto = pi30()
+        command_defn = proto.get_command_defn("QPI")
+        plan = proto.get_decode_plan(command_defn)
+        new_defn = dict(command_defn)
+        self.assertIsNot(proto.get_decode_plan(new_defn), plan)
+
+    def test_plan_decode_repeated(self):
+        """ test repeated decodes using the cached plan give the same result """
+        proto = pi30()
+        response = b"(PI30\x9a\x0b\r"
+        expected = {
+            "raw_response": ["(PI30\x9a\x0b\r", ""],
+            "_command": "QPI",
+            "_command_description": "Protocol ID inquiry",
+            "Protocol ID": ["PI30", ""],
+        }
+        self.assertEqual(proto.decode(response, "QPI"), expected)
+        self.assertEqual(proto.decode(response, "QPI"), expected)
+
+    def test_process_response(self):
+        """ test process_response still decodes a single field """
+        proto = pi30()
+        result = proto.process_response(data_name="Voltage", data_type="int:r/10", data_units="V", raw_value=b"2301")
+        self.assertEqual(result, [("Voltage", 230.1, "V", None)])
+
+    def test_raw_response_lazy(self):
+        """ test the raw response is kept as received and only made printable when asked """
+        proto = pi30()
+        response = b"(PI30\x9a\x0b\r"
+        raw_response = proto.decode(response, "QPI")["raw_response"][0]
+        self.assertIs(raw_response.raw, response)
+        self.assertIsNone(raw_response._text)
+        self.assertEqual(str(raw_response), "(PI30\x9a\x0b\r")
+        self.assertEqual(bytes(raw_response), response)
+
+    def test_decode_filtered(self):
+        """ test fields no output would keep are not decoded """
+        proto = pi30()
+        response = proto.get_command_defn("QPIGS")["test_responses"][0]
+        full = proto.decode(response, "QPIGS")
+        result = proto.decode(response, "QPIGS", filter="^battery_voltage|^ac_output")
+        self.assertEqual(result["Battery Voltage"], full["Battery Voltage"])
+        self.assertEqual(result["AC Output Voltage"], full["AC Output Voltage"])
+        self.assertNotIn("Bus Voltage", result)
+        self.assertEqual(result["_command"], "QPIGS")
+        self.assertLess(len(result), len(full))
+
+    def test_wanted_is_cached(self):
+        """ test the wanted fields are worked out once per filter pair """
+        proto = pi30()
+        plan = proto.get_decode_plan(proto.get_command_defn("QPIRI"))
+        filter = re.compile("voltage")
+        wanted = plan.wanted(filter, None)
+        self.assertIs(plan.wanted(re.compile("voltage"), None), wanted)
+        self.assertIsNone(plan.wanted(None, None))
+
+    def test_decoded_result(self):
+        """ test the decoded result reads as the old dict and shares the protocol schema """
+        proto = pi30()
+        response = b"(PI30\x9a\x0b\r"
+        result = proto.decode(response, "QPI")
+        self.assertIsInstance(result, DecodedResult)
+        self.assertEqual(result.command, "QPI")
+        self.assertEqual(result["_command"], "QPI")
+        self.assertEqual(result["Protocol ID"], ["PI30", ""])
+        self.assertEqual(list(result), ["_command", "_command_description", "raw_response", "Protocol ID"])
+        with self.assertRaises(TypeError):
+            result["Protocol ID"] = 0
+        data = result.copy()
+        self.assertIsInstance(data, dict)
+        self.assertEqual(data, result)
+        data.pop("raw_response")
+        self.assertIn("raw_response", result)
+        self.assertIs(proto.decode(response, "QPI").schema, result.schema)
+
+    def test_keyed_unknown(self):
+        """ test a KEYED response field without a definition is kept as is, named by its key """
+        proto = ved()
+        response = proto.COMMANDS["vedtext"]["test_responses"][0] + b"XYZ\t7\r\n"
+        self.assertEqual(proto.decode(response, "vedtext")["XYZ"], [b"7", ""])
+
+    def test_schema_interning(self):
+        """ test unhashable units are interned once, and ids are the same across threads """
+        schema = ResultSchema()
+        self.assertEqual(schema.unit_id(["V", "A"]), schema.unit_id(["V", "A"]))
+        self.assertEqual(schema.units, [["V", "A"]])
+        ids = []
+
+        def intern():
+            ids.append([schema.name_id(f"field {i}") for i in range(200)])
+
+        threads = [threading.Thread(target=intern) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(schema.names), 200)
+        self.assertTrue(all(_ids == ids[0] for _ids in ids))
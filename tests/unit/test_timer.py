@@ -0,0 +1,75 @@
+""" tests / unit / test_timer.py """
+import unittest
+
+from mppsolar.timer import DeadlineScheduler, split_interval
+
+
+class FakeClock:
+    """ a monotonic clock that only moves when told to """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+    """ test jobs are run when they are due """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = DeadlineScheduler(clock=self.clock, sleep=self.clock.sleep)
+
+    def test_split_interval(self):
+        """ test commands with an interval suffix """
+        self.assertEqual(split_interval("QPIRI@3600", 5), ("QPIRI", 3600))
+        self.assertEqual(split_interval("QPIGS", 5), ("QPIGS", 5))
+        self.assertEqual(split_interval("QPIGS@soon", 5), ("QPIGS", 5))
+
+    def test_intervals(self):
+        """ test each job runs at its own interval """
+        self.scheduler.add("QPIGS", 5)
+        self.scheduler.add("QPIRI", 60)
+        runs = []
+        while self.clock.now < 160:
+            runs.extend((self.clock.now, item) for item in self.scheduler.pop_due())
+            self.scheduler.wait()
+        self.assertEqual([t for t, item in runs if item == "QPIRI"], [100])
+        self.assertEqual(len([t for t, item in runs if item == "QPIGS"]), 12)
+
+    def test_no_drift(self):
+        """ test a job is rescheduled from its deadline, not from when it ran """
+        job = self.scheduler.add("QPIGS", 5)
+        self.scheduler.pop_due()
+        self.clock.sleep(5.5)
+        self.scheduler.pop_due()
+        self.assertEqual(self.scheduler.next_due(), 110)
+        self.assertAlmostEqual(job.max_jitter, 0.5)
+        self.assertEqual(job.runs, 2)
+
+    def test_overrun(self):
+        """ test runs missed while a run overran are skipped """
+        job = self.scheduler.add("QPIGS", 5)
+        self.scheduler.pop_due()
+        self.clock.sleep(17)
+        self.assertEqual(self.scheduler.pop_due(), ["QPIGS"])
+        self.assertEqual(self.scheduler.pop_due(), [])
+        self.assertEqual(self.scheduler.next_due(), 120)
+        self.assertEqual((job.runs, job.overruns, job.skipped), (2, 1, 2))
+
+    def test_wait(self):
+        """ test wait sleeps until the next job is due, or at most max_wait """
+        self.scheduler.add("QPIGS", 60)
+        self.scheduler.pop_due()
+        self.scheduler.wait(max_wait=30)
+        self.assertEqual(self.clock.now, 130)
+        self.scheduler.wait()
+        self.assertEqual(self.clock.now, 160)
+
+
+if __name__ == "__main__":
+    unittest.main()
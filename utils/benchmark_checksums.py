@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the checksums in protocol_checksums
+
+Checks each checksum gives the same result as the original per-byte implementations (below)
+over the test_responses of every protocol, then times both versions
+
+usage: python utils/benchmark_checksums.py [-n NUMBER]
+"""
+import argparse
+import importlib
+import pkgutil
+import sys
+import timeit
+
+import mppsolar.protocols
+from mppsolar.protocols.protocol_checksums import get_checksum
+
+
+# Original implementations, used as the reference
+def legacy_crc8(byteData):
+    CRC = 0
+    for b in byteData:
+        CRC = CRC + b
+    CRC &= 0xFF
+    return CRC
+
+
+def legacy_crc8P1(byteData):
+    CRC = 0
+    for b in byteData:
+        CRC = CRC + b
+    CRC += 1
+    CRC &= 0xFF
+    return CRC
+
+
+def legacy_crcJK232(byteData):
+    CRC = 0
+    for b in byteData:
+        CRC += b
+    crc_low = CRC & 0xFF
+    crc_high = (CRC >> 8) & 0xFF
+    return [crc_high, crc_low]
+
+
+def legacy_vedHexChecksum(byteData):
+    CS = 0x55
+    for b in byteData:
+        CS -= b
+    CS = CS & 0xFF
+    return CS
+
+
+def legacy_crcPI(data_bytes):
+    crc = 0
+    da = 0
+    crc_ta = [0x0000, 0x1021, 0x2042, 0x3063, 0x4084, 0x50A5, 0x60C6, 0x70E7, 0x8108, 0x9129, 0xA14A, 0xB16B, 0xC18C, 0xD1AD, 0xE1CE, 0xF1EF]
+    for c in data_bytes:
+        if type(c) == str:
+            c = ord(c)
+        da = ((crc >> 8) & 0xFF) >> 4
+        crc = (crc << 4) & 0xFFFF
+        index = da ^ (c >> 4)
+        crc ^= crc_ta[index]
+        da = ((crc >> 8) & 0xFF) >> 4
+        crc = (crc << 4) & 0xFFFF
+        index = da ^ (c & 0x0F)
+        crc ^= crc_ta[index]
+    crc_low = crc & 0xFF
+    crc_high = (crc >> 8) & 0xFF
+    if crc_low == 0x28 or crc_low == 0x0D or crc_low == 0x0A or crc_low == 0x00:
+        crc_low += 1
+    if crc_high == 0x28 or crc_high == 0x0D or crc_high == 0x0A or crc_high == 0x00:
+        crc_high += 1
+    return [crc_high, crc_low]
+
+
+def legacy_crc_table():
+    table = [0] * 256
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc = crc << 1
+        table[i] = crc & 0xFFFF
+    return table
+
+
+LEGACY_TABLE = legacy_crc_table()
+
+
+def legacy_crcXModem(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ LEGACY_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+LEGACY = {
+    "crcXModem": legacy_crcXModem,
+    "crcPI": legacy_crcPI,
+    "crc8": legacy_crc8,
+    "crc8P1": legacy_crc8P1,
+    "crcJK232": legacy_crcJK232,
+    "vedHexChecksum": legacy_vedHexChecksum,
+}
+
+
+def get_test_responses():
+    """
+    Collect the test_responses (and the data they are checked over) of every protocol
+    """
+    samples = []
+    for _, name, _ in pkgutil.iter_modules(mppsolar.protocols.__path__):
+        if "init" in name or "abstract" in name or "protocol" in name:
+            continue
+        try:
+            proto = getattr(importlib.import_module(f"mppsolar.protocols.{name}"), name)()
+        except Exception as e:  # noqa: E722 # pylint: disable=W0703
+            print(f"Skipping {name}: {e}")
+            continue
+        for command_defn in proto.COMMANDS.values():
+            for response in command_defn.get("test_responses", []):
+                if isinstance(response, (bytes, bytearray)):
+                    samples.append(bytes(response))
+                    # the crc is calculated over the response less crc and \r
+                    samples.append(bytes(response[:-3]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the protocol checksums")
+    parser.add_argument("-n", "--number", type=int, help="Number of passes over the test responses to time", default=20)
+    args = parser.parse_args()
+
+    samples = get_test_responses()
+    print(f"{len(samples)} samples, {sum(len(s) for s in samples)} bytes")
+    mismatches = 0
+    print(f"{'checksum':<16}{'original':>12}{'table/sum':>12}{'speedup':>10}")
+    for name, legacy in LEGACY.items():
+        checksum = get_checksum(name)
+        for sample in samples:
+            if checksum(sample) != legacy(sample):
+                mismatches += 1
+                print(f"MISMATCH {name} {sample}: {checksum(sample)} != {legacy(sample)}")
+        legacy_time = timeit.timeit(lambda: [legacy(s) for s in samples], number=args.number)
+        new_time = timeit.timeit(lambda: [checksum(s) for s in samples], number=args.number)
+        print(f"{name:<16}{legacy_time:>11.4f}s{new_time:>11.4f}s{legacy_time / new_time:>9.1f}x")
+    if mismatches:
+        print(f"{mismatches} mismatches")
+        return 1
+    print("All checksums match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())